@@ -0,0 +1,106 @@
+from datetime import timedelta
+from typing import Optional
+import logging
+import os
+
+from sqlalchemy import delete, func, select, update
+
+from app.dao.worker_tables import ensure_worker_table, utcnow
+from app.models.result_cache import ResultCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCacheDAO:
+
+    def __init__(self, db_session, ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None):
+        self.db_session = db_session
+        if ttl_seconds is None:
+            ttl_seconds = int(float(os.getenv("RESULT_CACHE_TTL_HOURS", "168")) * 3600)
+        if max_entries is None:
+            max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        ensure_worker_table(db_session, ResultCacheEntry)
+
+    def get_entry(self, content_key: str) -> Optional[ResultCacheEntry]:
+        try:
+            entry = self.db_session.get(ResultCacheEntry, content_key)
+            if entry is None:
+                return None
+
+            if entry.created_at < utcnow() - self.ttl:
+                self.remove_entry(content_key)
+                return None
+
+            return entry
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao buscar resultado em cache: {e}")
+
+    def record_hit(self, content_key: str) -> None:
+        try:
+            self.db_session.execute(
+                update(ResultCacheEntry)
+                .where(ResultCacheEntry.content_key == content_key)
+                .values(hits=ResultCacheEntry.hits + 1, last_hit_at=utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            self.db_session.commit()
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao registrar uso do cache: {e}")
+
+    def save_entry(self, content_key: str, file_path: str, frame_count: int) -> None:
+        now = utcnow()
+        try:
+            self.db_session.merge(
+                ResultCacheEntry(
+                    content_key=content_key,
+                    file_path=file_path,
+                    frame_count=frame_count,
+                    hits=0,
+                    created_at=now,
+                    last_hit_at=now,
+                )
+            )
+            self.db_session.commit()
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao salvar resultado em cache: {e}")
+
+        self.evict()
+
+    def remove_entry(self, content_key: str) -> None:
+        self.db_session.execute(
+            delete(ResultCacheEntry).where(ResultCacheEntry.content_key == content_key)
+        )
+        self.db_session.commit()
+
+    def evict(self) -> int:
+        # Remove apenas o índice: o ZIP continua referenciado pelos vídeos que já o usam
+        try:
+            removed = self.db_session.execute(
+                delete(ResultCacheEntry).where(ResultCacheEntry.created_at < utcnow() - self.ttl)
+            ).rowcount
+
+            total = self.db_session.scalar(select(func.count()).select_from(ResultCacheEntry))
+            if total > self.max_entries:
+                least_recent = (
+                    select(ResultCacheEntry.content_key)
+                    .order_by(ResultCacheEntry.last_hit_at.asc())
+                    .limit(total - self.max_entries)
+                    .scalar_subquery()
+                )
+                removed += self.db_session.execute(
+                    delete(ResultCacheEntry).where(ResultCacheEntry.content_key.in_(least_recent))
+                ).rowcount
+
+            self.db_session.commit()
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao aplicar política de expiração do cache: {e}")
+
+        if removed:
+            logger.info(f"Cache de resultados: {removed} entradas removidas")
+        return removed
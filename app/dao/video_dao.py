@@ -1,10 +1,10 @@
+from typing import Iterable
+
+from sqlalchemy import String, bindparam, func, update
 from sqlalchemy.exc import IntegrityError
 
+from app.entities.video import VideoStatusUpdate
 from app.models.video import Video as VideoModel
-import logging
-
-logging.basicConfig()
-logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
 
 class VideoDAO:
     
@@ -12,24 +12,69 @@ class VideoDAO:
         self.db_session = db_session
         
     def update_video_status(self, video_id: int, status: int, file_path: str = None):
+        values = {"status": status}
+        if file_path:
+            values["file_path"] = file_path
+
+        # Um único UPDATE ... RETURNING em vez de SELECT + UPDATE + SELECT (refresh)
+        stmt = (
+            update(VideoModel)
+            .where(VideoModel.id == video_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        supports_returning = self.db_session.get_bind().dialect.update_returning
+        if supports_returning:
+            stmt = stmt.returning(
+                VideoModel.id, VideoModel.user_id, VideoModel.title, VideoModel.file_path, VideoModel.status
+            )
+
         try:
-            video = self.db_session.query(VideoModel).filter(VideoModel.id == video_id).first()
+            result = self.db_session.execute(stmt)
+            if supports_returning:
+                video = result.first()
+                found = video is not None
+            else:
+                video = None
+                found = result.rowcount > 0
 
-            if not video:
+            if not found:
+                self.db_session.rollback()
                 raise Exception(f"Vídeo com ID {video_id} não encontrado")
-            video.status = status
 
-            if file_path:
-                video.file_path = file_path
-            
             self.db_session.commit()
-            self.db_session.refresh(video)
-            
+
             return video
         except IntegrityError as e:
             self.db_session.rollback()
             raise Exception(f"Erro ao atualizar vídeo: {e}")
     
+    def update_statuses(self, updates: Iterable[VideoStatusUpdate]) -> int:
+        # Um único UPDATE executado em lote (executemany) e um único commit para vários vídeos
+        table = VideoModel.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                status=bindparam("b_status"),
+                file_path=func.coalesce(bindparam("b_file_path", type_=String), table.c.file_path),
+            )
+        )
+        params = [
+            {"b_id": item.video_id, "b_status": item.status, "b_file_path": item.file_path}
+            for item in updates
+        ]
+        if not params:
+            return 0
+
+        try:
+            updated = self.db_session.execute(stmt, params).rowcount
+            self.db_session.commit()
+            return updated
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao atualizar status dos vídeos em lote: {e}")
+
     def get_video_by_id(self, video_id: int):
         try:
             video = self.db_session.query(VideoModel).filter(
@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+import logging
+import math
+import os
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from app.dao.worker_tables import ensure_worker_table, utcnow
+from app.models.video_lease import VideoLease
+
+logger = logging.getLogger(__name__)
+
+LEASE_ACQUIRED = "acquired"
+LEASE_BUSY = "busy"
+LEASE_COMPLETED = "completed"
+
+
+@dataclass(frozen=True)
+class LeaseClaim:
+    state: str
+    # Segundos até o lease atual expirar (para reentregar a mensagem depois disso)
+    retry_after_seconds: int = 0
+
+    @property
+    def acquired(self) -> bool:
+        return self.state == LEASE_ACQUIRED
+
+
+class VideoLeaseDAO:
+
+    def __init__(self, db_session, ttl_seconds: Optional[int] = None, retention_seconds: Optional[int] = None):
+        self.db_session = db_session
+        if ttl_seconds is None:
+            ttl_seconds = int(os.getenv("VIDEO_LEASE_TTL_SECONDS", os.getenv("SQS_VISIBILITY_TIMEOUT", "300")))
+        if retention_seconds is None:
+            retention_seconds = int(os.getenv("VIDEO_LEASE_RETENTION_SECONDS", "3600"))
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.retention = timedelta(seconds=retention_seconds)
+        ensure_worker_table(db_session, VideoLease)
+
+    def acquire(self, video_id: int, owner: str) -> LeaseClaim:
+        now = utcnow()
+        values = {"owner": owner, "completed": False, "acquired_at": now, "expires_at": now + self.ttl}
+
+        try:
+            self.db_session.add(VideoLease(video_id=video_id, **values))
+            self.db_session.commit()
+            return LeaseClaim(LEASE_ACQUIRED)
+        except IntegrityError:
+            self.db_session.rollback()
+
+        try:
+            # Lease expirado (worker que caiu ou conclusão antiga) é assumido com um UPDATE condicional
+            taken = self.db_session.execute(
+                update(VideoLease)
+                .where(VideoLease.video_id == video_id, VideoLease.expires_at < now)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            self.db_session.commit()
+            if taken:
+                return LeaseClaim(LEASE_ACQUIRED)
+
+            lease = self.db_session.get(VideoLease, video_id, populate_existing=True)
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao adquirir lease do vídeo {video_id}: {e}")
+
+        if lease is None:
+            # Liberado entre o INSERT e a leitura: a próxima entrega tenta de novo
+            return LeaseClaim(LEASE_BUSY, 1)
+
+        retry_after = max(1, math.ceil((lease.expires_at - now).total_seconds()))
+        return LeaseClaim(LEASE_COMPLETED if lease.completed else LEASE_BUSY, retry_after)
+
+    def renew(self, owner: str) -> int:
+        # Um único UPDATE estende todos os leases em andamento do worker
+        try:
+            renewed = self.db_session.execute(
+                update(VideoLease)
+                .where(VideoLease.owner == owner, VideoLease.completed.is_(False))
+                .values(expires_at=utcnow() + self.ttl)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            self.db_session.commit()
+            return renewed
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao renovar leases: {e}")
+
+    def complete(self, video_id: int, owner: str) -> None:
+        # Mantido por um período para descartar entregas duplicadas sem reprocessar
+        try:
+            self.db_session.execute(
+                update(VideoLease)
+                .where(VideoLease.video_id == video_id, VideoLease.owner == owner)
+                .values(completed=True, expires_at=utcnow() + self.retention)
+                .execution_options(synchronize_session=False)
+            )
+            self.db_session.commit()
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao concluir lease do vídeo {video_id}: {e}")
+
+    def release(self, video_id: int, owner: str) -> None:
+        try:
+            self.db_session.execute(
+                delete(VideoLease).where(VideoLease.video_id == video_id, VideoLease.owner == owner)
+            )
+            self.db_session.commit()
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao liberar lease do vídeo {video_id}: {e}")
+
+    def purge_expired(self) -> int:
+        try:
+            removed = self.db_session.execute(
+                delete(VideoLease).where(VideoLease.expires_at < utcnow())
+            ).rowcount
+            self.db_session.commit()
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao remover leases expirados: {e}")
+
+        if removed:
+            logger.info(f"Leases de processamento: {removed} expirados removidos")
+        return removed
@@ -0,0 +1,46 @@
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app.dao.worker_tables import ensure_worker_table, utcnow
+from app.entities.video import ExtractionProgress
+from app.models.video_progress import VideoProgress
+
+
+class VideoProgressDAO:
+
+    def __init__(self, db_session):
+        self.db_session = db_session
+        ensure_worker_table(db_session, VideoProgress)
+
+    def save_progress(self, video_id: int, progress: ExtractionProgress) -> None:
+        values = {
+            "percent": progress.percent,
+            "frames": progress.frames,
+            "processed_seconds": progress.processed_seconds,
+            "updated_at": utcnow(),
+        }
+
+        try:
+            updated = self.db_session.execute(
+                update(VideoProgress)
+                .where(VideoProgress.video_id == video_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not updated:
+                self.db_session.add(VideoProgress(video_id=video_id, **values))
+            self.db_session.commit()
+        except IntegrityError:
+            # Outro worker inseriu a linha entre o UPDATE e o INSERT: o próximo relatório a atualiza
+            self.db_session.rollback()
+        except Exception as e:
+            self.db_session.rollback()
+            raise Exception(f"Erro ao gravar progresso do vídeo {video_id}: {e}")
+
+    def get_progress(self, video_id: int) -> Optional[VideoProgress]:
+        try:
+            return self.db_session.get(VideoProgress, video_id, populate_existing=True)
+        except Exception as e:
+            raise Exception(f"Erro ao buscar progresso do vídeo {video_id}: {e}")
@@ -0,0 +1,128 @@
+from typing import Callable, Dict, List, Optional
+import logging
+import os
+import threading
+import time
+
+from app.dao.video_dao import VideoDAO
+from app.entities.video import VideoStatusUpdate
+from app.infrastructure.metrics import track_stage
+
+logger = logging.getLogger(__name__)
+
+FlushCallback = Callable[[bool], None]
+
+
+class DeferredVideoDAO:
+    # Usado pelo caso de uso no lugar do VideoDAO: as atualizações ficam com o job até o flush
+    def __init__(self, video_dao: VideoDAO, updates: List[VideoStatusUpdate]):
+        self.video_dao = video_dao
+        self.updates = updates
+
+    def update_video_status(self, video_id: int, status: int, file_path: str = None):
+        self.updates.append(VideoStatusUpdate(video_id=int(video_id), status=status, file_path=file_path or None))
+
+    def get_video_by_id(self, video_id: int):
+        return self.video_dao.get_video_by_id(video_id)
+
+
+class VideoStatusWriter:
+    def __init__(
+        self,
+        session_factory,
+        flush_interval: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        if flush_interval is None:
+            flush_interval = float(os.getenv("STATUS_WRITER_FLUSH_INTERVAL", "0.5"))
+        if max_batch is None:
+            max_batch = int(os.getenv("STATUS_WRITER_MAX_BATCH", "200"))
+        if max_attempts is None:
+            max_attempts = int(os.getenv("STATUS_WRITER_MAX_ATTEMPTS", "3"))
+        self.flush_interval = max(0.01, flush_interval)
+        self.max_batch = max(1, max_batch)
+        self.max_attempts = max(1, max_attempts)
+
+        # Última atualização de cada vídeo desde o flush anterior
+        self._pending: Dict[int, VideoStatusUpdate] = {}
+        self._callbacks: List[FlushCallback] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, updates: List[VideoStatusUpdate], on_flushed: FlushCallback) -> None:
+        if not updates:
+            on_flushed(True)
+            return
+
+        with self._lock:
+            for item in updates:
+                previous = self._pending.get(item.video_id)
+                if previous is not None and item.file_path is None and previous.file_path:
+                    item = VideoStatusUpdate(item.video_id, item.status, previous.file_path)
+                self._pending[item.video_id] = item
+            self._callbacks.append(on_flushed)
+            batch_full = len(self._pending) >= self.max_batch
+            self._ensure_thread()
+
+        if batch_full:
+            self._wakeup.set()
+
+    def flush(self) -> bool:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                callbacks, self._callbacks = self._callbacks, []
+
+            flushed = not pending or self._write(list(pending.values()))
+
+        # Os callbacks removem ou devolvem as mensagens: só rodam depois do commit (ou da desistência)
+        for callback in callbacks:
+            try:
+                callback(flushed)
+            except Exception as e:
+                logger.error(f"Erro ao concluir mensagem após gravação de status: {str(e)}")
+        return flushed
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=self.flush_interval + 5)
+        self._thread = None
+        self.flush()
+
+    def _write(self, updates: List[VideoStatusUpdate]) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with track_stage("db"):
+                    with self.session_factory() as db:
+                        updated = VideoDAO(db).update_statuses(updates)
+                logger.info(f"Status de {len(updates)} vídeos gravados em uma transação ({updated} linhas)")
+                return True
+            except Exception as e:
+                logger.error(
+                    f"Erro ao gravar status de {len(updates)} vídeos "
+                    f"(tentativa {attempt}/{self.max_attempts}): {str(e)}"
+                )
+                if attempt < self.max_attempts:
+                    time.sleep(min(5.0, 0.5 * attempt))
+        return False
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+import threading
+
+# Tabelas próprias do worker (cache de resultados, leases, progresso) são criadas no primeiro uso
+# em cada banco, com CREATE TABLE IF NOT EXISTS; o papel do worker precisa de CREATE no schema
+_ready_tables = set()
+_ready_lock = threading.Lock()
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def ensure_worker_table(db_session, model) -> None:
+    bind = db_session.get_bind()
+    table_key = (str(bind.url), model.__tablename__)
+    if table_key in _ready_tables:
+        return
+
+    with _ready_lock:
+        if table_key not in _ready_tables:
+            model.__table__.create(bind=bind, checkfirst=True)
+            _ready_tables.add(table_key)
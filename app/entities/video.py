@@ -1,4 +1,30 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+EXTRACTION_MODES = ("fps", "keyframes", "scene")
+FRAME_FORMATS = ("png", "jpeg", "webp")
+FRAME_FORMAT_ALIASES = {"jpg": "jpeg"}
+DEFAULT_QUALITY = {"jpeg": 85, "webp": 80}
+EXTRACTION_OPTION_KEYS = {
+    "mode", "fps", "format", "quality", "max_width", "max_height", "scene_threshold", "max_frames",
+}
+MAX_FPS = 60
+DEFAULT_SCENE_THRESHOLD = 0.3
+MAX_FRAMES_LIMIT = 100000
+MIN_FRAME_DIMENSION = 16
+MAX_FRAME_DIMENSION = 7680
+
+
+def _option_number(data: Dict[str, Any], name: str, minimum: float, maximum: float, integer: bool):
+    value = data.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (integer and value != int(value)):
+        raise ValueError(f"Opção de extração inválida: {name}={value!r}")
+    if not minimum <= value <= maximum:
+        raise ValueError(f"Opção de extração fora do intervalo: {name}={value} (permitido {minimum}-{maximum})")
+    return int(value) if integer else value
+
 
 @dataclass
 class Video:
@@ -8,9 +34,154 @@ class Video:
     status: int
     id: int = None
 
+
+@dataclass(frozen=True)
+class VideoProbe:
+    duration_seconds: float
+    width: int
+    height: int
+    codec: str
+    size_bytes: int = 0
+
+
+@dataclass(frozen=True)
+class ExtractionOptions:
+    mode: str = "fps"
+    fps: float = 1
+    image_format: str = "png"
+    quality: Optional[int] = None
+    max_width: Optional[int] = None
+    max_height: Optional[int] = None
+    scene_threshold: Optional[float] = None
+    max_frames: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "ExtractionOptions":
+        if not data:
+            return cls()
+        if not isinstance(data, dict):
+            raise ValueError("Opções de extração devem ser um objeto")
+
+        unknown = set(data) - EXTRACTION_OPTION_KEYS
+        if unknown:
+            raise ValueError(f"Opções de extração desconhecidas: {', '.join(sorted(unknown))}")
+
+        mode = str(data.get("mode") or "fps").strip().lower()
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"Modo de extração não suportado: {mode}")
+
+        image_format = str(data.get("format") or "png").strip().lower()
+        image_format = FRAME_FORMAT_ALIASES.get(image_format, image_format)
+        if image_format not in FRAME_FORMATS:
+            raise ValueError(f"Formato de frame não suportado: {image_format}")
+
+        fps = _option_number(data, "fps", 0, MAX_FPS, integer=False)
+        if fps == 0:
+            raise ValueError("Opção de extração inválida: fps deve ser maior que zero")
+        if mode != "fps":
+            # Keyframes e cenas emitem frames nos instantes do próprio vídeo
+            fps = None
+
+        scene_threshold = _option_number(data, "scene_threshold", 0, 1, integer=False)
+        if scene_threshold in (0, 1):
+            raise ValueError("Opção de extração inválida: scene_threshold deve estar entre 0 e 1")
+        if mode != "scene":
+            scene_threshold = None
+        elif scene_threshold is None:
+            scene_threshold = DEFAULT_SCENE_THRESHOLD
+
+        # Qualidade só se aplica aos formatos com perda; PNG é sempre sem perda
+        quality = _option_number(data, "quality", 1, 100, integer=True)
+        if image_format == "png":
+            quality = None
+        elif quality is None:
+            quality = DEFAULT_QUALITY[image_format]
+
+        return cls(
+            mode=mode,
+            fps=fps if fps is not None else 1,
+            image_format=image_format,
+            quality=quality,
+            max_width=_option_number(data, "max_width", MIN_FRAME_DIMENSION, MAX_FRAME_DIMENSION, integer=True),
+            max_height=_option_number(data, "max_height", MIN_FRAME_DIMENSION, MAX_FRAME_DIMENSION, integer=True),
+            scene_threshold=scene_threshold,
+            max_frames=_option_number(data, "max_frames", 1, MAX_FRAMES_LIMIT, integer=True),
+        )
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.image_format == "jpeg" else self.image_format
+
+    @property
+    def records_timestamps(self) -> bool:
+        # Fora do modo fps os instantes dos frames não são deriváveis do índice
+        return self.mode != "fps"
+
+    def signature(self) -> str:
+        # Parâmetros que alteram o conteúdo do ZIP; entram na chave do cache de resultados
+        if self.mode == "scene":
+            parts = [f"scene={self.scene_threshold:g}"]
+        elif self.mode == "keyframes":
+            parts = ["keyframes"]
+        else:
+            parts = [f"fps={self.fps:g}"]
+        parts.append(self.image_format)
+        if self.quality is not None:
+            parts.append(f"q={self.quality}")
+        if self.max_width or self.max_height:
+            parts.append(f"max={self.max_width or ''}x{self.max_height or ''}")
+        if self.max_frames:
+            parts.append(f"frames={self.max_frames}")
+        return "/".join(parts)
+
+
 @dataclass
 class ProcessingMessage:
     video_id: int
     video_path: str
     timestamp: str
-    user_id: int
+    user_id: Optional[int] = None
+    s3_key: Optional[str] = None
+    options: ExtractionOptions = field(default_factory=ExtractionOptions)
+
+    @classmethod
+    def from_dict(cls, body: Dict[str, Any]) -> "ProcessingMessage":
+        missing = [name for name in ("video_id", "video_path", "timestamp") if not body.get(name)]
+        if missing:
+            raise ValueError(f"Faltam campos obrigatórios: {', '.join(missing)}")
+
+        return cls(
+            video_id=body["video_id"],
+            video_path=body["video_path"],
+            timestamp=body["timestamp"],
+            user_id=body.get("user_id"),
+            s3_key=body.get("s3_key"),
+            options=ExtractionOptions.from_dict(body.get("extraction")),
+        )
+
+
+@dataclass(frozen=True)
+class VideoStatusUpdate:
+    video_id: int
+    status: int
+    file_path: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class FailureNotification:
+    video_id: int
+    error_message: str
+    user_id: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class ExtractionProgress:
+    frames: int
+    processed_seconds: float
+    duration_seconds: Optional[float] = None
+
+    @property
+    def percent(self) -> Optional[float]:
+        if not self.duration_seconds:
+            return None
+        return round(min(100.0, 100.0 * self.processed_seconds / self.duration_seconds), 1)
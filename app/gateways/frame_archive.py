@@ -0,0 +1,176 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Deque, Optional, Tuple, Union
+import logging
+import os
+import time
+import zipfile
+import zlib
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_AUTO = "auto"
+COMPRESSION_STORED = "stored"
+COMPRESSION_DEFLATE = "deflate"
+
+ALREADY_COMPRESSED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".zip", ".mp4"}
+
+
+@dataclass(frozen=True)
+class ArchivePolicy:
+    compression: str = COMPRESSION_AUTO
+    level: int = 6
+    parallel_workers: int = 0
+
+    @classmethod
+    def from_env(cls) -> "ArchivePolicy":
+        compression = os.getenv("ARCHIVE_COMPRESSION", COMPRESSION_AUTO).strip().lower()
+        if compression not in (COMPRESSION_AUTO, COMPRESSION_STORED, COMPRESSION_DEFLATE):
+            logger.warning(f"ARCHIVE_COMPRESSION inválido ({compression}), usando {COMPRESSION_AUTO}")
+            compression = COMPRESSION_AUTO
+
+        return cls(
+            compression=compression,
+            level=max(0, min(int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "6")), 9)),
+            parallel_workers=max(0, int(os.getenv("ARCHIVE_PARALLEL_WORKERS", "0"))),
+        )
+
+    def compress_type_for(self, name: str) -> int:
+        if self.compression == COMPRESSION_STORED:
+            return zipfile.ZIP_STORED
+        if self.compression == COMPRESSION_DEFLATE:
+            return zipfile.ZIP_DEFLATED
+        if Path(name).suffix.lower() in ALREADY_COMPRESSED_SUFFIXES:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def describe(self) -> str:
+        description = self.compression
+        if self.compression != COMPRESSION_STORED:
+            description += f"/nível {self.level}"
+        if self.parallel_workers > 1:
+            description += f"/{self.parallel_workers} threads"
+        return description
+
+
+@dataclass
+class ArchiveStats:
+    policy: str
+    entries: int = 0
+    raw_bytes: int = 0
+    archived_bytes: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def ratio(self) -> float:
+        if not self.raw_bytes:
+            return 1.0
+        return self.archived_bytes / self.raw_bytes
+
+
+def _deflate(data: bytes, level: int) -> Tuple[bytes, int]:
+    # Deflate "cru" (wbits negativo), formato esperado dentro de entradas ZIP
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(), zlib.crc32(data)
+
+
+class FrameArchiveWriter:
+    def __init__(self, target: Union[Path, BinaryIO], policy: ArchivePolicy):
+        self.policy = policy
+        self.stats = ArchiveStats(policy=policy.describe())
+        self._zipf = zipfile.ZipFile(target, "w")
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Deque[Tuple[zipfile.ZipInfo, bytes, Optional[Future]]] = deque()
+
+        if policy.parallel_workers > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=policy.parallel_workers, thread_name_prefix="zip-deflate"
+            )
+
+    def __enter__(self) -> "FrameArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, name: str, data: bytes) -> None:
+        started_at = time.perf_counter()
+
+        zinfo = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        zinfo.compress_type = self.policy.compress_type_for(name)
+        zinfo.external_attr = 0o600 << 16
+        self.stats.entries += 1
+        self.stats.raw_bytes += len(data)
+
+        if self._executor is None or zinfo.compress_type == zipfile.ZIP_STORED:
+            future = None
+        else:
+            future = self._executor.submit(_deflate, data, self.policy.level)
+        self._pending.append((zinfo, data, future))
+
+        # Janela limitada: as entradas são gravadas na ordem em que chegaram
+        window = max(1, self.policy.parallel_workers * 2)
+        while len(self._pending) >= window:
+            self._write_next()
+
+        self.stats.elapsed_seconds += time.perf_counter() - started_at
+
+    def close(self) -> ArchiveStats:
+        started_at = time.perf_counter()
+        try:
+            while self._pending:
+                self._write_next()
+            self._zipf.close()
+        finally:
+            self._shutdown_executor()
+
+        self.stats.elapsed_seconds += time.perf_counter() - started_at
+        return self.stats
+
+    def abort(self) -> None:
+        self._pending.clear()
+        self._shutdown_executor()
+        try:
+            self._zipf.close()
+        except Exception:
+            pass
+
+    def _shutdown_executor(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _write_next(self) -> None:
+        zinfo, data, future = self._pending.popleft()
+        if future is None:
+            self._zipf.writestr(zinfo, data, compresslevel=self.policy.level)
+        else:
+            payload, crc = future.result()
+            self._write_precompressed(zinfo, payload, crc, len(data))
+        self.stats.archived_bytes += zinfo.compress_size
+
+    def _write_precompressed(self, zinfo: zipfile.ZipInfo, payload: bytes, crc: int, file_size: int) -> None:
+        # Equivalente a ZipFile.writestr, mas com os dados já comprimidos em outra thread
+        zipf = self._zipf
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(payload)
+        zinfo.CRC = crc
+        zinfo.flag_bits = 0
+        zip64 = file_size > zipfile.ZIP64_LIMIT or len(payload) > zipfile.ZIP64_LIMIT
+
+        with zipf._lock:
+            if zipf._seekable:
+                zipf.fp.seek(zipf.start_dir)
+            zinfo.header_offset = zipf.fp.tell()
+            zipf._writecheck(zinfo)
+            zipf._didModify = True
+            zipf.fp.write(zinfo.FileHeader(zip64))
+            zipf.fp.write(payload)
+            zipf.start_dir = zipf.fp.tell()
+            zipf.filelist.append(zinfo)
+            zipf.NameToInfo[zinfo.filename] = zinfo
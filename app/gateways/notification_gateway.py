@@ -1,18 +1,125 @@
 import logging
 import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 import boto3
 
+from app.entities.video import FailureNotification
+from app.infrastructure.metrics import NOTIFICATIONS
+
 
 logger = logging.getLogger(__name__)
 
+DIGEST_GROUP_USER = "user"
+DIGEST_GROUP_GLOBAL = "global"
+DIGEST_MAX_ENTRIES = 50
+DIGEST_ERROR_MAX_CHARS = 200
+DIGEST_SUBJECT = "Falhas no processamento de vídeos"
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self) -> bool:
+        if self.rate <= 0:
+            return True
+
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def seconds_until_available(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+
+@dataclass
+class _PendingDigest:
+    user_id: Optional[int]
+    count: int = 0
+    # Apenas as primeiras falhas são listadas; as demais entram só na contagem
+    entries: List[Tuple[int, Optional[int], str]] = field(default_factory=list)
+
+    def add(self, video_id: int, user_id: Optional[int], error_message: str) -> None:
+        self.count += 1
+        if len(self.entries) < DIGEST_MAX_ENTRIES:
+            self.entries.append((video_id, user_id, error_message))
+
+    def merge(self, other: "_PendingDigest") -> None:
+        self.count += other.count
+        self.entries = (other.entries + self.entries)[:DIGEST_MAX_ENTRIES]
+
+
+def _truncate(error_message: str) -> str:
+    if len(error_message) <= DIGEST_ERROR_MAX_CHARS:
+        return error_message
+    return error_message[:DIGEST_ERROR_MAX_CHARS - 3] + "..."
+
+
+class DeferredNotificationGateway:
+    # Usado nos processos do pool: as falhas voltam ao processo principal com o resultado do job,
+    # onde o limite de envio e os digests valem para o nó inteiro
+    def __init__(self, notifications: List[FailureNotification]):
+        self.notifications = notifications
+
+    def notify_processing_error(self, video_id: int, error_message: str, user_id: int | None = None) -> bool:
+        self.notifications.append(FailureNotification(video_id, error_message, user_id))
+        return True
+
 
 class NotificationGateway:
-    def __init__(self, topic_arn: str | None = None, region: str | None = None):
+    def __init__(
+        self,
+        topic_arn: str | None = None,
+        region: str | None = None,
+        digest_interval: float | None = None,
+        digest_group: str | None = None,
+        rate_per_minute: float | None = None,
+        burst: int | None = None,
+    ):
         self.topic_arn = topic_arn or os.getenv("PROCESSING_NOTIFICATIONS_TOPIC_ARN")
         self.region = region or os.getenv("AWS_REGION", "us-east-1")
         self._client = None
 
+        if digest_interval is None:
+            digest_interval = float(os.getenv("NOTIFICATION_DIGEST_INTERVAL", "0"))
+        if digest_group is None:
+            digest_group = os.getenv("NOTIFICATION_DIGEST_GROUP", DIGEST_GROUP_USER).strip().lower()
+        if digest_group not in (DIGEST_GROUP_USER, DIGEST_GROUP_GLOBAL):
+            logger.warning(f"NOTIFICATION_DIGEST_GROUP inválido ({digest_group}), usando {DIGEST_GROUP_USER}")
+            digest_group = DIGEST_GROUP_USER
+        if rate_per_minute is None:
+            rate_per_minute = float(os.getenv("NOTIFICATION_RATE_PER_MINUTE", "0"))
+        if burst is None:
+            burst = int(os.getenv("NOTIFICATION_BURST", "10"))
+
+        self.digest_interval = max(0.0, digest_interval)
+        self.digest_group = digest_group
+        self._bucket = TokenBucket(max(0.0, rate_per_minute) / 60, burst)
+        self._pending: Dict[Optional[int], _PendingDigest] = {}
+        self._lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+
     @property
     def enabled(self) -> bool:
         return bool(self.topic_arn)
@@ -30,6 +137,85 @@ class NotificationGateway:
             logger.info("Notificação de erro desativada (PROCESSING_NOTIFICATIONS_TOPIC_ARN não configurado)")
             return False
 
+        with self._lock:
+            # Sem digest, publica na hora enquanto houver tokens; o excedente vira digest
+            send_now = self.digest_interval <= 0 and not self._pending and self._bucket.try_acquire()
+            if not send_now:
+                key = user_id if self.digest_group == DIGEST_GROUP_USER else None
+                self._pending.setdefault(key, _PendingDigest(key)).add(video_id, user_id, error_message)
+                self._schedule_flush()
+
+        if not send_now:
+            NOTIFICATIONS.inc(kind="buffered")
+            return True
+
+        self._publish_single(client, video_id, error_message, user_id)
+        return True
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flush_timer = None
+
+        client = self._client_or_none()
+        if client is None or not pending:
+            return 0
+
+        sent = 0
+        postponed: Dict[Optional[int], _PendingDigest] = {}
+        for key, digest in pending.items():
+            if not self._bucket.try_acquire():
+                postponed[key] = digest
+                continue
+
+            try:
+                if digest.count == 1:
+                    video_id, user_id, error_message = digest.entries[0]
+                    self._publish_single(client, video_id, error_message, user_id)
+                else:
+                    self._publish_digest(client, digest)
+                sent += 1
+            except Exception as e:
+                logger.error(f"Erro ao publicar digest de {digest.count} falhas: {str(e)}")
+
+        if postponed:
+            suppressed = sum(digest.count for digest in postponed.values())
+            logger.warning(f"Limite de notificações atingido: {suppressed} falhas aguardam o próximo digest")
+            with self._lock:
+                for key, digest in postponed.items():
+                    current = self._pending.get(key)
+                    if current is None:
+                        self._pending[key] = digest
+                    else:
+                        current.merge(digest)
+                self._schedule_flush()
+        return sent
+
+    def close(self) -> None:
+        with self._lock:
+            timer, self._flush_timer = self._flush_timer, None
+        if timer is not None:
+            timer.cancel()
+
+        self.flush()
+        with self._lock:
+            timer, self._flush_timer = self._flush_timer, None
+            lost = sum(digest.count for digest in self._pending.values())
+            self._pending = {}
+        if timer is not None:
+            timer.cancel()
+        if lost:
+            logger.warning(f"{lost} notificações de falha descartadas no encerramento pelo limite de envio")
+
+    def _schedule_flush(self) -> None:
+        if self._flush_timer is not None:
+            return
+        delay = max(self.digest_interval, self._bucket.seconds_until_available(), 1.0)
+        self._flush_timer = threading.Timer(delay, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _publish_single(self, client, video_id: int, error_message: str, user_id: int | None) -> None:
         user_part = f"Usuário: {user_id}\n" if user_id is not None else ""
         message = (
             "Falha no processamento de vídeo\n\n"
@@ -43,4 +229,22 @@ class NotificationGateway:
             Subject="Falha no processamento de vídeo",
             Message=message,
         )
-        return True
+        NOTIFICATIONS.inc(kind="single")
+
+    def _publish_digest(self, client, digest: _PendingDigest) -> None:
+        lines = [f"{digest.count} falhas no processamento de vídeos"]
+        if digest.user_id is not None:
+            lines.append(f"Usuário: {digest.user_id}")
+        lines.append("")
+        for video_id, user_id, error_message in digest.entries:
+            user_part = f" (usuário {user_id})" if digest.user_id is None and user_id is not None else ""
+            lines.append(f"Video ID: {video_id}{user_part} - Erro: {_truncate(error_message)}")
+        if digest.count > len(digest.entries):
+            lines.append(f"... e mais {digest.count - len(digest.entries)} falhas")
+
+        client.publish(
+            TopicArn=self.topic_arn,
+            Subject=DIGEST_SUBJECT,
+            Message="\n".join(lines),
+        )
+        NOTIFICATIONS.inc(kind="digest")
@@ -1,10 +1,250 @@
+import io
 import logging
 import os
+import struct
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from app.infrastructure.metrics import record_bytes
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+MIN_MULTIPART_PART_SIZE = 5 * MB
+STREAM_PROBE_BYTES = 64 * 1024
+MP4_MAX_TOP_LEVEL_ATOMS = 16
+MP4_TOP_LEVEL_ATOMS = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pdin", b"uuid"}
+
+
+def _build_transfer_config() -> TransferConfig:
+    # Acima do limite, download_file/upload_file usam multipart e GETs com
+    # Range em paralelo (max_concurrency threads por transferência)
+    return TransferConfig(
+        multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "64")) * MB,
+        multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNKSIZE_MB", "16")) * MB,
+        max_concurrency=int(os.getenv("S3_MAX_CONCURRENCY", "10")),
+        use_threads=True,
+    )
+
+
+def _throughput_mb_s(size_bytes: int, elapsed_seconds: float) -> float:
+    return (size_bytes / MB) / max(elapsed_seconds, 1e-6)
+
+
+def _mp4_has_leading_moov(read_range: Callable[[int, int], bytes]) -> bool:
+    offset = 0
+    for _ in range(MP4_MAX_TOP_LEVEL_ATOMS):
+        header = read_range(offset, 16)
+        if len(header) < 8:
+            return False
+
+        size, atom_type = struct.unpack(">I4s", header[:8])
+        if atom_type == b"moov":
+            return True
+        if atom_type == b"mdat":
+            return False
+
+        if size == 1 and len(header) >= 16:
+            size = struct.unpack(">Q", header[8:16])[0]
+        if size < 8:
+            # size 0 (atom até o fim do arquivo) ou cabeçalho inválido
+            return False
+        offset += size
+
+    return False
+
+
+def is_streamable_container(read_range: Callable[[int, int], bytes]) -> bool:
+    head = read_range(0, 16)
+
+    if head[4:8] in MP4_TOP_LEVEL_ATOMS:
+        # MP4/MOV só pode ser lido sequencialmente com o moov antes do mdat
+        return _mp4_has_leading_moov(read_range)
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return True  # Matroska/WebM
+    if head.startswith(b"FLV"):
+        return True
+    if head[:1] == b"\x47" and read_range(188, 1) == b"\x47":
+        return True  # MPEG-TS
+
+    return False
+
+
+class ResumableObjectStream(io.RawIOBase):
+    # Corpo de um GetObject que, se a conexão cair no meio, é reaberto com Range a partir do último
+    # byte entregue; o IfMatch garante que a continuação é do mesmo objeto
+    def __init__(self, s3_client, bucket_name: str, s3_key: str, max_retries: int):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.s3_key = s3_key
+        self.max_retries = max(0, max_retries)
+        self.content_length: Optional[int] = None
+        self._offset = 0
+        self._etag: Optional[str] = None
+        self._body = self._open()
+
+    def _open(self):
+        request = {"Bucket": self.bucket_name, "Key": self.s3_key}
+        if self._offset:
+            request.update(Range=f"bytes={self._offset}-", IfMatch=self._etag)
+        response = self.s3_client.get_object(**request)
+        if self._etag is None:
+            self._etag = response.get("ETag")
+            self.content_length = response.get("ContentLength")
+        return response["Body"]
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self._body is None:
+                    self._body = self._open()
+                chunk = self._body.read(size if size is not None and size >= 0 else None)
+                self._offset += len(chunk)
+                return chunk
+            except Exception as e:
+                self._close_body()
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(
+                    f"Leitura de {self.s3_key} interrompida após {self._offset} bytes ({str(e)}); "
+                    f"retomando ({attempt + 1}/{self.max_retries})"
+                )
+
+    def _close_body(self) -> None:
+        body, self._body = self._body, None
+        if body is not None:
+            try:
+                body.close()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        self._close_body()
+        super().close()
+
+
+class S3MultipartWriter(io.RawIOBase):
+    def __init__(self, s3_client, bucket_name: str, s3_key: str, part_size: int, max_concurrency: int):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.s3_key = s3_key
+        self.part_size = max(part_size, MIN_MULTIPART_PART_SIZE)
+        self._buffer = bytearray()
+        self._position = 0
+        self._next_part_number = 1
+        self._parts: Dict[int, Future] = {}
+        self._started_at = time.perf_counter()
+        # Limita as partes em memória aguardando upload
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="s3-part")
+
+        response = self.s3_client.create_multipart_upload(Bucket=self.bucket_name, Key=self.s3_key)
+        self.upload_id = response["UploadId"]
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        return self._position
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("Escrita em upload multipart já encerrado")
+
+        self._buffer.extend(data)
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        try:
+            if self._buffer or not self._parts:
+                self._submit_part(bytes(self._buffer))
+                self._buffer.clear()
+
+            parts: List[Dict] = [
+                {"PartNumber": part_number, "ETag": self._parts[part_number].result()}
+                for part_number in sorted(self._parts)
+            ]
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.s3_key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            elapsed = time.perf_counter() - self._started_at
+            record_bytes("upload", self._position)
+            logger.info(
+                f"Upload multipart concluído: {self.s3_key} ({self._position} bytes em {len(parts)} partes, "
+                f"{elapsed:.2f}s, {_throughput_mb_s(self._position, elapsed):.1f} MB/s)"
+            )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown(wait=True)
+            super().close()
+
+    def abort(self) -> None:
+        if self.closed:
+            return
+
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=self.s3_key, UploadId=self.upload_id
+            )
+            logger.warning(f"Upload multipart abortado: {self.s3_key}")
+        except Exception as e:
+            logger.error(f"Erro ao abortar upload multipart de {self.s3_key}: {str(e)}")
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _submit_part(self, data: bytes) -> None:
+        part_number = self._next_part_number
+        self._next_part_number += 1
+
+        self._slots.acquire()
+        future = self._executor.submit(self._upload_part, part_number, data)
+        future.add_done_callback(lambda _f: self._slots.release())
+        self._parts[part_number] = future
+
+    def _upload_part(self, part_number: int, data: bytes) -> str:
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.s3_key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return response["ETag"]
+
 
 class S3Gateway:
     def __init__(self, base_dir: Path):
@@ -12,18 +252,41 @@ class S3Gateway:
         self.bucket_name = os.getenv("AWS_S3_BUCKET", "video-processor-bucket")
         self.region = os.getenv("AWS_REGION", "us-east-1")
         self.env = os.getenv("APP_ENV", "development")
-        
-        if self.env != "development":
-            self.s3_client = boto3.client(
-                's3',
-                region_name=self.region,
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                endpoint_url=os.getenv("AWS_ENDPOINT_URL")
-            )
-        
+        self.transfer_config = _build_transfer_config()
+        self.stream_max_retries = int(os.getenv("S3_STREAMING_MAX_RETRIES", "3"))
+        self._s3_client = None
+        self._client_lock = threading.Lock()
+        self._open_writers: "weakref.WeakSet[S3MultipartWriter]" = weakref.WeakSet()
+        self._writers_lock = threading.Lock()
+
         logger.info(f"S3Gateway inicializado - Bucket: {self.bucket_name}, Env: {self.env}")
 
+    @property
+    def s3_client(self):
+        # Criado no primeiro uso: a inicialização do worker não paga o custo do botocore
+        if self._s3_client is None:
+            with self._client_lock:
+                if self._s3_client is None:
+                    self._s3_client = self._create_client()
+        return self._s3_client
+
+    @s3_client.setter
+    def s3_client(self, client) -> None:
+        self._s3_client = client
+
+    def _create_client(self):
+        max_pool_connections = int(
+            os.getenv("S3_MAX_POOL_CONNECTIONS", str(max(10, 2 * self.transfer_config.max_concurrency)))
+        )
+        return boto3.client(
+            's3',
+            region_name=self.region,
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
+            config=Config(max_pool_connections=max_pool_connections)
+        )
+
     def download_video(self, s3_key: str, local_path: str) -> bool:
         if self.env == "development":
             path = Path(local_path)
@@ -35,8 +298,15 @@ class S3Gateway:
                 return False
         
         try:
-            self.s3_client.download_file(self.bucket_name, s3_key, local_path)
-            logger.info(f"Vídeo baixado do S3: {s3_key} -> {local_path}")
+            started_at = time.perf_counter()
+            self.s3_client.download_file(self.bucket_name, s3_key, local_path, Config=self.transfer_config)
+            elapsed = time.perf_counter() - started_at
+            size_bytes = Path(local_path).stat().st_size
+            record_bytes("download", size_bytes)
+            logger.info(
+                f"Vídeo baixado do S3: {s3_key} -> {local_path} "
+                f"({size_bytes} bytes em {elapsed:.2f}s, {_throughput_mb_s(size_bytes, elapsed):.1f} MB/s)"
+            )
             return True
         except Exception as e:
             logger.error(f"Erro ao baixar vídeo do S3: {str(e)}")
@@ -48,9 +318,102 @@ class S3Gateway:
             return True
         
         try:
-            self.s3_client.upload_file(local_path, self.bucket_name, s3_key)
-            logger.info(f"Vídeo enviado para S3: {local_path} -> {s3_key}")
+            started_at = time.perf_counter()
+            self.s3_client.upload_file(local_path, self.bucket_name, s3_key, Config=self.transfer_config)
+            elapsed = time.perf_counter() - started_at
+            size_bytes = Path(local_path).stat().st_size if Path(local_path).exists() else 0
+            record_bytes("upload", size_bytes)
+            logger.info(
+                f"Vídeo enviado para S3: {local_path} -> {s3_key} "
+                f"({size_bytes} bytes em {elapsed:.2f}s, {_throughput_mb_s(size_bytes, elapsed):.1f} MB/s)"
+            )
             return True
         except Exception as e:
             logger.error(f"Erro ao enviar vídeo para S3: {str(e)}")
             return False
+
+    def _read_range(self, s3_key: str, start: int, length: int) -> bytes:
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            Range=f"bytes={start}-{start + length - 1}",
+        )
+        return response["Body"].read()
+
+    def is_streamable(self, s3_key: str) -> bool:
+        if self.env == "development":
+            return False
+
+        try:
+            head = self._read_range(s3_key, 0, STREAM_PROBE_BYTES)
+
+            def read_range(start: int, length: int) -> bytes:
+                if start + length <= len(head) or len(head) < STREAM_PROBE_BYTES:
+                    return head[start:start + length]
+                return self._read_range(s3_key, start, length)
+
+            return is_streamable_container(read_range)
+        except Exception as e:
+            logger.warning(f"Não foi possível inspecionar o container de {s3_key}: {str(e)}")
+            return False
+
+    def get_object_fingerprint(self, s3_key: str) -> Optional[str]:
+        if self.env == "development":
+            return None
+
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+            etag = head["ETag"].strip('"')
+            return f"{etag}:{head['ContentLength']}"
+        except Exception as e:
+            logger.warning(f"Não foi possível obter ETag de {s3_key}: {str(e)}")
+            return None
+
+    def object_exists(self, s3_key: str) -> bool:
+        if self.env == "development":
+            return False
+
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+            return True
+        except Exception:
+            return False
+
+    def presigned_url(self, s3_key: str, expires_seconds: int = 900) -> Optional[str]:
+        if self.env == "development":
+            return None
+
+        try:
+            return self.s3_client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": self.bucket_name, "Key": s3_key},
+                ExpiresIn=expires_seconds,
+            )
+        except Exception as e:
+            logger.warning(f"Não foi possível gerar URL pré-assinada de {s3_key}: {str(e)}")
+            return None
+
+    def open_video_stream(self, s3_key: str) -> BinaryIO:
+        stream = ResumableObjectStream(self.s3_client, self.bucket_name, s3_key, self.stream_max_retries)
+        logger.info(f"Lendo vídeo do S3 em streaming: {s3_key} ({stream.content_length} bytes)")
+        return stream
+
+    def open_multipart_writer(self, s3_key: str) -> S3MultipartWriter:
+        writer = S3MultipartWriter(
+            self.s3_client,
+            self.bucket_name,
+            s3_key,
+            part_size=self.transfer_config.multipart_chunksize,
+            max_concurrency=self.transfer_config.max_concurrency,
+        )
+        with self._writers_lock:
+            self._open_writers.add(writer)
+        return writer
+
+    def abort_uploads(self) -> int:
+        # Usado ao abandonar jobs no encerramento: partes já enviadas não ficam cobradas no bucket
+        with self._writers_lock:
+            writers = [writer for writer in self._open_writers if not writer.closed]
+        for writer in writers:
+            writer.abort()
+        return len(writers)
@@ -1,90 +1,1179 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import BinaryIO, Callable, Deque, Iterator, List, Optional, Tuple, Union
+import asyncio
+import json
+import math
+import queue
+import re
 import shutil
+import struct
 import subprocess
-import zipfile
+import threading
+import time
 import logging
 import os
 
+from app.entities.video import ExtractionOptions, ExtractionProgress, VideoProbe
+from app.gateways.frame_archive import ArchivePolicy, ArchiveStats, FrameArchiveWriter
 from app.gateways.s3_gateway import S3Gateway
+from app.infrastructure.metrics import FFMPEG_KILLS, record_bytes, record_frames, track_stage
 
 logger = logging.getLogger(__name__)
 
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+JPEG_SOS = 0xDA
+# Marcadores JPEG sem campo de tamanho (TEM e RSTn)
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+STDIN_CHUNK_SIZE = 1024 * 1024
+PIPE_READ_SIZE = 64 * 1024
+FRAME_ENCODERS = {"png": "png", "jpeg": "mjpeg", "webp": "libwebp"}
+TIMESTAMPS_MANIFEST = "timestamps.json"
+SHOWINFO_PTS_TIME = re.compile(r"\[Parsed_showinfo_\d+ @ [^\]]+\] n:\s*\d+ pts:\s*-?\d+ pts_time:(-?[0-9.]+)")
+# Blocos chave=valor do -progress, escritos no mesmo stderr dos logs (sem o banner, que só ocuparia o final guardado)
+FFMPEG_WATCH_ARGS = ["-hide_banner", "-nostats", "-progress", "pipe:2"]
+FFMPEG_PROGRESS_LINE = re.compile(
+    r"^(frame|fps|stream_\d+_\d+_q|bitrate|total_size|out_time_us|out_time_ms|out_time"
+    r"|dup_frames|drop_frames|speed|progress)=\s*(.*)$"
+)
+# No modo scene o select imprime o instante decodificado uma vez por segundo de vídeo, sem alterar a seleção,
+# porque o out_time do -progress fica parado no último frame selecionado durante trechos sem cortes
+SCENE_INPUT_CLOCK = "0*if(gte(t,ld(0)),print(st(0,t+1)-1))"
+FFMPEG_INPUT_TIME = re.compile(r"^\[Eval @ [^\]]+\] (-?[0-9.]+)$")
+WATCHDOG_INTERVAL_SECONDS = 1.0
+# Tempo para o FFmpeg sair após o SIGTERM antes do SIGKILL, ao abandonar jobs no encerramento
+FFMPEG_TERMINATE_GRACE_SECONDS = 5.0
+
+
+class SourceStreamError(RuntimeError):
+    # Falha transitória ao ler o vídeo de origem: o job deve ser refeito, não marcado como erro
+    pass
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+
+    data = b"".join(chunks)
+    if data and len(data) != size:
+        raise RuntimeError("Fluxo de frames truncado")
+    return data
+
+
+def _iter_png_frames(stream: BinaryIO) -> Iterator[bytes]:
+    while True:
+        signature = _read_exact(stream, len(PNG_SIGNATURE))
+        if not signature:
+            return
+        if signature != PNG_SIGNATURE:
+            raise RuntimeError("Fluxo de frames PNG inválido")
+
+        parts = [signature]
+        while True:
+            chunk_header = _read_exact(stream, 8)
+            if not chunk_header:
+                raise RuntimeError("Fluxo de frames truncado")
+            length, chunk_type = struct.unpack(">I4s", chunk_header)
+            # dados do chunk + CRC
+            parts.append(chunk_header)
+            parts.append(_read_exact(stream, length + 4))
+            if chunk_type == b"IEND":
+                break
+
+        yield b"".join(parts)
+
+
+# Leitura com buffer para formatos cujo fim só é conhecido ao encontrar um marcador
+class _FrameStream:
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._buffer = bytearray()
+
+    def _fill(self) -> bool:
+        read = getattr(self._stream, "read1", self._stream.read)
+        chunk = read(PIPE_READ_SIZE)
+        if not chunk:
+            return False
+        self._buffer.extend(chunk)
+        return True
+
+    def read_exact(self, size: int) -> bytes:
+        while len(self._buffer) < size and self._fill():
+            pass
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        if data and len(data) != size:
+            raise RuntimeError("Fluxo de frames truncado")
+        return data
+
+    def read_until(self, marker: bytes) -> bytes:
+        start = 0
+        while True:
+            index = self._buffer.find(marker, start)
+            if index >= 0:
+                return self.read_exact(index + len(marker))
+            start = max(0, len(self._buffer) - len(marker) + 1)
+            if not self._fill():
+                raise RuntimeError("Fluxo de frames truncado")
+
+
+def _iter_jpeg_frames(stream: BinaryIO) -> Iterator[bytes]:
+    frames = _FrameStream(stream)
+    while True:
+        soi = frames.read_exact(len(JPEG_SOI))
+        if not soi:
+            return
+        if soi != JPEG_SOI:
+            raise RuntimeError("Fluxo de frames JPEG inválido")
+
+        parts = [soi]
+        while True:
+            marker = frames.read_exact(2)
+            if len(marker) != 2 or marker[0] != 0xFF:
+                raise RuntimeError("Fluxo de frames JPEG inválido")
+            parts.append(marker)
+            if marker[1] in JPEG_STANDALONE_MARKERS:
+                continue
+
+            length_bytes = frames.read_exact(2)
+            if len(length_bytes) != 2:
+                raise RuntimeError("Fluxo de frames truncado")
+            (length,) = struct.unpack(">H", length_bytes)
+            parts.append(length_bytes)
+            parts.append(frames.read_exact(length - 2))
+
+            if marker[1] == JPEG_SOS:
+                # Nos dados comprimidos todo 0xFF é seguido de 0x00 ou RSTn: o primeiro EOI encerra o frame
+                parts.append(frames.read_until(JPEG_EOI))
+                break
+
+        yield b"".join(parts)
+
+
+def _iter_webp_frames(stream: BinaryIO) -> Iterator[bytes]:
+    while True:
+        header = _read_exact(stream, 12)
+        if not header:
+            return
+        if header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+            raise RuntimeError("Fluxo de frames WebP inválido")
+
+        (riff_size,) = struct.unpack("<I", header[4:8])
+        # O tamanho do RIFF não inclui o cabeçalho de 8 bytes; chunks têm tamanho par
+        payload = _read_exact(stream, riff_size - 4 + (riff_size & 1))
+        yield header + payload
+
+
+FRAME_PARSERS = {"png": _iter_png_frames, "jpeg": _iter_jpeg_frames, "webp": _iter_webp_frames}
+
+
+def _scale_filter(options: ExtractionOptions) -> Optional[str]:
+    if not (options.max_width or options.max_height):
+        return None
+
+    # Reduz para caber nos limites mantendo a proporção; nunca amplia
+    width = f"min(iw,{options.max_width})" if options.max_width else "iw"
+    height = f"min(ih,{options.max_height})" if options.max_height else "ih"
+    return f"scale=w='{width}':h='{height}':force_original_aspect_ratio=decrease"
+
+
+def _video_filter(options: ExtractionOptions, first_frame: int = 0) -> str:
+    if options.mode == "scene":
+        # O primeiro frame sempre entra; os demais quando a mudança de cena passa do limiar
+        filters = [f"select='eq(n,0)+gt(scene,{options.scene_threshold:g})+{SCENE_INPUT_CLOCK}'"]
+    elif options.mode == "keyframes":
+        filters = []
+    elif first_frame > 0:
+        filters = [f"fps={options.fps:g}:start_time=0,trim=start_frame={first_frame}"]
+    else:
+        filters = [f"fps={options.fps:g}"]
+
+    scale_filter = _scale_filter(options)
+    if scale_filter:
+        filters.append(scale_filter)
+    if options.records_timestamps:
+        # showinfo registra o pts_time de cada frame emitido no stderr
+        filters.append("showinfo")
+    return ",".join(filters)
+
+
+def _input_args(options: ExtractionOptions) -> List[str]:
+    # Quadros que não são chave são descartados pelo decoder, sem decodificação
+    return ["-skip_frame", "nokey"] if options.mode == "keyframes" else []
+
+
+def _output_args(options: ExtractionOptions) -> List[str]:
+    args = []
+    if options.mode != "fps":
+        # Um arquivo por frame selecionado, sem duplicar frames para manter taxa constante
+        args += ["-fps_mode", "passthrough"]
+    if options.max_frames:
+        args += ["-frames:v", str(options.max_frames)]
+    return args
+
+
+def _timestamps_manifest(options: ExtractionOptions, image_names: List[str], timestamps: List[float]) -> bytes:
+    if len(timestamps) < len(image_names):
+        logger.warning(f"Instantes obtidos para {len(timestamps)} de {len(image_names)} frames")
+
+    frames = [
+        {"name": name, "pts_time": timestamps[index] if index < len(timestamps) else None}
+        for index, name in enumerate(image_names)
+    ]
+    return json.dumps({"mode": options.mode, "frames": frames}, indent=2).encode("utf-8")
+
+
+def _encoder_args(options: ExtractionOptions) -> List[str]:
+    args = ["-c:v", FRAME_ENCODERS[options.image_format]]
+    if options.image_format == "jpeg" and options.quality is not None:
+        # Qualidade 1-100 convertida para a escala do mjpeg (2 = melhor, 31 = pior)
+        args += ["-q:v", str(round(2 + (100 - options.quality) * 29 / 99))]
+    elif options.image_format == "webp" and options.quality is not None:
+        args += ["-quality", str(options.quality)]
+    return args
+
+
+def _with_progress(cmd: List[str]) -> List[str]:
+    # Opções globais podem vir em qualquer posição; a saída continua sendo o último argumento
+    return [*cmd[:-1], *FFMPEG_WATCH_ARGS, cmd[-1]]
+
+
+# Lê o stderr do FFmpeg (logs, showinfo e -progress) guardando só as últimas linhas de log
+# e encerra o processo quando ele para de avançar ou passa do tempo previsto para o vídeo
+class _FFmpegMonitor:
+    def __init__(
+        self,
+        stall_timeout: float,
+        time_budget: Optional[float],
+        tail_lines: int,
+        on_progress: Optional[Callable[["_FFmpegMonitor"], None]] = None,
+    ):
+        self.stall_timeout = stall_timeout
+        self.time_budget = time_budget
+        self.on_progress = on_progress
+        self.frames = 0
+        self.out_seconds = 0.0
+        self.in_seconds = 0.0
+        self.ended = False
+        self.pts_times: List[float] = []
+        self.kill_reason: Optional[str] = None
+        self._tail: Deque[str] = deque(maxlen=max(1, tail_lines))
+        self._started_at = self._progressed_at = time.monotonic()
+        self._finished = threading.Event()
+        self._stderr_reader: Optional[threading.Thread] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def stderr_tail(self) -> str:
+        return "\n".join(self._tail)
+
+    def feed(self, line: str) -> None:
+        line = line.rstrip()
+        if not line:
+            return
+
+        progress = FFMPEG_PROGRESS_LINE.match(line)
+        if progress:
+            self._feed_progress(*progress.groups())
+            return
+
+        pts_time = SHOWINFO_PTS_TIME.search(line)
+        if pts_time:
+            self.pts_times.append(float(pts_time.group(1)))
+            self._progressed_at = time.monotonic()
+            return
+
+        input_time = FFMPEG_INPUT_TIME.match(line)
+        if input_time:
+            self.in_seconds = max(self.in_seconds, float(input_time.group(1)))
+            self._progressed_at = time.monotonic()
+            return
+
+        self._tail.append(line)
+
+    def _feed_progress(self, key: str, value: str) -> None:
+        try:
+            if key == "frame":
+                self.frames = max(self.frames, int(value))
+            elif key == "out_time_us":
+                self.out_seconds = max(self.out_seconds, int(value) / 1_000_000)
+        except ValueError:
+            # N/A antes do primeiro frame de saída
+            return
+
+        if key == "progress":
+            # O FFmpeg só fecha um bloco quando o laço principal avança; travado em leitura ou escrita,
+            # os blocos param. Um select que descarta todos os frames de um trecho não para os blocos
+            self._progressed_at = time.monotonic()
+            self.ended = value == "end"
+            if self.on_progress is not None:
+                self.on_progress(self)
+
+    def expired(self) -> bool:
+        if self.kill_reason is not None:
+            return False
+
+        now = time.monotonic()
+        if self.time_budget is not None and now - self._started_at > self.time_budget:
+            self.kill_reason = f"excedeu o limite de {self.time_budget:.0f}s"
+            FFMPEG_KILLS.inc(reason="timeout")
+        elif self.stall_timeout > 0 and now - self._progressed_at > self.stall_timeout:
+            self.kill_reason = f"sem progresso há {self.stall_timeout:.0f}s"
+            FFMPEG_KILLS.inc(reason="stall")
+        else:
+            return False
+
+        logger.error(f"Encerrando FFmpeg: {self.kill_reason} ({self.frames} frames, {self.out_seconds:.1f}s)")
+        return True
+
+    def watch(self, process: subprocess.Popen) -> None:
+        self._stderr_reader = threading.Thread(
+            target=self._read_stderr, args=(process,), name="ffmpeg-stderr", daemon=True
+        )
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(process,), name="ffmpeg-watchdog", daemon=True
+        )
+        self._stderr_reader.start()
+        self._watchdog.start()
+
+    def _read_stderr(self, process: subprocess.Popen) -> None:
+        for raw_line in process.stderr:
+            self.feed(raw_line.decode("utf-8", errors="replace"))
+
+    def _watch(self, process: subprocess.Popen) -> None:
+        while not self._finished.wait(WATCHDOG_INTERVAL_SECONDS):
+            if self.expired():
+                process.kill()
+                return
+
+    def join_stderr(self) -> None:
+        if self._stderr_reader is not None:
+            self._stderr_reader.join()
+
+    def wait(self, process: subprocess.Popen) -> int:
+        returncode = process.wait()
+        self._finished.set()
+        self.join_stderr()
+        if self._watchdog is not None:
+            self._watchdog.join()
+        return returncode
+
+    async def watch_async(self, process: asyncio.subprocess.Process) -> int:
+        reader = asyncio.create_task(self._read_stderr_async(process.stderr))
+        while not reader.done():
+            await asyncio.wait({reader}, timeout=WATCHDOG_INTERVAL_SECONDS)
+            if not reader.done() and self.expired():
+                process.kill()
+        await reader
+        return await process.wait()
+
+    async def _read_stderr_async(self, stream: asyncio.StreamReader) -> None:
+        while True:
+            raw_line = await stream.readline()
+            if not raw_line:
+                return
+            self.feed(raw_line.decode("utf-8", errors="replace"))
+
+    def failure(self) -> RuntimeError:
+        if self.kill_reason is not None:
+            return RuntimeError(f"FFmpeg interrompido ({self.kill_reason}): {self.stderr_tail}".rstrip(": "))
+        return RuntimeError(f"FFmpeg error: {self.stderr_tail}")
+
+    def check_returncode(self, returncode: int) -> None:
+        if self.kill_reason is None and returncode == 0:
+            return
+        error = self.failure()
+        logger.error(str(error))
+        raise error
+
+
+# Processos FFmpeg em execução (Popen ou asyncio), encerrados pelo worker quando abandona jobs
+class _LiveProcesses:
+    def __init__(self):
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    def add(self, process) -> None:
+        with self._lock:
+            self._processes.add(process)
+
+    def discard(self, process) -> None:
+        with self._lock:
+            self._processes.discard(process)
+
+    @staticmethod
+    def _exited(process) -> bool:
+        # O returncode do asyncio é preenchido pelo loop; o do Popen, pelo wait/poll
+        poll = getattr(process, "poll", None)
+        if poll is not None:
+            poll()
+        return process.returncode is not None
+
+    def terminate(self, grace_seconds: float) -> int:
+        with self._lock:
+            processes = list(self._processes)
+
+        for process in processes:
+            try:
+                process.terminate()
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + grace_seconds
+        running = processes
+        while running and time.monotonic() < deadline:
+            time.sleep(0.05)
+            running = [process for process in running if not self._exited(process)]
+
+        for process in running:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        return len(processes)
+
+
+# Soma o avanço dos processos FFmpeg de um job e repassa ao callback em intervalos regulares
+class _ProgressTracker:
+    def __init__(
+        self,
+        options: ExtractionOptions,
+        duration_seconds: Optional[float],
+        on_progress: Optional[Callable[[ExtractionProgress], None]],
+        interval: float,
+        new_monitor: Callable[[Optional[float], Callable[[_FFmpegMonitor], None]], _FFmpegMonitor],
+    ):
+        self.options = options
+        self.duration_seconds = duration_seconds
+        self.on_progress = on_progress
+        self.interval = interval
+        self._new_monitor = new_monitor
+        self._monitors: List[_FFmpegMonitor] = []
+        self._reported_at = 0.0
+        self._lock = threading.Lock()
+
+    def monitor(self, duration_seconds: Optional[float]) -> _FFmpegMonitor:
+        monitor = self._new_monitor(duration_seconds, self._on_monitor_progress)
+        with self._lock:
+            self._monitors.append(monitor)
+        return monitor
+
+    def snapshot(self) -> ExtractionProgress:
+        frames = sum(monitor.frames for monitor in self._monitors)
+        if self.options.mode == "fps":
+            # Com fps fixo cada frame cobre 1/fps s do vídeo, inclusive nos segmentos com -copyts
+            processed_seconds = frames / self.options.fps
+        else:
+            # Nos demais modos o out_time é o instante do último frame selecionado; no modo scene o instante
+            # decodificado continua avançando em trechos sem frames selecionados
+            processed_seconds = sum(max(monitor.out_seconds, monitor.in_seconds) for monitor in self._monitors)
+        if self.duration_seconds and self._monitors and all(monitor.ended for monitor in self._monitors):
+            processed_seconds = max(processed_seconds, self.duration_seconds)
+        return ExtractionProgress(frames, processed_seconds, self.duration_seconds)
+
+    def _on_monitor_progress(self, monitor: _FFmpegMonitor) -> None:
+        if self.on_progress is None:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            # O bloco final de cada processo sempre é repassado
+            if now - self._reported_at < self.interval and not monitor.ended:
+                return
+            self._reported_at = now
+            progress = self.snapshot()
+
+        try:
+            self.on_progress(progress)
+        except Exception as e:
+            # O leitor do stderr não pode parar: o FFmpeg travaria com o pipe cheio
+            logger.warning(f"Falha ao reportar progresso da extração: {str(e)}")
+
+
+# Copia um stream (ex.: corpo de um GET no S3) para o stdin do FFmpeg com read-ahead limitado
+class _StdinFeeder:
+    def __init__(self, process: subprocess.Popen, input_stream: BinaryIO):
+        self.error: Optional[BaseException] = None
+        self._process = process
+        self._input_stream = input_stream
+        readahead_chunks = max(1, int(os.getenv("S3_STREAMING_READAHEAD_MB", "8")))
+        self._chunks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=readahead_chunks)
+        self._stopped = threading.Event()
+        self._reader = threading.Thread(target=self._read, name="ffmpeg-stdin-reader", daemon=True)
+        self._writer = threading.Thread(target=self._write, name="ffmpeg-stdin-writer", daemon=True)
+
+    def start(self) -> None:
+        self._reader.start()
+        self._writer.start()
+
+    def join(self) -> None:
+        self._writer.join()
+        self._reader.join(timeout=5)
+
+    def raise_for_error(self) -> None:
+        if self.error is not None:
+            raise SourceStreamError(f"Falha ao ler vídeo em streaming: {self.error}") from self.error
+
+    def _put(self, chunk: Optional[bytes]) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._chunks.put(chunk, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self) -> None:
+        try:
+            while True:
+                chunk = self._input_stream.read(STDIN_CHUNK_SIZE)
+                if not chunk or not self._put(chunk):
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(None)
+
+    def _write(self) -> None:
+        try:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is None:
+                    break
+                self._process.stdin.write(chunk)
+        except (BrokenPipeError, OSError, ValueError):
+            # FFmpeg encerrou antes de consumir toda a entrada; o código de saída dirá se foi erro
+            pass
+        finally:
+            self._stopped.set()
+            try:
+                self._process.stdin.close()
+            except Exception:
+                pass
+
+
+def _resolve_segments() -> int:
+    raw_value = os.getenv("FFMPEG_SEGMENTS", "1").strip().lower()
+    if raw_value == "auto":
+        return os.cpu_count() or 1
+
+    try:
+        return max(1, int(raw_value))
+    except ValueError:
+        logger.warning(f"FFMPEG_SEGMENTS inválido ({raw_value}), usando 1")
+        return 1
+
 
 class VideoProcessingGateway:
-    def __init__(self, base_dir: Path):
+    def __init__(
+        self,
+        base_dir: Path,
+        stream_frames: Optional[bool] = None,
+        archive_policy: Optional[ArchivePolicy] = None,
+        s3_gateway: Optional[S3Gateway] = None,
+    ):
         self.base_dir = base_dir
+        self.s3_gateway = s3_gateway
         self.uploads_dir = base_dir / "uploads"
         self.outputs_dir = base_dir / "outputs"
         self.temp_dir = base_dir / "temp"
 
+        if stream_frames is None:
+            stream_frames = os.getenv("FRAME_STREAMING", "false").lower() == "true"
+        self.stream_frames = stream_frames
+        self.stream_upload = os.getenv("S3_STREAMING_UPLOAD", "false").lower() == "true"
+        self.archive_policy = archive_policy or ArchivePolicy.from_env()
+        self.segments = _resolve_segments()
+        self.segment_min_seconds = float(os.getenv("FFMPEG_SEGMENT_MIN_SECONDS", "120"))
+        self.probe_timeout = float(os.getenv("FFPROBE_TIMEOUT_SECONDS", "15"))
+        self.stall_timeout = float(os.getenv("FFMPEG_STALL_TIMEOUT_SECONDS", "300"))
+        self.timeout_factor = float(os.getenv("FFMPEG_TIMEOUT_FACTOR", "0"))
+        self.timeout_base = float(os.getenv("FFMPEG_TIMEOUT_BASE_SECONDS", "120"))
+        self.stderr_tail_lines = int(os.getenv("FFMPEG_STDERR_TAIL_LINES", "50"))
+        self.progress_interval = float(os.getenv("FFMPEG_PROGRESS_INTERVAL", "5"))
+        self._live_processes = _LiveProcesses()
+
         self.uploads_dir.mkdir(parents=True, exist_ok=True)
         self.outputs_dir.mkdir(parents=True, exist_ok=True)
         self.temp_dir.mkdir(parents=True, exist_ok=True)
 
-    def _create_zip(self, files: List[Path], zip_path: Path) -> None:
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for f in files:
-                zipf.write(f, arcname=f.name)
+    @staticmethod
+    def extraction_signature(options: Optional[ExtractionOptions] = None) -> str:
+        return (options or ExtractionOptions()).signature()
+
+    def _get_s3_gateway(self) -> S3Gateway:
+        if self.s3_gateway is None:
+            self.s3_gateway = S3Gateway(self.base_dir)
+        return self.s3_gateway
+
+    def _probe_duration(self, video_path: str) -> Optional[float]:
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            str(video_path),
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.probe_timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"FFprobe falhou ao obter a duração de {video_path}: {str(e)}")
+            return None
+
+        if result.returncode != 0:
+            logger.warning(f"FFprobe não conseguiu obter a duração de {video_path}: {result.stderr}")
+            return None
+
+        try:
+            return float(result.stdout.strip())
+        except ValueError:
+            return None
+
+    def probe_video(self, source: str) -> Optional[VideoProbe]:
+        # Lê apenas o cabeçalho do container; aceita caminho local ou URL (ex.: pré-assinada do S3)
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "format=duration,size:stream=codec_name,width,height",
+            "-of",
+            "json",
+            source,
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.probe_timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"FFprobe falhou ao inspecionar o vídeo: {str(e)}")
+            return None
+
+        if result.returncode != 0:
+            logger.warning(f"FFprobe não conseguiu inspecionar o vídeo: {result.stderr.strip()}")
+            return None
+
+        try:
+            info = json.loads(result.stdout)
+            stream = info["streams"][0]
+            return VideoProbe(
+                duration_seconds=float(info["format"]["duration"]),
+                width=int(stream["width"]),
+                height=int(stream["height"]),
+                codec=stream.get("codec_name", ""),
+                size_bytes=int(info["format"].get("size", 0)),
+            )
+        except (KeyError, IndexError, TypeError, ValueError):
+            logger.warning(f"Resposta inesperada do FFprobe: {result.stdout.strip()}")
+            return None
+
+    @staticmethod
+    def _is_segmentable(options: ExtractionOptions) -> bool:
+        # Seleção por cena/keyframe e limite de frames dependem do vídeo inteiro: um único processo
+        return options.mode == "fps" and not options.max_frames
+
+    def _resolve_duration(
+        self,
+        video_path: str,
+        options: ExtractionOptions,
+        input_stream: Optional[BinaryIO],
+        duration_seconds: Optional[float],
+        on_progress: Optional[Callable[[ExtractionProgress], None]],
+    ) -> Optional[float]:
+        if duration_seconds is not None or input_stream is not None:
+            return duration_seconds
+
+        # O FFprobe só roda quando a duração tem uso: segmentos, limite de tempo ou percentual
+        needs_duration = (
+            on_progress is not None
+            or self.timeout_factor > 0
+            or (self.segments > 1 and self._is_segmentable(options))
+        )
+        return self._probe_duration(video_path) if needs_duration else None
+
+    def _time_budget(self, duration_seconds: Optional[float]) -> Optional[float]:
+        if self.timeout_factor <= 0 or not duration_seconds:
+            return None
+        return self.timeout_base + self.timeout_factor * duration_seconds
+
+    def _new_tracker(
+        self,
+        options: ExtractionOptions,
+        duration_seconds: Optional[float],
+        on_progress: Optional[Callable[[ExtractionProgress], None]] = None,
+    ) -> _ProgressTracker:
+        return _ProgressTracker(
+            options,
+            duration_seconds,
+            on_progress,
+            self.progress_interval,
+            lambda budget_duration, on_monitor_progress: _FFmpegMonitor(
+                self.stall_timeout,
+                self._time_budget(budget_duration),
+                self.stderr_tail_lines,
+                on_monitor_progress,
+            ),
+        )
+
+    def _plan_extraction(
+        self,
+        video_path: str,
+        options: ExtractionOptions,
+        input_stream: Optional[BinaryIO] = None,
+        duration_seconds: Optional[float] = None,
+    ) -> List[Tuple[int, Optional[int]]]:
+        if not self._is_segmentable(options):
+            return [(0, None)]
+        return self._plan_segments(video_path, options.fps, input_stream, duration_seconds)
+
+    def _plan_segments(
+        self,
+        video_path: str,
+        fps: float,
+        input_stream: Optional[BinaryIO] = None,
+        duration_seconds: Optional[float] = None,
+    ) -> List[Tuple[int, Optional[int]]]:
+        # Entrada por pipe não permite busca: sempre um único processo
+        if self.segments <= 1 or input_stream is not None:
+            return [(0, None)]
+
+        duration = duration_seconds if duration_seconds is not None else self._probe_duration(video_path)
+        if not duration or duration < self.segment_min_seconds:
+            return [(0, None)]
+
+        # Faixas alinhadas à grade de saída do filtro fps: cada segmento recebe
+        # um intervalo contíguo de índices de frame; o último não tem limite
+        # para absorver arredondamentos no final do vídeo.
+        total_frames = int(duration * fps) + 1
+        frames_per_segment = math.ceil(total_frames / self.segments)
+        plan: List[Tuple[int, Optional[int]]] = []
+        for first_frame in range(0, total_frames, frames_per_segment):
+            plan.append((first_frame, frames_per_segment))
+
+        last_first_frame, _ = plan[-1]
+        plan[-1] = (last_first_frame, None)
+        return plan
+
+    @staticmethod
+    def _build_segment_cmd(
+        video_path: str,
+        frame_pattern: str,
+        options: ExtractionOptions,
+        first_frame: int,
+        frame_count: Optional[int],
+    ) -> List[str]:
+        cmd = ["ffmpeg", *_input_args(options)]
+
+        if first_frame > 0:
+            # Busca um intervalo antes do segmento mantendo a linha do tempo
+            # original (-copyts/-start_at_zero). O filtro fps ancorado em zero
+            # arredonda os PTS exatamente como a execução serial; os índices
+            # anteriores ao segmento são descartados pelo trim.
+            cmd += ["-ss", f"{(first_frame - 1) / options.fps:.6f}", "-copyts", "-start_at_zero"]
+
+        cmd += ["-i", str(video_path), "-vf", _video_filter(options, first_frame), *_encoder_args(options)]
+        cmd += [*_output_args(options), "-start_number", str(first_frame + 1)]
+        if frame_count is not None:
+            cmd += ["-frames:v", str(frame_count)]
+        cmd += ["-y", frame_pattern]
+        return cmd
+
+    def _run_ffmpeg(
+        self, cmd: List[str], monitor: _FFmpegMonitor, input_stream: Optional[BinaryIO] = None
+    ) -> _FFmpegMonitor:
+        logger.info(f"Executando FFmpeg: {' '.join(cmd)}")
+
+        process = subprocess.Popen(
+            _with_progress(cmd),
+            stdin=subprocess.PIPE if input_stream is not None else subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        self._live_processes.add(process)
+        try:
+            monitor.watch(process)
+            feeder = None
+            if input_stream is not None:
+                feeder = _StdinFeeder(process, input_stream)
+                feeder.start()
+
+            returncode = monitor.wait(process)
+        finally:
+            self._live_processes.discard(process)
+        # Após o kill a leitura da origem pode continuar presa; as threads terminam quando o stream for fechado
+        if feeder is not None and monitor.kill_reason is None:
+            feeder.join()
+            feeder.raise_for_error()
+
+        monitor.check_returncode(returncode)
+        return monitor
+
+    @staticmethod
+    def _segment_duration(
+        options: ExtractionOptions, duration_seconds: Optional[float], first_frame: int, frame_count: Optional[int]
+    ) -> Optional[float]:
+        if frame_count is not None:
+            return frame_count / options.fps
+        if duration_seconds is None:
+            return None
+        return max(0.0, duration_seconds - first_frame / options.fps)
+
+    def _run_segmented_ffmpeg(
+        self,
+        video_path: str,
+        frame_pattern: str,
+        options: ExtractionOptions,
+        plan: List[Tuple[int, Optional[int]]],
+        tracker: _ProgressTracker,
+    ) -> None:
+        logger.info(f"Extração segmentada de {video_path} em {len(plan)} processos FFmpeg")
+        # Cada segmento tem o próprio watchdog, com limite proporcional à faixa que extrai
+        jobs = [
+            (
+                self._build_segment_cmd(video_path, frame_pattern, options, first_frame, frame_count),
+                tracker.monitor(
+                    self._segment_duration(options, tracker.duration_seconds, first_frame, frame_count)
+                ),
+            )
+            for first_frame, frame_count in plan
+        ]
+
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="ffmpeg-segment") as executor:
+            futures = [executor.submit(self._run_ffmpeg, cmd, monitor) for cmd, monitor in jobs]
+
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def _discard_archive(archive_target: Union[Path, BinaryIO]) -> None:
+        # Destinos em memória/S3 são abortados por quem os abriu
+        if isinstance(archive_target, Path):
+            archive_target.unlink(missing_ok=True)
 
-    def process_video(self, video_path: str, timestamp: str, fps: int = 1) -> Tuple[Path, int, List[str]]:
+    def _create_zip(
+        self, files: List[Path], archive_target: Union[Path, BinaryIO], manifest: Optional[bytes] = None
+    ) -> ArchiveStats:
+        with track_stage("archive"):
+            with FrameArchiveWriter(archive_target, self.archive_policy) as archive:
+                for f in files:
+                    archive.add(f.name, f.read_bytes())
+                if manifest is not None:
+                    archive.add(TIMESTAMPS_MANIFEST, manifest)
+        return archive.stats
+
+    def _extract_frames_to_disk(
+        self,
+        video_path: str,
+        timestamp: str,
+        archive_target: Union[Path, BinaryIO],
+        options: ExtractionOptions,
+        segment_plan: List[Tuple[int, Optional[int]]],
+        tracker: _ProgressTracker,
+        input_stream: Optional[BinaryIO] = None,
+    ) -> Tuple[List[str], ArchiveStats]:
         proc_temp = self.temp_dir / timestamp
         proc_temp.mkdir(parents=True, exist_ok=True)
 
-        frame_pattern = str(proc_temp / "frame_%04d.png")
+        try:
+            frame_pattern = str(proc_temp / f"frame_%04d.{options.extension}")
+
+            timestamps: List[float] = []
+            with track_stage("extract") as extraction:
+                if len(segment_plan) > 1:
+                    self._run_segmented_ffmpeg(video_path, frame_pattern, options, segment_plan, tracker)
+                else:
+                    cmd = [
+                        "ffmpeg",
+                        *_input_args(options),
+                        "-i",
+                        "pipe:0" if input_stream is not None else str(video_path),
+                        "-vf",
+                        _video_filter(options),
+                        *_encoder_args(options),
+                        *_output_args(options),
+                        "-y",
+                        frame_pattern,
+                    ]
+                    monitor = self._run_ffmpeg(cmd, tracker.monitor(tracker.duration_seconds), input_stream)
+                    timestamps = monitor.pts_times
+
+                frames = sorted(proc_temp.glob(f"*.{options.extension}"))
+                if not frames:
+                    raise RuntimeError("Nenhum frame extraído do vídeo")
+            record_frames(len(frames), extraction.elapsed)
+
+            manifest = None
+            if options.records_timestamps:
+                manifest = _timestamps_manifest(options, [f.name for f in frames], timestamps)
+            archive_stats = self._create_zip(frames, archive_target, manifest)
+            return [f.name for f in frames], archive_stats
+        finally:
+            try:
+                shutil.rmtree(proc_temp)
+            except Exception:
+                pass
+
+    def _extract_frames_to_zip(
+        self,
+        video_path: str,
+        archive_target: Union[Path, BinaryIO],
+        options: ExtractionOptions,
+        tracker: _ProgressTracker,
+        input_stream: Optional[BinaryIO] = None,
+    ) -> Tuple[List[str], ArchiveStats]:
         cmd = [
             "ffmpeg",
+            *_input_args(options),
             "-i",
-            str(video_path),
+            "pipe:0" if input_stream is not None else str(video_path),
             "-vf",
-            f"fps={fps}",
-            "-y",
-            frame_pattern,
+            _video_filter(options),
+            "-f",
+            "image2pipe",
+            *_encoder_args(options),
+            *_output_args(options),
+            "pipe:1",
         ]
 
-        logger.info(f"Executando FFmpeg: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.error(f"FFmpeg error: {result.stderr}")
+        logger.info(f"Executando FFmpeg (streaming): {' '.join(cmd)}")
+        process = subprocess.Popen(
+            _with_progress(cmd),
+            stdin=subprocess.PIPE if input_stream is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._live_processes.add(process)
+        # stderr é drenado em paralelo para o FFmpeg não bloquear com o pipe cheio
+        monitor = tracker.monitor(tracker.duration_seconds)
+        monitor.watch(process)
+        feeder = None
+        if input_stream is not None:
+            feeder = _StdinFeeder(process, input_stream)
+            feeder.start()
+
+        image_names: List[str] = []
+        try:
+            with FrameArchiveWriter(archive_target, self.archive_policy) as archive:
+                for frame in FRAME_PARSERS[options.image_format](process.stdout):
+                    image_name = f"frame_{len(image_names) + 1:04d}.{options.extension}"
+                    archive.add(image_name, frame)
+                    image_names.append(image_name)
+
+                if options.records_timestamps and image_names:
+                    # stdout encerrado: o FFmpeg já registrou o showinfo de todos os frames
+                    monitor.join_stderr()
+                    archive.add(TIMESTAMPS_MANIFEST, _timestamps_manifest(options, image_names, monitor.pts_times))
+        except Exception as e:
+            process.kill()
+            monitor.wait(process)
+            self._discard_archive(archive_target)
+            # Frames truncados pelo kill do watchdog: o motivo real é o travamento do FFmpeg
+            if monitor.kill_reason is not None:
+                raise monitor.failure() from e
+            raise
+        finally:
+            returncode = monitor.wait(process)
+            self._live_processes.discard(process)
+            if feeder is not None and monitor.kill_reason is None:
+                feeder.join()
+
+        if feeder is not None and monitor.kill_reason is None:
             try:
-                shutil.rmtree(proc_temp)
+                feeder.raise_for_error()
             except Exception:
-                pass
-            raise RuntimeError(f"FFmpeg error: {result.stderr}")
+                self._discard_archive(archive_target)
+                raise
 
-        frames = sorted(proc_temp.glob("*.png"))
-        if not frames:
-            shutil.rmtree(proc_temp)
+        try:
+            monitor.check_returncode(returncode)
+        except RuntimeError:
+            self._discard_archive(archive_target)
+            raise
+
+        if not image_names:
+            self._discard_archive(archive_target)
             raise RuntimeError("Nenhum frame extraído do vídeo")
 
+        return image_names, archive.stats
+
+    def process_video(
+        self,
+        video_path: str,
+        timestamp: str,
+        options: Optional[ExtractionOptions] = None,
+        input_stream: Optional[BinaryIO] = None,
+        duration_seconds: Optional[float] = None,
+        on_progress: Optional[Callable[[ExtractionProgress], None]] = None,
+    ) -> Tuple[Path, int, List[str]]:
+        options = options or ExtractionOptions()
+        duration = self._resolve_duration(video_path, options, input_stream, duration_seconds, on_progress)
+        segment_plan = self._plan_extraction(video_path, options, input_stream, duration)
+        tracker = self._new_tracker(options, duration, on_progress)
+
+        return self._publish_archive(
+            timestamp,
+            lambda archive_target: self._extract_frames(
+                video_path, timestamp, archive_target, options, segment_plan, tracker, input_stream
+            ),
+        )
+
+    async def process_video_async(
+        self,
+        video_path: str,
+        timestamp: str,
+        options: Optional[ExtractionOptions] = None,
+        duration_seconds: Optional[float] = None,
+        on_progress: Optional[Callable[[ExtractionProgress], None]] = None,
+    ) -> Tuple[Path, int, List[str]]:
+        # FFmpeg roda como subprocesso assíncrono; ZIP e upload (bloqueantes) vão para threads
+        options = options or ExtractionOptions()
+        duration = await asyncio.to_thread(
+            self._resolve_duration, video_path, options, None, duration_seconds, on_progress
+        )
+        segment_plan = await asyncio.to_thread(self._plan_extraction, video_path, options, None, duration)
+        if on_progress is not None:
+            # O callback pode gravar no banco: roda fora do event loop
+            loop = asyncio.get_running_loop()
+            report = on_progress
+
+            def on_progress(progress: ExtractionProgress) -> None:
+                loop.run_in_executor(None, report, progress)
+
+        tracker = self._new_tracker(options, duration, on_progress)
+
+        proc_temp = self.temp_dir / timestamp
+        proc_temp.mkdir(parents=True, exist_ok=True)
+
+        try:
+            frame_pattern = str(proc_temp / f"frame_%04d.{options.extension}")
+            with track_stage("extract") as extraction:
+                monitors = await asyncio.gather(*[
+                    self._run_ffmpeg_async(
+                        self._build_segment_cmd(video_path, frame_pattern, options, first_frame, frame_count),
+                        tracker.monitor(self._segment_duration(options, duration, first_frame, frame_count)),
+                    )
+                    for first_frame, frame_count in segment_plan
+                ])
+
+                frames = sorted(proc_temp.glob(f"*.{options.extension}"))
+                if not frames:
+                    raise RuntimeError("Nenhum frame extraído do vídeo")
+            record_frames(len(frames), extraction.elapsed)
+
+            image_names = [f.name for f in frames]
+            manifest = None
+            if options.records_timestamps:
+                manifest = _timestamps_manifest(options, image_names, monitors[0].pts_times)
+
+            return await asyncio.to_thread(
+                self._publish_archive,
+                timestamp,
+                lambda archive_target: (image_names, self._create_zip(frames, archive_target, manifest)),
+            )
+        finally:
+            shutil.rmtree(proc_temp, ignore_errors=True)
+
+    async def _run_ffmpeg_async(self, cmd: List[str], monitor: _FFmpegMonitor) -> _FFmpegMonitor:
+        logger.info(f"Executando FFmpeg (async): {' '.join(cmd)}")
+        process = await asyncio.create_subprocess_exec(
+            *_with_progress(cmd),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._live_processes.add(process)
+        try:
+            returncode = await monitor.watch_async(process)
+        finally:
+            self._live_processes.discard(process)
+        monitor.check_returncode(returncode)
+        return monitor
+
+    def terminate_ffmpeg(self, grace_seconds: float = FFMPEG_TERMINATE_GRACE_SECONDS) -> int:
+        # SIGTERM em todos os FFmpeg em execução e SIGKILL nos que não saírem no prazo
+        return self._live_processes.terminate(grace_seconds)
+
+    def _publish_archive(
+        self,
+        timestamp: str,
+        write_archive: Callable[[Union[Path, BinaryIO]], Tuple[List[str], ArchiveStats]],
+    ) -> Tuple[Union[Path, str], int, List[str]]:
         zip_filename = f"frames_{timestamp}.zip"
         zip_path = self.outputs_dir / zip_filename
-        self._create_zip(frames, zip_path)
+        env = os.getenv("APP_ENV", "development")
 
-        logger.info(f"Arquivo ZIP criado: {zip_path} com {len(frames)} frames")
+        if env == "production" and self.stream_upload:
+            # O ZIP vai direto para o S3 em partes, sem artefato local
+            s3 = self._get_s3_gateway()
+            s3_key = f"outputs/{zip_filename}"
+            with s3.open_multipart_writer(s3_key) as sink:
+                image_names, archive_stats = write_archive(sink)
+            s3_uri = f"s3://{s3.bucket_name}/{s3_key}"
+            self._log_archive(s3_uri, zip_filename, image_names, archive_stats)
+            return s3_uri, len(image_names), image_names
 
-        image_names = [f.name for f in frames]
+        image_names, archive_stats = write_archive(zip_path)
+        self._log_archive(zip_path, zip_filename, image_names, archive_stats)
 
-        env = os.getenv("APP_ENV", "development")
         if env == "production":
-            s3 = S3Gateway(self.base_dir)
+            s3 = self._get_s3_gateway()
             s3_key = f"outputs/{zip_filename}"
-            uploaded = s3.upload_video(str(zip_path), s3_key)
-            try:
-                shutil.rmtree(proc_temp)
-            except Exception:
-                pass
+            with track_stage("upload"):
+                uploaded = s3.upload_video(str(zip_path), s3_key)
 
-            if not uploaded:
-                raise RuntimeError("Falha ao enviar ZIP para o S3")
+                if not uploaded:
+                    raise RuntimeError("Falha ao enviar ZIP para o S3")
 
             s3_uri = f"s3://{s3.bucket_name}/{s3_key}"
-            return s3_uri, len(frames), image_names
+            return s3_uri, len(image_names), image_names
 
-        try:
-            shutil.rmtree(proc_temp)
-        except Exception:
-            pass
+        return zip_path, len(image_names), image_names
+
+    def _extract_frames(
+        self,
+        video_path: str,
+        timestamp: str,
+        archive_target: Union[Path, BinaryIO],
+        options: ExtractionOptions,
+        segment_plan: List[Tuple[int, Optional[int]]],
+        tracker: _ProgressTracker,
+        input_stream: Optional[BinaryIO] = None,
+    ) -> Tuple[List[str], ArchiveStats]:
+        # A extração segmentada grava cada faixa em disco; o streaming só é usado com um único processo
+        if self.stream_frames and len(segment_plan) == 1:
+            # No streaming FFmpeg e ZIP acontecem juntos: a etapa inclui a compressão
+            with track_stage("extract") as extraction:
+                image_names, archive_stats = self._extract_frames_to_zip(
+                    video_path, archive_target, options, tracker, input_stream
+                )
+            record_frames(len(image_names), extraction.elapsed)
+            return image_names, archive_stats
+
+        return self._extract_frames_to_disk(
+            video_path, timestamp, archive_target, options, segment_plan, tracker, input_stream
+        )
 
-        return zip_path, len(frames), image_names
+    @staticmethod
+    def _log_archive(
+        location: Union[Path, str], zip_filename: str, image_names: List[str], archive_stats: ArchiveStats
+    ) -> None:
+        record_bytes("archive", archive_stats.archived_bytes)
+        logger.info(f"Arquivo ZIP criado: {location} com {len(image_names)} frames")
+        logger.info(
+            f"Compressão do ZIP {zip_filename}: política {archive_stats.policy}, "
+            f"{archive_stats.raw_bytes} -> {archive_stats.archived_bytes} bytes "
+            f"(razão {archive_stats.ratio:.3f}) em {archive_stats.elapsed_seconds:.2f}s"
+        )
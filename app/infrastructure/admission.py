@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+import logging
+import os
+import threading
+
+from app.entities.video import ExtractionOptions, VideoProbe
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+REFERENCE_PIXELS = 1920 * 1080
+# Custo relativo de decodificação por codec (h264 = 1)
+CODEC_CPU_FACTORS = {
+    "h264": 1.0,
+    "mpeg4": 0.8,
+    "mpeg2video": 0.8,
+    "vp8": 1.2,
+    "hevc": 1.8,
+    "vp9": 1.8,
+    "av1": 2.5,
+    "prores": 1.2,
+}
+# Keyframes: só os quadros-chave são decodificados; cena: decodifica tudo e calcula o score
+MODE_CPU_FACTORS = {"fps": 1.0, "keyframes": 0.1, "scene": 1.3}
+# Intervalo médio (segundos) entre frames emitidos quando não há fps fixo
+MODE_SECONDS_PER_FRAME = {"keyframes": 2.0, "scene": 5.0}
+FRAME_BYTES_PER_PIXEL = {"png": 1.5, "jpeg": 0.12, "webp": 0.08}
+
+
+@dataclass(frozen=True)
+class JobCost:
+    cpu: float = 0.0
+    disk_bytes: int = 0
+
+
+def _output_pixels(probe: VideoProbe, options: ExtractionOptions) -> float:
+    scale = 1.0
+    if options.max_width and probe.width > options.max_width:
+        scale = min(scale, options.max_width / probe.width)
+    if options.max_height and probe.height > options.max_height:
+        scale = min(scale, options.max_height / probe.height)
+    return probe.width * probe.height * scale * scale
+
+
+def estimate_job_cost(probe: VideoProbe, options: ExtractionOptions) -> JobCost:
+    # CPU é carga simultânea, não trabalho total: 1 unidade = 1 core ocupado por um job 1080p em h264
+    # no modo fps. A duração só muda por quanto tempo a carga dura, e entra apenas no disco
+    cpu = (
+        probe.width * probe.height / REFERENCE_PIXELS
+        * CODEC_CPU_FACTORS.get(probe.codec, 1.0)
+        * MODE_CPU_FACTORS.get(options.mode, 1.0)
+    )
+
+    if options.mode == "fps":
+        frames = probe.duration_seconds * options.fps
+    else:
+        frames = probe.duration_seconds / MODE_SECONDS_PER_FRAME[options.mode]
+    if options.max_frames:
+        frames = min(frames, options.max_frames)
+
+    # Vídeo de origem + frames em temp/ + ZIP
+    frame_bytes = frames * _output_pixels(probe, options) * FRAME_BYTES_PER_PIXEL[options.image_format]
+    return JobCost(cpu=round(cpu, 3), disk_bytes=int(probe.size_bytes + 2 * frame_bytes))
+
+
+class AdmissionController:
+    def __init__(self, cpu_budget: float = 0.0, disk_budget_bytes: int = 0):
+        self.cpu_budget = cpu_budget
+        self.disk_budget_bytes = disk_budget_bytes
+        self._admitted: Dict[str, JobCost] = {}
+        self._cpu_in_use = 0.0
+        self._disk_in_use = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            cpu_budget=max(0.0, float(os.getenv("ADMISSION_CPU_BUDGET", "0"))),
+            disk_budget_bytes=max(0, int(os.getenv("ADMISSION_DISK_BUDGET_MB", "0"))) * MB,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.cpu_budget > 0 or self.disk_budget_bytes > 0
+
+    def usage(self) -> JobCost:
+        with self._lock:
+            return JobCost(cpu=self._cpu_in_use, disk_bytes=self._disk_in_use)
+
+    def try_admit(self, job_id: str, cost: Optional[JobCost], force: bool = False) -> bool:
+        cost = cost or JobCost()
+        with self._lock:
+            # Um nó ocioso sempre aceita o job, mesmo acima do orçamento, para não travá-lo na fila
+            if self._admitted and not force and not self._fits(cost):
+                return False
+
+            self._admitted[job_id] = cost
+            self._cpu_in_use += cost.cpu
+            self._disk_in_use += cost.disk_bytes
+            return True
+
+    def release(self, job_id: str) -> None:
+        with self._lock:
+            cost = self._admitted.pop(job_id, None)
+            if cost is None:
+                return
+            self._cpu_in_use = max(0.0, self._cpu_in_use - cost.cpu)
+            self._disk_in_use = max(0, self._disk_in_use - cost.disk_bytes)
+
+    def _fits(self, cost: JobCost) -> bool:
+        if self.cpu_budget and self._cpu_in_use + cost.cpu > self.cpu_budget:
+            return False
+        if self.disk_budget_bytes and self._disk_in_use + cost.disk_bytes > self.disk_budget_bytes:
+            return False
+        return True
@@ -0,0 +1,177 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+LOCK_SUFFIX = ".lock"
+DOWNLOAD_LOCK_SUFFIX = ".download.lock"
+PARTIAL_SUFFIX = ".part"
+EVICTION_LOCK_NAME = ".eviction.lock"
+
+
+@dataclass
+class SourceCacheStats:
+    hits: int = 0
+    misses: int = 0
+    bytes_saved: int = 0
+    bytes_downloaded: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        if not lookups:
+            return 0.0
+        return self.hits / lookups
+
+
+class SourceLease:
+    def __init__(self, cache: "SourceVideoCache", path: Path, lock_fd: int):
+        self.cache = cache
+        self.path = path
+        self._lock_fd: Optional[int] = lock_fd
+
+    def release(self) -> None:
+        if self._lock_fd is None:
+            return
+
+        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+        self.cache.evict()
+
+
+class SourceVideoCache:
+    # Vídeos baixados ficam em disco, identificados por chave S3 + ETag.
+    # Locks de arquivo (flock) coordenam slots em threads e em processos:
+    # o lock compartilhado de uso protege a entrada da expiração enquanto
+    # em uso e o lock de download evita baixar a mesma entrada duas vezes.
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = SourceCacheStats()
+        self._stats_lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, s3_key: str, version: str) -> Path:
+        digest = hashlib.sha256(f"{s3_key}|{version}".encode("utf-8")).hexdigest()[:32]
+        return self.cache_dir / f"{digest}{Path(s3_key).suffix}"
+
+    def acquire(self, s3_key: str, version: str, download: Callable[[str], bool]) -> SourceLease:
+        entry_path = self._entry_path(s3_key, version)
+        lock_fd = os.open(str(entry_path) + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_SH)
+
+            if entry_path.exists():
+                self._record(hit=True, size_bytes=entry_path.stat().st_size)
+            else:
+                self._download_entry(s3_key, entry_path, download)
+
+            # Atualiza a recência usada pela expiração LRU
+            os.utime(entry_path)
+        except Exception:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+            raise
+
+        return SourceLease(self, entry_path, lock_fd)
+
+    def _download_entry(self, s3_key: str, entry_path: Path, download: Callable[[str], bool]) -> None:
+        download_fd = os.open(str(entry_path) + DOWNLOAD_LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            fcntl.flock(download_fd, fcntl.LOCK_EX)
+
+            # Outro slot pode ter concluído o download enquanto aguardávamos
+            if entry_path.exists():
+                self._record(hit=True, size_bytes=entry_path.stat().st_size)
+                return
+
+            partial_path = Path(f"{entry_path}{PARTIAL_SUFFIX}-{os.getpid()}-{threading.get_ident()}")
+            try:
+                if not download(str(partial_path)):
+                    raise RuntimeError(f"Falha ao baixar vídeo do S3 para processamento: {s3_key}")
+                os.replace(partial_path, entry_path)
+            finally:
+                partial_path.unlink(missing_ok=True)
+
+            self._record(hit=False, size_bytes=entry_path.stat().st_size)
+        finally:
+            fcntl.flock(download_fd, fcntl.LOCK_UN)
+            os.close(download_fd)
+
+    def _record(self, hit: bool, size_bytes: int) -> None:
+        with self._stats_lock:
+            if hit:
+                self.stats.hits += 1
+                self.stats.bytes_saved += size_bytes
+            else:
+                self.stats.misses += 1
+                self.stats.bytes_downloaded += size_bytes
+            stats = self.stats
+
+            logger.info(
+                f"Cache de vídeos {'hit' if hit else 'miss'} ({size_bytes} bytes): "
+                f"taxa de acerto {stats.hit_rate:.1%} ({stats.hits}/{stats.hits + stats.misses}), "
+                f"{stats.bytes_saved} bytes economizados"
+            )
+
+    def _entries(self) -> List[Path]:
+        return [
+            path for path in self.cache_dir.iterdir()
+            if path.is_file()
+            and not path.name.endswith(LOCK_SUFFIX)
+            and PARTIAL_SUFFIX not in path.name
+            and path.name != EVICTION_LOCK_NAME
+        ]
+
+    def evict(self) -> int:
+        eviction_fd = os.open(str(self.cache_dir / EVICTION_LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        removed_bytes = 0
+
+        try:
+            fcntl.flock(eviction_fd, fcntl.LOCK_EX)
+
+            entries = []
+            for path in self._entries():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size_bytes, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+
+                lock_fd = os.open(str(path) + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    # Entradas em uso (lock compartilhado) ou sendo baixadas são mantidas
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(lock_fd)
+                    continue
+
+                try:
+                    path.unlink(missing_ok=True)
+                    total_bytes -= size_bytes
+                    removed_bytes += size_bytes
+                finally:
+                    fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                    os.close(lock_fd)
+        finally:
+            fcntl.flock(eviction_fd, fcntl.LOCK_UN)
+            os.close(eviction_fd)
+
+        if removed_bytes:
+            logger.info(f"Cache de vídeos: {removed_bytes} bytes removidos (limite {self.max_bytes} bytes)")
+        return removed_bytes
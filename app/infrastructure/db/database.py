@@ -1,8 +1,52 @@
 import os
 import json
+import threading
+import time
+from typing import Dict, Tuple
 from urllib.parse import quote_plus
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+_secret_cache: Dict[str, Tuple[float, dict]] = {}
+_secret_lock = threading.Lock()
+
+
+def _read_secret(secret_name: str) -> dict:
+    # Secrets Manager é consultado no máximo uma vez por DB_SECRET_TTL_SECONDS
+    ttl = float(os.getenv("DB_SECRET_TTL_SECONDS", "300"))
+    with _secret_lock:
+        cached = _secret_cache.get(secret_name)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+
+    import boto3
+
+    region = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+    sm = boto3.client("secretsmanager", region_name=region)
+    sec = sm.get_secret_value(SecretId=secret_name)["SecretString"]
+    data = json.loads(sec)
+
+    with _secret_lock:
+        _secret_cache[secret_name] = (time.monotonic(), data)
+    return data
+
+
+def clear_secret_cache() -> None:
+    with _secret_lock:
+        _secret_cache.clear()
+
+
+def secret_cache_snapshot() -> Dict[str, Tuple[float, dict]]:
+    with _secret_lock:
+        return dict(_secret_cache)
+
+
+def seed_secret_cache(snapshot: Dict[str, Tuple[float, dict]]) -> None:
+    # Processos do pool não herdam memória do pai: recebem o segredo já resolvido
+    with _secret_lock:
+        _secret_cache.update(snapshot)
+
 
 def _build_db_url() -> str:
     direct = os.getenv("DATABASE_URL") or os.getenv("SQLALCHEMY_DATABASE_URL")
@@ -13,12 +57,7 @@ def _build_db_url() -> str:
     secret_name = os.getenv("DB_SECRET_NAME")
     if secret_name:
         try:
-            import boto3
-
-            region = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
-            sm = boto3.client("secretsmanager", region_name=region)
-            sec = sm.get_secret_value(SecretId=secret_name)["SecretString"]
-            data = json.loads(sec)
+            data = _read_secret(secret_name)
 
             host = data.get("host")
             port = data.get("port", 5432)
@@ -41,8 +80,71 @@ def _build_db_url() -> str:
         "Database configuration error: DATABASE_URL/SQLALCHEMY_DATABASE_URL not set and DB_SECRET_NAME not provided."
     )
 
-engine = create_engine(_build_db_url())
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _default_pool_size() -> int:
+    # Uma conexão por job simultâneo do worker (no modo thread todas saem do mesmo pool)
+    raw_value = os.getenv("WORKER_CONCURRENCY", "1").strip().lower()
+    if raw_value == "auto":
+        return max(os.cpu_count() or 1, 5)
+    try:
+        return max(int(raw_value), 5)
+    except ValueError:
+        return 5
+
+
+def _engine_options(db_url: str) -> dict:
+    options = {"echo": os.getenv("SQL_ECHO", "false").lower() == "true"}
+
+    # SQLite (testes/dev) não usa QueuePool
+    if db_url.startswith("sqlite"):
+        return options
+
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", str(_default_pool_size()))),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "2")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    )
+    return options
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    # Criado na primeira utilização: importar o módulo não acessa rede nem banco
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                db_url = _build_db_url()
+                _engine = create_engine(db_url, **_engine_options(db_url))
+    return _engine
+
+
+def dispose_engine(close: bool = True) -> None:
+    if _engine is not None:
+        _engine.dispose(close=close)
+
+
+def warm_up() -> None:
+    # Resolve a URL (e o segredo) antes de criar o pool, que repassa o cache aos filhos
+    _build_db_url()
+
+
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+
+def SessionLocal(**kwargs) -> Session:
+    return _session_factory(bind=get_engine(), **kwargs)
+
+
+def __getattr__(name: str):
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 Base = declarative_base()
 
@@ -0,0 +1,288 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+FPS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def drain(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelValues, float]) -> None:
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Por combinação de labels: contagem por bucket (não cumulativa), soma e total
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def drain(self) -> Dict[LabelValues, Tuple[List[int], float, int]]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelValues, Tuple[List[int], float, int]]) -> None:
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                current_counts, current_total, current_count = self._values.get(
+                    key, ([0] * len(self.buckets), 0.0, 0)
+                )
+                merged = [a + b for a, b in zip(current_counts, counts)]
+                self._values[key] = (merged, current_total + total, current_count + count)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(c), s, n)) for key, (c, s, n) in self._values.items())
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(upper_bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> Dict[str, dict]:
+        # Usado nos processos do pool: o pai agrega os incrementos de cada job
+        return {name: metric.drain() for name, metric in self._metrics.items()}
+
+    def merge(self, snapshot: Optional[Dict[str, dict]]) -> None:
+        for name, values in (snapshot or {}).items():
+            if name in self._metrics and values:
+                self._metrics[name].merge(values)
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "video_worker_stage_duration_seconds",
+    "Duração de cada etapa do processamento",
+    ["stage"],
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "video_worker_stage_errors_total",
+    "Falhas por etapa do processamento",
+    ["stage"],
+)
+STAGE_BYTES = REGISTRY.counter(
+    "video_worker_stage_bytes_total",
+    "Bytes transferidos ou gerados por etapa",
+    ["stage"],
+)
+FRAMES_EXTRACTED = REGISTRY.counter(
+    "video_worker_frames_extracted_total",
+    "Frames extraídos pelo FFmpeg",
+)
+EXTRACTION_FPS = REGISTRY.histogram(
+    "video_worker_extraction_frames_per_second",
+    "Frames extraídos por segundo de extração",
+    buckets=FPS_BUCKETS,
+)
+QUEUE_RECEIVE_SECONDS = REGISTRY.histogram(
+    "video_worker_queue_receive_seconds",
+    "Latência das chamadas de recebimento do SQS",
+    ["queue"],
+)
+MESSAGES_RECEIVED = REGISTRY.counter(
+    "video_worker_messages_received_total",
+    "Mensagens recebidas do SQS",
+    ["queue"],
+)
+QUEUE_RECEIVE_ERRORS = REGISTRY.counter(
+    "video_worker_queue_receive_errors_total",
+    "Falhas nas chamadas de recebimento do SQS",
+    ["queue"],
+)
+JOBS_DEFERRED = REGISTRY.counter(
+    "video_worker_jobs_deferred_total",
+    "Mensagens adiadas pelo controle de admissão",
+)
+DUPLICATE_MESSAGES = REGISTRY.counter(
+    "video_worker_duplicate_messages_total",
+    "Mensagens de vídeos já processados ou em processamento em outro worker",
+    ["action"],
+)
+NOTIFICATIONS = REGISTRY.counter(
+    "video_worker_notifications_total",
+    "Notificações de falha publicadas no SNS ou acumuladas para digest",
+    ["kind"],
+)
+FFMPEG_KILLS = REGISTRY.counter(
+    "video_worker_ffmpeg_kills_total",
+    "Processos FFmpeg encerrados pelo watchdog",
+    ["reason"],
+)
+JOBS_FINISHED = REGISTRY.counter(
+    "video_worker_jobs_total",
+    "Jobs concluídos por resultado",
+    ["result"],
+)
+
+
+class StageTimer:
+    def __init__(self):
+        self.elapsed = 0.0
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[StageTimer]:
+    timer = StageTimer()
+    started_at = time.perf_counter()
+    try:
+        yield timer
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        timer.elapsed = time.perf_counter() - started_at
+        STAGE_SECONDS.observe(timer.elapsed, stage=stage)
+
+
+def record_bytes(stage: str, size_bytes: int) -> None:
+    if size_bytes:
+        STAGE_BYTES.inc(size_bytes, stage=stage)
+
+
+def record_frames(frame_count: int, elapsed_seconds: float) -> None:
+    FRAMES_EXTRACTED.inc(frame_count)
+    if elapsed_seconds > 0:
+        EXTRACTION_FPS.observe(frame_count / elapsed_seconds)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"Métricas Prometheus disponíveis em http://{host}:{server.server_address[1]}/metrics")
+    return server
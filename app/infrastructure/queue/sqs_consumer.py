@@ -1,56 +1,529 @@
 import json
 import logging
+import math
 import os
+import threading
 import time
-from typing import Optional, Dict, Any
+from collections import deque
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Callable, Dict, Any, Deque, Iterator, List, Set, Tuple
 import boto3
 
+from app.infrastructure.metrics import (
+    MESSAGES_RECEIVED,
+    QUEUE_RECEIVE_ERRORS,
+    QUEUE_RECEIVE_SECONDS,
+    STAGE_ERRORS,
+)
+
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_SIZE = 10
+DEFAULT_QUEUE_NAME = "default"
+# Intervalo mínimo entre consultas à mesma fila: evita laço apertado quando o SQS falha de imediato
+MIN_POLL_INTERVAL_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class QueueConfig:
+    name: str
+    url: str
+    weight: int = 1
+
+
+def parse_queues(raw: Optional[str], default_url: Optional[str] = None) -> List[QueueConfig]:
+    # Formato: "premium=https://.../premium:3,bulk=https://.../bulk:1" (peso opcional, padrão 1)
+    if not raw or not raw.strip():
+        return [QueueConfig(DEFAULT_QUEUE_NAME, default_url, 1)]
+
+    queues: List[QueueConfig] = []
+    for entry in raw.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+
+        name, separator, url = entry.partition("=")
+        name, url = name.strip(), url.strip()
+        if not separator or not name or not url:
+            raise ValueError(f"Fila inválida em SQS_QUEUES: '{entry}' (esperado nome=url[:peso])")
+
+        weight = 1
+        head, colon, tail = url.rpartition(":")
+        if colon and tail.isdigit():
+            url, weight = head, int(tail)
+        if weight < 1:
+            raise ValueError(f"Peso inválido para a fila '{name}': {weight}")
+        if any(queue.name == name for queue in queues):
+            raise ValueError(f"Fila duplicada em SQS_QUEUES: '{name}'")
+
+        queues.append(QueueConfig(name, url, weight))
+
+    if not queues:
+        raise ValueError("SQS_QUEUES não define nenhuma fila")
+    return queues
+
+
 class SQSConsumer:
     def __init__(self):
-        self.queue_url = os.getenv("SQS_VIDEO_PROCESSING_QUEUE")
+        self.queues = parse_queues(os.getenv("SQS_QUEUES"), os.getenv("SQS_VIDEO_PROCESSING_QUEUE"))
+        # A primeira fila é a padrão para handles sem fila conhecida
+        self.queue_url = self.queues[0].url
         self.region = os.getenv("AWS_REGION", "us-east-1")
         
-        self.client = boto3.client(
-            'sqs',
-            region_name=self.region,
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            endpoint_url=os.getenv("AWS_ENDPOINT_URL")  # For LocalStack in development
+        self._client = None
+        self._client_lock = threading.Lock()
+
+        self.visibility_timeout = int(os.getenv("SQS_VISIBILITY_TIMEOUT", "300"))
+        self.heartbeat_interval = float(
+            os.getenv("SQS_HEARTBEAT_INTERVAL", str(max(1, self.visibility_timeout // 3)))
         )
-        
-        logger.info(f"SQS Consumer inicializado - Queue: {self.queue_url}")
+        self._in_flight_handles: Set[str] = set()
+        self._heartbeat_lock = threading.Lock()
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._heartbeat_listeners: List[Callable[[], None]] = []
+
+        self.delete_batch_size = max(1, min(int(os.getenv("SQS_DELETE_BATCH_SIZE", str(MAX_BATCH_SIZE))), MAX_BATCH_SIZE))
+        self.delete_flush_interval = float(os.getenv("SQS_DELETE_FLUSH_INTERVAL", "1"))
+        self._pending_deletes: List[str] = []
+        self._delete_lock = threading.Lock()
+        self._delete_timer: Optional[threading.Timer] = None
+
+        # Estado do polling em várias filas: um long poll pendente por fila e mensagens já recebidas,
+        # cada uma com o prazo para chegar a um slot antes de voltar para a fila
+        self._queue_by_handle: Dict[str, QueueConfig] = {}
+        self._polls: Dict[str, Future] = {}
+        self._requested: Dict[str, int] = {}
+        self._prefetched: Dict[str, Deque[Tuple[float, Dict[str, Any]]]] = {
+            queue.name: deque() for queue in self.queues
+        }
+        self.prefetch_ttl = float(os.getenv("SQS_PREFETCH_TTL_SECONDS", "5"))
+        self.gather_window = float(os.getenv("SQS_GATHER_WINDOW_SECONDS", "0.2"))
+        self._current_weights: Dict[str, int] = {queue.name: 0 for queue in self.queues}
+        # Fila ociosa: a última consulta voltou vazia. Começam ociosas para a primeira rodada consultar todas
+        self._idle: Dict[str, bool] = {queue.name: True for queue in self.queues}
+        self._next_poll_at: Dict[str, float] = {queue.name: 0.0 for queue in self.queues}
+        self._poll_lock = threading.Lock()
+        self._poll_executor: Optional[ThreadPoolExecutor] = None
+        self._polling_stopped = False
 
-    def receive_message(self, wait_time: int = 20, max_messages: int = 1) -> Optional[Dict[str, Any]]:
+        if len(self.queues) > 1:
+            queues = ", ".join(f"{queue.name} (peso {queue.weight})" for queue in self.queues)
+            logger.info(f"SQS Consumer inicializado - Filas: {queues}")
+        else:
+            logger.info(f"SQS Consumer inicializado - Queue: {self.queue_url}")
+
+    @property
+    def client(self):
+        # Criado no primeiro uso, e não na construção do worker
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = boto3.client(
+                        'sqs',
+                        region_name=self.region,
+                        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                        endpoint_url=os.getenv("AWS_ENDPOINT_URL")  # For LocalStack in development
+                    )
+        return self._client
+
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
+
+    def receive_messages(self, wait_time: int = 20, max_messages: int = MAX_BATCH_SIZE) -> List[Dict[str, Any]]:
+        if len(self.queues) == 1:
+            return self._receive_from(self.queues[0], wait_time, max_messages)
+        return self._receive_weighted(wait_time, max(1, max_messages))
+
+    def _receive_from(self, queue: QueueConfig, wait_time: int, max_messages: int) -> List[Dict[str, Any]]:
+        started_at = time.perf_counter()
         try:
             response = self.client.receive_message(
-                QueueUrl=self.queue_url,
-                MaxNumberOfMessages=max_messages,
-                WaitTimeSeconds=wait_time
+                QueueUrl=queue.url,
+                MaxNumberOfMessages=max(1, min(max_messages, MAX_BATCH_SIZE)),
+                WaitTimeSeconds=wait_time,
+                VisibilityTimeout=self.visibility_timeout,
+                AttributeNames=['ApproximateReceiveCount']
             )
-            
-            if 'Messages' in response:
-                return response['Messages'][0]
-            
-            return None
-            
+
+            messages = response.get('Messages', [])
+            MESSAGES_RECEIVED.inc(len(messages), queue=queue.name)
+            return messages
+
         except Exception as e:
-            logger.error(f"Erro ao receber mensagem do SQS: {str(e)}")
-            return None
+            logger.error(f"Erro ao receber mensagem do SQS ({queue.name}): {str(e)}")
+            STAGE_ERRORS.inc(stage="receive")
+            QUEUE_RECEIVE_ERRORS.inc(queue=queue.name)
+            return []
+        finally:
+            QUEUE_RECEIVE_SECONDS.observe(time.perf_counter() - started_at, queue=queue.name)
+
+    def _receive_weighted(self, wait_time: int, max_messages: int) -> List[Dict[str, Any]]:
+        # Os long polls das filas correm em paralelo: uma fila vazia não atrasa as demais
+        deadline = time.monotonic() + wait_time
+        gather_until: Optional[float] = None
+        first_round = True
+        while True:
+            with self._poll_lock:
+                self._collect_polls()
+                now = time.monotonic()
+                if self._polling_stopped:
+                    return self._select_prefetched(max_messages)
+                if self._has_prefetched():
+                    # Janela curta para as consultas concorrentes também chegarem antes da entrega
+                    if gather_until is None:
+                        gather_until = now + self.gather_window
+                    if not self._polls or now >= gather_until:
+                        return self._select_prefetched(max_messages)
+                else:
+                    if not first_round and now >= deadline:
+                        return []
+                    self._start_polls(wait_time, max_messages)
+                pending = list(self._polls.values())
+                next_poll_at = min(
+                    (at for name, at in self._next_poll_at.items() if name not in self._polls), default=None
+                )
+
+            first_round = False
+            now = time.monotonic()
+            if gather_until is not None:
+                wait(pending, timeout=max(0.0, gather_until - now), return_when=ALL_COMPLETED)
+                continue
+
+            # Folga além do long poll para a própria chamada HTTP; acorda também quando uma fila
+            # em espera pode ser consultada de novo
+            timeout = max(0.0, deadline - now) + 5
+            if next_poll_at is not None and next_poll_at > now:
+                timeout = min(timeout, next_poll_at - now)
+            if not pending:
+                time.sleep(min(timeout, max(0.0, deadline - now)))
+                continue
+            wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+    def _poll_shares(self, max_messages: int, queues: Optional[List[QueueConfig]] = None) -> Dict[str, int]:
+        # Com todas as filas ociosas, divide os slots livres na proporção dos pesos (maiores restos) e
+        # cada fila pede ao menos uma mensagem; só aqui pode haver excedente, que expira em prefetch_ttl
+        queues = queues or self.queues
+        total_weight = sum(queue.weight for queue in queues)
+        exact = {queue.name: max_messages * queue.weight / total_weight for queue in queues}
+        shares = {name: math.floor(value) for name, value in exact.items()}
+        leftover = max_messages - sum(shares.values())
+        for name in sorted(exact, key=lambda name: exact[name] - shares[name], reverse=True)[:leftover]:
+            shares[name] += 1
+        return {name: max(1, share) for name, share in shares.items()}
+
+    def _allocate_slots(self, slots: int, queues: List[QueueConfig]) -> Dict[str, int]:
+        # Round-robin ponderado suave sobre as filas, com o estado mantido entre consultas: mesmo com um
+        # slot livre por vez, uma fila de peso 3 recebe três slots para cada um de uma fila de peso 1
+        shares = {queue.name: 0 for queue in queues}
+        total_weight = sum(queue.weight for queue in queues)
+        for _ in range(slots):
+            for queue in queues:
+                self._current_weights[queue.name] += queue.weight
+            chosen = max(queues, key=lambda queue: self._current_weights[queue.name])
+            self._current_weights[chosen.name] -= total_weight
+            shares[chosen.name] += 1
+        return shares
+
+    def _start_polls(self, wait_time: int, max_messages: int) -> None:
+        if self._poll_executor is None:
+            self._poll_executor = ThreadPoolExecutor(max_workers=len(self.queues), thread_name_prefix="sqs-poll")
+
+        # Nunca pede mais mensagens do que os slots livres, descontando consultas pendentes e recebidas
+        available = (
+            max_messages
+            - sum(self._requested.values())
+            - sum(len(buffer) for buffer in self._prefetched.values())
+        )
+        now = time.monotonic()
+        eligible = [
+            queue for queue in self.queues
+            if queue.name not in self._polls and now >= self._next_poll_at[queue.name]
+        ]
+        if available <= 0 or not eligible:
+            return
+
+        all_idle = all(self._idle.values())
+        if all_idle:
+            shares = self._poll_shares(available, eligible)
+        else:
+            shares = self._allocate_slots(available, eligible)
+
+        for queue in eligible:
+            share = shares[queue.name]
+            if share <= 0:
+                continue
+            # Com outras filas ocupadas, a fila ociosa é sondada sem long poll para não reter os slots
+            queue_wait = 0 if self._idle[queue.name] and not all_idle else wait_time
+            future = self._poll_executor.submit(self._poll_queue, queue, queue_wait, share)
+            # O poll pode terminar depois que o receive já retornou; o timer cobre também esse caso
+            future.add_done_callback(self._schedule_prefetch_expiry)
+            self._polls[queue.name] = future
+            self._requested[queue.name] = share
+
+    def _poll_queue(self, queue: QueueConfig, wait_time: int, max_messages: int) -> Tuple[float, List[Dict[str, Any]]]:
+        messages = self._receive_from(queue, wait_time, max_messages)
+        return time.monotonic(), messages
+
+    def _collect_polls(self) -> None:
+        for queue in self.queues:
+            future = self._polls.get(queue.name)
+            if future is None or not future.done():
+                continue
+
+            del self._polls[queue.name]
+            self._requested.pop(queue.name, None)
+            received_at, messages = future.result()
+            self._idle[queue.name] = not messages
+            if not messages:
+                # Fila vazia ou com erro: intervalo mínimo antes da próxima consulta, sem laço apertado
+                self._next_poll_at[queue.name] = received_at + MIN_POLL_INTERVAL_SECONDS
+            for message in messages:
+                self._remember_queue(message['ReceiptHandle'], queue)
+                # Sem heartbeat: se não chegar a um slot a tempo, a mensagem volta para outros nós
+                self._prefetched[queue.name].append((received_at + self.prefetch_ttl, message))
+
+    def _schedule_prefetch_expiry(self, future: Future) -> None:
+        if future.cancelled() or not future.result()[1]:
+            return
+        timer = threading.Timer(self.prefetch_ttl, self._expire_prefetched)
+        timer.daemon = True
+        timer.start()
+
+    def _expire_prefetched(self) -> None:
+        now = time.monotonic()
+        expired: List[Dict[str, Any]] = []
+        with self._poll_lock:
+            self._collect_polls()
+            for buffer in self._prefetched.values():
+                while buffer and buffer[0][0] <= now:
+                    expired.append(buffer.popleft()[1])
+
+        if expired:
+            logger.info(f"{len(expired)} mensagens recebidas sem slot livre devolvidas à fila")
+        for message in expired:
+            self.release_message(message['ReceiptHandle'])
+
+    def _has_prefetched(self) -> bool:
+        return any(self._prefetched.values())
+
+    def _select_prefetched(self, max_messages: int) -> List[Dict[str, Any]]:
+        # Os pesos já valeram na divisão dos slots entre as consultas; aqui sai primeiro a mensagem
+        # recebida há mais tempo, a mais próxima de expirar
+        selected: List[Dict[str, Any]] = []
+        while len(selected) < max_messages:
+            buffers = [buffer for buffer in self._prefetched.values() if buffer]
+            if not buffers:
+                break
+            oldest = min(buffers, key=lambda buffer: buffer[0][0])
+            selected.append(oldest.popleft()[1])
+        return selected
+
+    def stop_polling(self) -> None:
+        # Devolve à fila as mensagens recebidas que não chegaram a ser entregues ao worker
+        with self._poll_lock:
+            self._polling_stopped = True
+            pending = [(self._queue(name), future) for name, future in self._polls.items()]
+            self._polls.clear()
+            self._requested.clear()
+            prefetched = [message for buffer in self._prefetched.values() for _, message in buffer]
+            for buffer in self._prefetched.values():
+                buffer.clear()
+            executor, self._poll_executor = self._poll_executor, None
+
+        for queue, future in pending:
+            future.add_done_callback(lambda f, q=queue: self._release_late_poll(f, q))
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for message in prefetched:
+            self.release_message(message['ReceiptHandle'])
+
+    def _release_late_poll(self, future: Future, queue: QueueConfig) -> None:
+        if future.cancelled():
+            return
+        for message in future.result()[1]:
+            self._remember_queue(message['ReceiptHandle'], queue)
+            self.release_message(message['ReceiptHandle'])
+
+    def _queue(self, name: str) -> QueueConfig:
+        return next(queue for queue in self.queues if queue.name == name)
+
+    def _remember_queue(self, receipt_handle: str, queue: QueueConfig) -> None:
+        self._queue_by_handle[receipt_handle] = queue
+
+    def _forget_queue(self, receipt_handle: str) -> None:
+        self._queue_by_handle.pop(receipt_handle, None)
+
+    def _queue_url_for(self, receipt_handle: str) -> str:
+        queue = self._queue_by_handle.get(receipt_handle)
+        return queue.url if queue is not None else self.queue_url
+
+    def receive_message(self, wait_time: int = 20) -> Optional[Dict[str, Any]]:
+        messages = self.receive_messages(wait_time=wait_time, max_messages=1)
+        return messages[0] if messages else None
 
     def delete_message(self, receipt_handle: str) -> bool:
         try:
             self.client.delete_message(
-                QueueUrl=self.queue_url,
+                QueueUrl=self._queue_url_for(receipt_handle),
                 ReceiptHandle=receipt_handle
             )
+            self._forget_queue(receipt_handle)
             logger.info("Mensagem deletada do SQS com sucesso")
             return True
         except Exception as e:
             logger.error(f"Erro ao deletar mensagem do SQS: {str(e)}")
             return False
 
+    def buffer_delete(self, receipt_handle: str) -> List[Dict[str, Any]]:
+        with self._delete_lock:
+            self._pending_deletes.append(receipt_handle)
+            batch_full = len(self._pending_deletes) >= self.delete_batch_size
+            if not batch_full and self._delete_timer is None:
+                self._delete_timer = threading.Timer(self.delete_flush_interval, self.flush_deletes)
+                self._delete_timer.daemon = True
+                self._delete_timer.start()
+
+        if batch_full:
+            return self.flush_deletes()
+        return []
+
+    def flush_deletes(self) -> List[Dict[str, Any]]:
+        with self._delete_lock:
+            pending = self._pending_deletes
+            self._pending_deletes = []
+            if self._delete_timer is not None:
+                self._delete_timer.cancel()
+                self._delete_timer = None
+
+        # Cada lote vai para a fila de origem das mensagens
+        by_queue: Dict[str, List[str]] = {}
+        for receipt_handle in pending:
+            by_queue.setdefault(self._queue_url_for(receipt_handle), []).append(receipt_handle)
+
+        failures: List[Dict[str, Any]] = []
+        for queue_url, receipt_handles in by_queue.items():
+            for start in range(0, len(receipt_handles), MAX_BATCH_SIZE):
+                failures.extend(self._delete_batch(receipt_handles[start:start + MAX_BATCH_SIZE], queue_url))
+
+        failed = {failure['ReceiptHandle'] for failure in failures}
+        for receipt_handle in pending:
+            if receipt_handle not in failed:
+                self._forget_queue(receipt_handle)
+        return failures
+
+    def _delete_batch(self, receipt_handles: List[str], queue_url: Optional[str] = None) -> List[Dict[str, Any]]:
+        entries = [
+            {'Id': str(index), 'ReceiptHandle': receipt_handle}
+            for index, receipt_handle in enumerate(receipt_handles)
+        ]
+
+        try:
+            response = self.client.delete_message_batch(QueueUrl=queue_url or self.queue_url, Entries=entries)
+        except Exception as e:
+            logger.error(f"Erro ao deletar lote de mensagens do SQS: {str(e)}")
+            return [
+                {'ReceiptHandle': entry['ReceiptHandle'], 'Code': 'BatchRequestFailed', 'Message': str(e)}
+                for entry in entries
+            ]
+
+        failures = []
+        for failed in response.get('Failed', []):
+            failure = {
+                'ReceiptHandle': entries[int(failed['Id'])]['ReceiptHandle'],
+                'Code': failed.get('Code'),
+                'Message': failed.get('Message'),
+            }
+            logger.error(f"Falha ao deletar mensagem do SQS em lote: {failure['Code']} - {failure['Message']}")
+            failures.append(failure)
+
+        deleted = len(entries) - len(failures)
+        if deleted:
+            logger.info(f"{deleted} mensagens deletadas do SQS em lote")
+        return failures
+
+    def change_message_visibility(self, receipt_handle: str, visibility_timeout: int) -> bool:
+        try:
+            self.client.change_message_visibility(
+                QueueUrl=self._queue_url_for(receipt_handle),
+                ReceiptHandle=receipt_handle,
+                VisibilityTimeout=visibility_timeout
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao alterar visibilidade da mensagem SQS: {str(e)}")
+            return False
+
+    def defer_message(self, receipt_handle: str, delay_seconds: int) -> bool:
+        # Devolve a mensagem à fila só depois do atraso, sem ocupar um slot enquanto espera
+        deferred = self.change_message_visibility(receipt_handle, delay_seconds)
+        if deferred:
+            self._forget_queue(receipt_handle)
+            logger.info(f"Mensagem adiada por {delay_seconds}s")
+        return deferred
+
+    def release_message(self, receipt_handle: str) -> bool:
+        released = self.change_message_visibility(receipt_handle, 0)
+        if released:
+            self._forget_queue(receipt_handle)
+            logger.info("Mensagem devolvida à fila para nova tentativa")
+        return released
+
+    def track_in_flight(self, receipt_handle: str) -> None:
+        with self._heartbeat_lock:
+            self._in_flight_handles.add(receipt_handle)
+            self._ensure_heartbeat_thread()
+
+    def untrack_in_flight(self, receipt_handle: str) -> None:
+        # Aguarda um ciclo de heartbeat em andamento para não estender uma mensagem já liberada
+        with self._heartbeat_lock:
+            self._in_flight_handles.discard(receipt_handle)
+
+    @contextmanager
+    def heartbeat(self, receipt_handle: str) -> Iterator[None]:
+        self.track_in_flight(receipt_handle)
+        try:
+            yield
+        finally:
+            self.untrack_in_flight(receipt_handle)
+
+    def add_heartbeat_listener(self, listener: Callable[[], None]) -> None:
+        # Chamado a cada ciclo do heartbeat, para renovar outros recursos dos jobs em andamento
+        self._heartbeat_listeners.append(listener)
+
+    def stop_heartbeat(self) -> None:
+        self._heartbeat_stop.set()
+        thread = self._heartbeat_thread
+        if thread is not None:
+            thread.join(timeout=self.heartbeat_interval + 1)
+        self._heartbeat_thread = None
+
+    def _ensure_heartbeat_thread(self) -> None:
+        if self._heartbeat_thread is not None and self._heartbeat_thread.is_alive():
+            return
+        self._heartbeat_stop.clear()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, name="sqs-heartbeat", daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self) -> None:
+        while not self._heartbeat_stop.wait(self.heartbeat_interval):
+            with self._heartbeat_lock:
+                for receipt_handle in list(self._in_flight_handles):
+                    self.change_message_visibility(receipt_handle, self.visibility_timeout)
+
+            for listener in self._heartbeat_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    logger.error(f"Erro em tarefa do heartbeat: {str(e)}")
+
     def parse_message(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
             body = json.loads(message['Body'])
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, DateTime, Integer, String
+
+from app.infrastructure.db.database import Base
+
+class ResultCacheEntry(Base):
+    __tablename__ = "video_result_cache"
+
+    content_key = Column(String(64), primary_key=True)
+    file_path = Column(String(255), nullable=False)
+    frame_count = Column(Integer, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, index=True)
+    last_hit_at = Column(DateTime, nullable=False, index=True)
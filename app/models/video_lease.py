@@ -0,0 +1,12 @@
+from sqlalchemy import Boolean, Column, DateTime, Integer, String
+
+from app.infrastructure.db.database import Base
+
+class VideoLease(Base):
+    __tablename__ = "video_processing_lease"
+
+    video_id = Column(Integer, primary_key=True, autoincrement=False)
+    owner = Column(String(128), nullable=False)
+    completed = Column(Boolean, nullable=False, default=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, DateTime, Float, Integer
+
+from app.infrastructure.db.database import Base
+
+class VideoProgress(Base):
+    __tablename__ = "video_processing_progress"
+
+    video_id = Column(Integer, primary_key=True, autoincrement=False)
+    percent = Column(Float, nullable=True)
+    frames = Column(Integer, nullable=False, default=0)
+    processed_seconds = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, index=True)
@@ -1,11 +1,28 @@
+import asyncio
+import hashlib
 import logging
-from app.gateways.video_processing_gateway import VideoProcessingGateway
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+from app.entities.video import ExtractionOptions, ExtractionProgress
+from app.gateways.video_processing_gateway import SourceStreamError, VideoProcessingGateway
 from app.gateways.s3_gateway import S3Gateway
 from app.gateways.notification_gateway import NotificationGateway
+from app.dao.result_cache_dao import ResultCacheDAO
 from app.dao.video_dao import VideoDAO
+from app.infrastructure.metrics import track_stage
 
 logger = logging.getLogger(__name__)
 
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 
 class ProcessVideoUseCase:
     def __init__(
@@ -14,52 +31,186 @@ class ProcessVideoUseCase:
         video_dao: VideoDAO,
         s3_gateway: S3Gateway = None,
         notification_gateway: NotificationGateway = None,
+        result_cache: Optional[ResultCacheDAO] = None,
+        on_progress: Optional[Callable[[int, ExtractionProgress], None]] = None,
     ):
         self.processing_gateway = processing_gateway
         self.s3_gateway = s3_gateway
         self.video_dao = video_dao
         self.notification_gateway = notification_gateway
+        self.result_cache = result_cache
+        self.on_progress = on_progress
 
-    def execute(self, video_id: int, video_path: str, timestamp: str):
+    def execute(
+        self,
+        video_id: int,
+        video_path: str,
+        timestamp: str,
+        input_stream: Optional[BinaryIO] = None,
+        content_key: Optional[str] = None,
+        options: Optional[ExtractionOptions] = None,
+        user_id: Optional[int] = None,
+    ):
         try:
             logger.info(f"Iniciando processamento do vídeo {video_id}")
 
+            # Um content_key recebido já foi consultado no cache pelo chamador (antes do download)
+            if self.result_cache is not None and content_key is None and input_stream is None:
+                content_key = self.resolve_content_key(video_path, options=options)
+                if self.reuse_cached_result(video_id, content_key):
+                    return
+
             zip_path, frame_count, _ = self.processing_gateway.process_video(
-                video_path, timestamp
+                video_path,
+                timestamp,
+                options=options,
+                input_stream=input_stream,
+                on_progress=self._progress_reporter(video_id),
             )
-            logger.info(
-                f"Vídeo {video_id} processado com sucesso. {frame_count} frames extraídos."
+            self._mark_processed(video_id, zip_path, frame_count)
+            self._remember_result(content_key, zip_path, frame_count)
+
+        except SourceStreamError:
+            # Como uma falha de download: o vídeo não é marcado com erro e a mensagem volta para a fila
+            raise
+        except Exception as e:
+            self._handle_failure(video_id, e, user_id)
+
+    async def execute_async(
+        self,
+        video_id: int,
+        video_path: str,
+        timestamp: str,
+        content_key: Optional[str] = None,
+        options: Optional[ExtractionOptions] = None,
+        user_id: Optional[int] = None,
+    ):
+        # Mesma semântica de execute; DAO e SNS são bloqueantes e rodam em threads
+        try:
+            logger.info(f"Iniciando processamento do vídeo {video_id}")
+
+            if self.result_cache is not None and content_key is None:
+                content_key = await asyncio.to_thread(
+                    self.resolve_content_key, video_path, None, options
+                )
+                if await asyncio.to_thread(self.reuse_cached_result, video_id, content_key):
+                    return
+
+            zip_path, frame_count, _ = await self.processing_gateway.process_video_async(
+                video_path, timestamp, options=options, on_progress=self._progress_reporter(video_id)
             )
-           
+            await asyncio.to_thread(self._mark_processed, video_id, zip_path, frame_count)
+            await asyncio.to_thread(self._remember_result, content_key, zip_path, frame_count)
+
+        except Exception as e:
+            await asyncio.to_thread(self._handle_failure, video_id, e, user_id)
+
+    def _progress_reporter(self, video_id: int) -> Optional[Callable[[ExtractionProgress], None]]:
+        if self.on_progress is None:
+            return None
+        return lambda progress: self.on_progress(video_id, progress)
+
+    def resolve_content_key(
+        self, video_path: str, s3_key: Optional[str] = None, options: Optional[ExtractionOptions] = None
+    ) -> Optional[str]:
+        # ETag/tamanho do S3 evitam ler o vídeo; arquivos locais usam SHA-256 em streaming
+        fingerprint = None
+        if s3_key and self.s3_gateway is not None:
+            s3_fingerprint = self.s3_gateway.get_object_fingerprint(s3_key)
+            if s3_fingerprint:
+                fingerprint = f"s3:{s3_fingerprint}"
+
+        local_path = Path(video_path)
+        if fingerprint is None and local_path.is_file():
+            fingerprint = f"sha256:{_hash_file(local_path)}"
+
+        if fingerprint is None:
+            return None
+
+        signature = self.processing_gateway.extraction_signature(options)
+        return hashlib.sha256(f"{fingerprint}|{signature}".encode("utf-8")).hexdigest()
+
+    def reuse_cached_result(self, video_id: int, content_key: Optional[str]) -> bool:
+        if self.result_cache is None or not content_key:
+            return False
+
+        try:
+            entry = self.result_cache.get_entry(content_key)
+            if entry is None:
+                return False
+
+            if not self._output_exists(entry.file_path):
+                logger.warning(f"ZIP em cache não existe mais ({entry.file_path}), reprocessando")
+                self.result_cache.remove_entry(content_key)
+                return False
+
+            self.video_dao.update_video_status(video_id=video_id, status=1, file_path=entry.file_path)
+            self.result_cache.record_hit(content_key)
+        except Exception as e:
+            logger.warning(f"Falha ao consultar cache de resultados: {str(e)}")
+            return False
+
+        logger.info(f"Vídeo {video_id} reaproveitou resultado em cache: {entry.file_path}")
+        return True
+
+    def _output_exists(self, file_path: str) -> bool:
+        if file_path.startswith("s3://"):
+            if self.s3_gateway is None:
+                return False
+            return self.s3_gateway.object_exists(file_path[5:].split("/", 1)[-1])
+        return Path(file_path).exists()
+
+    def _remember_result(self, content_key: Optional[str], zip_path, frame_count: int) -> None:
+        if self.result_cache is None or not content_key:
+            return
+
+        try:
+            self.result_cache.save_entry(content_key, str(zip_path), frame_count)
+        except Exception as e:
+            logger.warning(f"Falha ao registrar resultado no cache: {str(e)}")
+
+    def _mark_processed(self, video_id: int, zip_path, frame_count: int) -> None:
+        logger.info(
+            f"Vídeo {video_id} processado com sucesso. {frame_count} frames extraídos."
+        )
+
+        with track_stage("db"):
             self.video_dao.update_video_status(
                 video_id=video_id, status=1, file_path=str(zip_path)
             )
 
-            logger.info(f"Vídeo {video_id} status atualizado para 1 (processado).")
+        logger.info(f"Vídeo {video_id} status atualizado para 1 (processado).")
 
-        except Exception as e:
-            logger.error(f"Erro ao processar vídeo {video_id}: {str(e)}")
-            
-            try:
+    def _handle_failure(self, video_id: int, e: Exception, user_id: Optional[int] = None) -> None:
+        logger.error(f"Erro ao processar vídeo {video_id}: {str(e)}")
+
+        try:
+            with track_stage("db"):
                 self.video_dao.update_video_status(video_id=video_id, status=2)
-                logger.info(f"Vídeo {video_id} status atualizado para 2 (erro).")
-            except Exception as update_error:
-                logger.error(f"Erro ao atualizar status do vídeo {video_id}: {str(update_error)}")
-
-            if self.notification_gateway:
-                user_id = None
-                try:
-                    video = self.video_dao.get_video_by_id(video_id)
-                    if video and getattr(video, "user_id", None) is not None:
-                        user_id = int(video.user_id)
-                except Exception:
-                    logger.warning("Não foi possível obter user_id para notificação", exc_info=True)
-
-                try:
+            logger.info(f"Vídeo {video_id} status atualizado para 2 (erro).")
+        except Exception as update_error:
+            logger.error(f"Erro ao atualizar status do vídeo {video_id}: {str(update_error)}")
+
+        if self.notification_gateway:
+            # O user_id vem da mensagem; o banco só é consultado para mensagens antigas, sem o campo
+            if user_id is None:
+                user_id = self._lookup_user_id(video_id)
+
+            try:
+                with track_stage("notify"):
                     self.notification_gateway.notify_processing_error(
                         video_id=video_id,
                         error_message=str(e),
                         user_id=user_id,
                     )
-                except Exception:
-                    logger.warning("Falha ao enviar notificação de erro", exc_info=True)
+            except Exception:
+                logger.warning("Falha ao enviar notificação de erro", exc_info=True)
+
+    def _lookup_user_id(self, video_id: int) -> Optional[int]:
+        try:
+            video = self.video_dao.get_video_by_id(video_id)
+            if video and getattr(video, "user_id", None) is not None:
+                return int(video.user_id)
+        except Exception:
+            logger.warning("Não foi possível obter user_id para notificação", exc_info=True)
+        return None
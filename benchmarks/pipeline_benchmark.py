@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))
+
+DEFAULT_WORK_DIR = ROOT_DIR / "benchmarks" / ".work"
+DEFAULT_BASELINE = ROOT_DIR / "benchmarks" / "baseline.json"
+BUCKET = "video-processor-bucket"
+
+SCENARIOS = {
+    "360p-10s": {"size": "640x360", "duration": 10},
+    "720p-30s": {"size": "1280x720", "duration": 30},
+    "1080p-60s": {"size": "1920x1080", "duration": 60},
+}
+QUICK_SCENARIOS = ["360p-10s"]
+MODES = ["gateway", "worker"]
+
+# Métricas comparadas com a baseline: (nome, maior é melhor)
+COMPARED_METRICS = [
+    ("wall_seconds", False),
+    ("frames_per_second", True),
+    ("peak_rss_bytes", False),
+    ("disk_write_bytes", False),
+]
+
+
+def _generate_video(video_path: Path, size: str, duration: int) -> None:
+    if video_path.exists():
+        return
+
+    video_path.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc=size={size}:rate=25:duration={duration}",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-movflags", "+faststart",
+        str(video_path),
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def _disk_write_bytes() -> int:
+    # Inclui os filhos já finalizados (FFmpeg), somados ao processo ao serem aguardados
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _peak_rss_bytes() -> int:
+    peak_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak_kb * 1024
+
+
+def _run_one(scenario: str, mode: str, work_dir: Path) -> dict:
+    # Executa em processo próprio: RSS, bytes gravados e métricas isolados por cenário
+    run_dir = work_dir / "runs" / f"{scenario}-{mode}"
+    shutil.rmtree(run_dir, ignore_errors=True)
+    bucket_dir = run_dir / "bucket"
+    video_key = f"uploads/{scenario}.mp4"
+    (bucket_dir / "uploads").mkdir(parents=True)
+    shutil.copyfile(work_dir / "videos" / f"{scenario}.mp4", bucket_dir / video_key)
+
+    os.environ["APP_ENV"] = "production"
+    os.environ["AWS_S3_BUCKET"] = BUCKET
+    os.environ["DATABASE_URL"] = f"sqlite:///{run_dir / 'worker.db'}"
+    os.environ.setdefault("SQS_VIDEO_PROCESSING_QUEUE", "http://localhost/000000000000/benchmark")
+
+    from benchmarks.stand_ins import install_local_clients
+
+    install_local_clients(bucket_dir)
+
+    from app.infrastructure.db.database import Base, SessionLocal, get_engine
+    from app.infrastructure.metrics import FRAMES_EXTRACTED, REGISTRY, STAGE_SECONDS
+    from app.models.video import Video as VideoModel
+    import worker
+
+    Base.metadata.create_all(get_engine())
+    with SessionLocal() as db:
+        db.add(VideoModel(id=1, user_id=1, title=scenario, file_path=video_key, status=0))
+        db.commit()
+
+    video_worker = worker.VideoWorker()
+    video_worker.base_dir = run_dir
+    video_worker.uploads_dir = run_dir / "uploads"
+    video_worker.uploads_dir.mkdir()
+    video_worker.processing_gateway = worker.VideoProcessingGateway(
+        base_dir=run_dir, s3_gateway=video_worker.s3_gateway
+    )
+    REGISTRY.drain()
+
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    disk_before = _disk_write_bytes()
+    started_at = time.perf_counter()
+
+    if mode == "gateway":
+        local_video = run_dir / "uploads" / f"{scenario}.mp4"
+        shutil.copyfile(bucket_dir / video_key, local_video)
+        disk_before = _disk_write_bytes()
+        started_at = time.perf_counter()
+        video_worker.processing_gateway.process_video(str(local_video), timestamp)
+    else:
+        success = video_worker.process_message(
+            {"video_id": 1, "video_path": f"s3://{BUCKET}/{video_key}", "timestamp": timestamp}
+        )
+        with SessionLocal() as db:
+            status = db.get(VideoModel, 1).status
+        if not success or status != 1:
+            raise RuntimeError(f"Processamento falhou no cenário {scenario} (status {status})")
+
+    wall_seconds = time.perf_counter() - started_at
+    disk_write_bytes = _disk_write_bytes() - disk_before
+
+    stages = {
+        key[0]: round(total, 4)
+        for key, (_, total, _) in STAGE_SECONDS.drain().items()
+    }
+    frames = int(FRAMES_EXTRACTED.value())
+    extract_seconds = stages.get("extract", 0)
+
+    return {
+        "wall_seconds": round(wall_seconds, 4),
+        "frames": frames,
+        "frames_per_second": round(frames / extract_seconds, 2) if extract_seconds else 0,
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "disk_write_bytes": disk_write_bytes,
+        "stages": stages,
+    }
+
+
+def _run_scenario(scenario: str, mode: str, work_dir: Path, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, __file__, "--run-one", scenario, "--mode", mode, "--work-dir", str(work_dir)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    # Mediana de cada métrica entre as repetições
+    result = {
+        name: statistics.median(run[name] for run in runs)
+        for name in ("wall_seconds", "frames", "frames_per_second", "peak_rss_bytes", "disk_write_bytes")
+    }
+    stage_names = sorted({stage for run in runs for stage in run["stages"]})
+    result["stages"] = {
+        stage: statistics.median(run["stages"].get(stage, 0) for run in runs) for stage in stage_names
+    }
+    return result
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+
+        for metric, higher_is_better in COMPARED_METRICS:
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+
+            change = (after - before) / before
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{name}: {metric} {before} -> {after} ({change:+.1%})")
+    return regressions
+
+
+def _print_results(results: dict) -> None:
+    header = f"{'cenário':<20} {'tempo (s)':>10} {'frames/s':>10} {'RSS (MB)':>10} {'disco (MB)':>11}  etapas (s)"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        stages = ", ".join(f"{stage}={seconds:.2f}" for stage, seconds in result["stages"].items())
+        print(
+            f"{name:<20} {result['wall_seconds']:>10.2f} {result['frames_per_second']:>10.1f} "
+            f"{result['peak_rss_bytes'] / 1024 / 1024:>10.1f} {result['disk_write_bytes'] / 1024 / 1024:>11.1f}  {stages}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline de extração de frames")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="cenários (padrão: todos)")
+    parser.add_argument("--quick", action="store_true", help=f"apenas {', '.join(QUICK_SCENARIOS)}")
+    parser.add_argument("--mode", action="append", choices=MODES, help="gateway, worker ou ambos (padrão)")
+    parser.add_argument("--repeat", type=int, default=3, help="repetições por cenário (mediana)")
+    parser.add_argument("--work-dir", type=Path, default=DEFAULT_WORK_DIR)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="JSON para comparação")
+    parser.add_argument("--save-baseline", action="store_true", help="grava os resultados como nova baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="variação aceita antes de acusar regressão")
+    parser.add_argument("--output", type=Path, help="grava os resultados em JSON")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        result = _run_one(args.run_one, args.mode[0], args.work_dir)
+        print(json.dumps(result))
+        return 0
+
+    scenarios = args.scenario or (QUICK_SCENARIOS if args.quick else list(SCENARIOS))
+    modes = args.mode or MODES
+
+    results = {}
+    for scenario in scenarios:
+        config = SCENARIOS[scenario]
+        _generate_video(args.work_dir / "videos" / f"{scenario}.mp4", config["size"], config["duration"])
+        for mode in modes:
+            results[f"{scenario}/{mode}"] = _run_scenario(scenario, mode, args.work_dir, args.repeat)
+
+    _print_results(results)
+
+    if args.output:
+        args.output.write_text(json.dumps({"results": results}, indent=2) + "\n")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({"results": results}, indent=2) + "\n")
+        print(f"Baseline gravada em {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"Sem baseline em {args.baseline}; use --save-baseline para criar uma")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())["results"]
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressões em relação à baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    print(f"Sem regressões em relação à baseline (tolerância {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
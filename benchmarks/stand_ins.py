@@ -0,0 +1,88 @@
+from io import BytesIO
+from pathlib import Path
+import shutil
+
+
+class LocalS3Client:
+    # Implementa as chamadas usadas pelo S3Gateway sobre um diretório local
+    def __init__(self, bucket_dir: Path):
+        self.bucket_dir = bucket_dir
+        self._uploads = {}
+
+    def _path(self, key: str) -> Path:
+        path = self.bucket_dir / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def download_file(self, bucket, key, local_path, Config=None):
+        shutil.copyfile(self._path(key), local_path)
+
+    def upload_file(self, local_path, bucket, key, Config=None):
+        shutil.copyfile(local_path, self._path(key))
+
+    def head_object(self, Bucket, Key):
+        stat = self._path(Key).stat()
+        return {"ETag": f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"', "ContentLength": stat.st_size}
+
+    def get_object(self, Bucket, Key, Range=None):
+        path = self._path(Key)
+        if Range is None:
+            return {"Body": path.open("rb"), "ContentLength": path.stat().st_size}
+
+        start, end = (int(value) for value in Range.split("=", 1)[1].split("-"))
+        with path.open("rb") as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        return {"Body": BytesIO(data), "ContentLength": len(data)}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        # O FFprobe lê o caminho local como leria a URL
+        return str(self._path(Params["Key"]))
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self._uploads) + 1}"
+        self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._uploads[UploadId][PartNumber] = Body
+        return {"ETag": f"part-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self._uploads.pop(UploadId)
+        with self._path(Key).open("wb") as f:
+            for part in MultipartUpload["Parts"]:
+                f.write(parts[part["PartNumber"]])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._uploads.pop(UploadId, None)
+
+
+class LocalSQSClient:
+    def receive_message(self, **kwargs):
+        return {"Messages": []}
+
+    def delete_message(self, **kwargs):
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def change_message_visibility(self, **kwargs):
+        return {}
+
+
+class LocalSNSClient:
+    def publish(self, **kwargs):
+        return {"MessageId": "local"}
+
+
+def install_local_clients(bucket_dir: Path) -> None:
+    import boto3
+
+    clients = {
+        "s3": LocalS3Client(bucket_dir),
+        "sqs": LocalSQSClient(),
+        "sns": LocalSNSClient(),
+    }
+    boto3.client = lambda service_name, *args, **kwargs: clients[service_name]
@@ -0,0 +1,78 @@
+from app.entities.video import ExtractionOptions, VideoProbe
+from app.infrastructure.admission import AdmissionController, JobCost, estimate_job_cost
+
+
+def test_estimate_job_cost_scales_with_resolution_codec_and_mode():
+    hd = VideoProbe(duration_seconds=600, width=1920, height=1080, codec="h264", size_bytes=100)
+    uhd = VideoProbe(duration_seconds=600, width=3840, height=2160, codec="hevc", size_bytes=100)
+
+    base = estimate_job_cost(hd, ExtractionOptions())
+    heavy = estimate_job_cost(uhd, ExtractionOptions())
+    keyframes = estimate_job_cost(hd, ExtractionOptions(mode="keyframes"))
+
+    assert base.cpu == 1.0
+    assert heavy.cpu == 7.2
+    assert keyframes.cpu < base.cpu
+    # 600 frames PNG 1080p, gravados em temp/ e no ZIP, além do vídeo de origem
+    assert base.disk_bytes == 100 + int(2 * 600 * 1920 * 1080 * 1.5)
+
+
+def test_estimate_job_cost_cpu_does_not_depend_on_duration():
+    short = VideoProbe(duration_seconds=30, width=1280, height=720, codec="h264", size_bytes=100)
+    long = VideoProbe(duration_seconds=7200, width=1280, height=720, codec="h264", size_bytes=100)
+
+    assert estimate_job_cost(short, ExtractionOptions()).cpu == estimate_job_cost(long, ExtractionOptions()).cpu
+    assert estimate_job_cost(short, ExtractionOptions()).disk_bytes < estimate_job_cost(long, ExtractionOptions()).disk_bytes
+
+
+def test_admission_controller_admits_short_720p_job_while_long_4k_job_runs():
+    controller = AdmissionController(cpu_budget=8)
+    long_4k = VideoProbe(duration_seconds=7200, width=3840, height=2160, codec="hevc", size_bytes=100)
+    short_720p = VideoProbe(duration_seconds=30, width=1280, height=720, codec="h264", size_bytes=100)
+
+    assert controller.try_admit("4k", estimate_job_cost(long_4k, ExtractionOptions())) is True
+    assert controller.try_admit("720p", estimate_job_cost(short_720p, ExtractionOptions())) is True
+
+
+def test_estimate_job_cost_uses_output_size_and_frame_limit():
+    probe = VideoProbe(duration_seconds=3600, width=3840, height=2160, codec="h264")
+    thumbnails = ExtractionOptions(image_format="jpeg", quality=85, max_width=1280, max_height=720, max_frames=10)
+
+    assert estimate_job_cost(probe, thumbnails).disk_bytes == int(2 * 10 * 1280 * 720 * 0.12)
+
+
+def test_admission_controller_defers_jobs_over_budget():
+    controller = AdmissionController(cpu_budget=10, disk_budget_bytes=1000)
+
+    assert controller.try_admit("a", JobCost(cpu=6, disk_bytes=100)) is True
+    assert controller.try_admit("b", JobCost(cpu=6, disk_bytes=100)) is False
+    assert controller.try_admit("c", JobCost(cpu=1, disk_bytes=950)) is False
+    assert controller.try_admit("d", JobCost(cpu=4, disk_bytes=900)) is True
+    assert controller.usage() == JobCost(cpu=10, disk_bytes=1000)
+
+    controller.release("a")
+    assert controller.try_admit("b", JobCost(cpu=6, disk_bytes=100)) is True
+
+
+def test_admission_controller_always_admits_on_idle_node_or_when_forced():
+    controller = AdmissionController(cpu_budget=10)
+
+    assert controller.try_admit("huge", JobCost(cpu=50)) is True
+    assert controller.try_admit("other", JobCost(cpu=1)) is False
+    assert controller.try_admit("other", JobCost(cpu=1), force=True) is True
+
+    controller.release("huge")
+    controller.release("other")
+    controller.release("unknown")
+    assert controller.usage() == JobCost()
+
+
+def test_admission_controller_from_env(monkeypatch):
+    monkeypatch.delenv("ADMISSION_CPU_BUDGET", raising=False)
+    monkeypatch.delenv("ADMISSION_DISK_BUDGET_MB", raising=False)
+    assert AdmissionController.from_env().enabled is False
+
+    monkeypatch.setenv("ADMISSION_DISK_BUDGET_MB", "2")
+    controller = AdmissionController.from_env()
+    assert controller.enabled is True
+    assert controller.disk_budget_bytes == 2 * 1024 * 1024
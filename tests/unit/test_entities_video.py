@@ -1,4 +1,6 @@
-from app.entities.video import ProcessingMessage, Video
+import pytest
+
+from app.entities.video import ExtractionOptions, ProcessingMessage, Video
 
 
 def test_video_entity_defaults_and_fields():
@@ -23,3 +25,71 @@ def test_processing_message_entity_fields():
     assert message.video_path.endswith("v.mp4")
     assert message.timestamp == "20260220_220000"
     assert message.user_id == 99
+
+
+def test_processing_message_from_dict_parses_extraction_options():
+    message = ProcessingMessage.from_dict(
+        {
+            "video_id": 1,
+            "video_path": "s3://bucket/uploads/v.mp4",
+            "timestamp": "20260220_220000",
+            "extraction": {"fps": 0.5, "format": "jpg", "max_width": 1280, "max_height": 720},
+        }
+    )
+
+    assert message.user_id is None
+    assert message.options == ExtractionOptions(
+        fps=0.5, image_format="jpeg", quality=85, max_width=1280, max_height=720
+    )
+    assert message.options.extension == "jpg"
+    assert message.options.signature() == "fps=0.5/jpeg/q=85/max=1280x720"
+
+
+def test_extraction_options_default_to_full_resolution_png():
+    options = ExtractionOptions.from_dict(None)
+
+    assert options == ExtractionOptions()
+    assert options.signature() == "fps=1/png"
+    assert ExtractionOptions.from_dict({"format": "png", "quality": 50}).quality is None
+
+
+@pytest.mark.parametrize(
+    "extraction",
+    [
+        {"fps": 0},
+        {"fps": 120},
+        {"fps": "2"},
+        {"format": "gif"},
+        {"quality": 0},
+        {"quality": True},
+        {"max_width": 8},
+        {"max_height": 720.5},
+        {"width": 640},
+        "jpeg",
+    ],
+)
+def test_extraction_options_reject_invalid_values(extraction):
+    with pytest.raises(ValueError):
+        ExtractionOptions.from_dict(extraction)
+
+
+def test_processing_message_from_dict_requires_fields():
+    with pytest.raises(ValueError, match="video_path"):
+        ProcessingMessage.from_dict({"video_id": 1, "timestamp": "20260220_220000"})
+
+
+def test_extraction_options_scene_and_keyframe_modes():
+    scene = ExtractionOptions.from_dict({"mode": "scene", "max_frames": 50, "fps": 5})
+    keyframes = ExtractionOptions.from_dict({"mode": "keyframes", "scene_threshold": 0.5})
+
+    assert scene.scene_threshold == 0.3
+    assert scene.fps == 1
+    assert scene.signature() == "scene=0.3/png/frames=50"
+    assert keyframes.scene_threshold is None
+    assert keyframes.signature() == "keyframes/png"
+    assert scene.records_timestamps and keyframes.records_timestamps
+    assert not ExtractionOptions().records_timestamps
+
+    for invalid in ({"mode": "motion"}, {"mode": "scene", "scene_threshold": 1}, {"max_frames": 0}):
+        with pytest.raises(ValueError):
+            ExtractionOptions.from_dict(invalid)
@@ -0,0 +1,60 @@
+import tempfile
+import zipfile
+from pathlib import Path
+
+from app.gateways.frame_archive import ArchivePolicy, FrameArchiveWriter
+
+
+def test_archive_policy_from_env(monkeypatch):
+    monkeypatch.setenv("ARCHIVE_COMPRESSION", "deflate")
+    monkeypatch.setenv("ARCHIVE_COMPRESSION_LEVEL", "3")
+    monkeypatch.setenv("ARCHIVE_PARALLEL_WORKERS", "4")
+
+    policy = ArchivePolicy.from_env()
+
+    assert policy == ArchivePolicy(compression="deflate", level=3, parallel_workers=4)
+    assert policy.describe() == "deflate/nível 3/4 threads"
+
+
+def test_archive_policy_auto_stores_already_compressed_formats():
+    policy = ArchivePolicy()
+
+    assert policy.compress_type_for("frame_0001.png") == zipfile.ZIP_STORED
+    assert policy.compress_type_for("frame_0001.JPG") == zipfile.ZIP_STORED
+    assert policy.compress_type_for("timestamps.json") == zipfile.ZIP_DEFLATED
+    assert ArchivePolicy(compression="stored").compress_type_for("a.json") == zipfile.ZIP_STORED
+    assert ArchivePolicy(compression="deflate").compress_type_for("a.png") == zipfile.ZIP_DEFLATED
+
+
+def test_frame_archive_writer_reports_stats_for_stored_entries():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        zip_path = Path(tmpdir) / "frames.zip"
+
+        with FrameArchiveWriter(zip_path, ArchivePolicy()) as archive:
+            archive.add("frame_0001.png", b"a" * 100)
+            archive.add("frame_0002.png", b"b" * 50)
+
+        assert archive.stats.entries == 2
+        assert archive.stats.raw_bytes == 150
+        assert archive.stats.archived_bytes == 150
+        assert archive.stats.ratio == 1.0
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in zipf.infolist())
+
+
+def test_frame_archive_writer_parallel_deflate_keeps_order_and_content():
+    entries = [(f"frame_{i:04d}.bmp", bytes([i % 7]) * (1000 + i)) for i in range(1, 20)]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        zip_path = Path(tmpdir) / "frames.zip"
+        policy = ArchivePolicy(compression="deflate", level=6, parallel_workers=3)
+
+        with FrameArchiveWriter(zip_path, policy) as archive:
+            for name, data in entries:
+                archive.add(name, data)
+
+        assert archive.stats.archived_bytes < archive.stats.raw_bytes
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert zipf.testzip() is None
+            assert zipf.namelist() == [name for name, _ in entries]
+            assert all(zipf.read(name) == data for name, data in entries)
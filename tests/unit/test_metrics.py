@@ -0,0 +1,76 @@
+from urllib.request import urlopen
+
+import pytest
+
+from app.infrastructure import metrics
+from app.infrastructure.metrics import MetricsRegistry, track_stage
+
+
+def test_metrics_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Jobs", ["result"])
+    histogram = registry.histogram("stage_seconds", "Etapas", ["stage"], buckets=(1, 5))
+
+    counter.inc(result="success")
+    counter.inc(2, result="failure")
+    histogram.observe(0.5, stage="ffmpeg")
+    histogram.observe(3, stage="ffmpeg")
+
+    text = registry.render()
+
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{result="failure"} 2' in text
+    assert 'stage_seconds_bucket{stage="ffmpeg",le="1"} 1' in text
+    assert 'stage_seconds_bucket{stage="ffmpeg",le="5"} 2' in text
+    assert 'stage_seconds_bucket{stage="ffmpeg",le="+Inf"} 2' in text
+    assert 'stage_seconds_sum{stage="ffmpeg"} 3.5' in text
+    assert 'stage_seconds_count{stage="ffmpeg"} 2' in text
+
+
+def test_metrics_registry_drain_and_merge_aggregate_child_processes():
+    child = MetricsRegistry()
+    parent = MetricsRegistry()
+    for registry in (child, parent):
+        registry.counter("frames_total", "Frames")
+        registry.histogram("stage_seconds", "Etapas", ["stage"], buckets=(1,))
+
+    child._metrics["frames_total"].inc(10)
+    child._metrics["stage_seconds"].observe(0.2, stage="zip")
+    parent._metrics["frames_total"].inc(5)
+
+    parent.merge(child.drain())
+    parent.merge(child.drain())
+
+    assert parent._metrics["frames_total"].value() == 15
+    assert parent._metrics["stage_seconds"].count(stage="zip") == 1
+    assert child._metrics["frames_total"].value() == 0
+
+
+def test_track_stage_records_duration_and_errors():
+    before = metrics.STAGE_SECONDS.count(stage="test-stage")
+    errors_before = metrics.STAGE_ERRORS.value(stage="test-stage")
+
+    with track_stage("test-stage") as timer:
+        pass
+    with pytest.raises(RuntimeError):
+        with track_stage("test-stage"):
+            raise RuntimeError("falha")
+
+    assert timer.elapsed >= 0
+    assert metrics.STAGE_SECONDS.count(stage="test-stage") == before + 2
+    assert metrics.STAGE_ERRORS.value(stage="test-stage") == errors_before + 1
+
+
+def test_metrics_server_exposes_registry_over_http():
+    server = metrics.start_metrics_server(0, host="127.0.0.1")
+    try:
+        port = server.server_address[1]
+        with urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode("utf-8")
+            content_type = response.headers["Content-Type"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert content_type.startswith("text/plain")
+    assert "video_worker_stage_duration_seconds" in body
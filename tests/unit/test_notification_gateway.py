@@ -45,3 +45,60 @@ def test_notification_gateway_reuses_client(monkeypatch):
 
     boto3_factory.assert_called_once()
     assert mock_client.publish.call_count == 2
+
+
+def test_notification_gateway_rate_limit_turns_excess_into_digest(monkeypatch):
+    mock_client = Mock()
+    monkeypatch.setattr("app.gateways.notification_gateway.boto3.client", Mock(return_value=mock_client))
+
+    gateway = NotificationGateway(topic_arn="arn:aws:sns:us-east-1:123:topic", rate_per_minute=60, burst=2)
+    for video_id in range(1, 6):
+        assert gateway.notify_processing_error(video_id=video_id, error_message="codec error", user_id=7) is True
+
+    # Os dois primeiros saem na hora; o restante aguarda o digest
+    assert mock_client.publish.call_count == 2
+    gateway._bucket._tokens = 1
+    assert gateway.flush() == 1
+    gateway.close()
+
+    kwargs = mock_client.publish.call_args.kwargs
+    assert kwargs["Subject"] == "Falhas no processamento de vídeos"
+    assert kwargs["Message"].startswith("3 falhas no processamento de vídeos\nUsuário: 7")
+    assert "Video ID: 5 - Erro: codec error" in kwargs["Message"]
+
+
+def test_notification_gateway_sends_one_digest_per_user(monkeypatch):
+    mock_client = Mock()
+    monkeypatch.setattr("app.gateways.notification_gateway.boto3.client", Mock(return_value=mock_client))
+
+    gateway = NotificationGateway(topic_arn="arn:aws:sns:us-east-1:123:topic", digest_interval=60)
+    gateway.notify_processing_error(video_id=1, error_message="e1", user_id=1)
+    gateway.notify_processing_error(video_id=2, error_message="e2", user_id=1)
+    gateway.notify_processing_error(video_id=3, error_message="e3", user_id=2)
+
+    mock_client.publish.assert_not_called()
+    assert gateway.flush() == 2
+    gateway.close()
+
+    messages = sorted(c.kwargs["Message"] for c in mock_client.publish.call_args_list)
+    assert messages[0].startswith("2 falhas no processamento de vídeos\nUsuário: 1")
+    assert "Video ID: 3" in messages[1] and "Usuário: 2" in messages[1]
+
+
+def test_notification_gateway_global_digest_caps_listed_failures(monkeypatch):
+    mock_client = Mock()
+    monkeypatch.setattr("app.gateways.notification_gateway.boto3.client", Mock(return_value=mock_client))
+
+    gateway = NotificationGateway(
+        topic_arn="arn:aws:sns:us-east-1:123:topic", digest_interval=60, digest_group="global"
+    )
+    for video_id in range(60):
+        gateway.notify_processing_error(video_id=video_id, error_message="x" * 500, user_id=video_id % 3)
+
+    assert gateway.flush() == 1
+    gateway.close()
+
+    message = mock_client.publish.call_args.kwargs["Message"]
+    assert message.startswith("60 falhas no processamento de vídeos\n\n")
+    assert "Video ID: 4 (usuário 1) - Erro: " + "x" * 197 + "...\n" in message
+    assert message.endswith("... e mais 10 falhas")
@@ -0,0 +1,25 @@
+from benchmarks.pipeline_benchmark import compare_with_baseline
+
+
+def test_compare_with_baseline_flags_regressions_beyond_tolerance():
+    baseline = {
+        "360p-10s/worker": {"wall_seconds": 1.0, "frames_per_second": 100, "peak_rss_bytes": 1000},
+    }
+    results = {
+        "360p-10s/worker": {"wall_seconds": 1.3, "frames_per_second": 95, "peak_rss_bytes": 1100},
+        "720p-30s/worker": {"wall_seconds": 9.0, "frames_per_second": 10, "peak_rss_bytes": 1},
+    }
+
+    regressions = compare_with_baseline(results, baseline, tolerance=0.15)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("360p-10s/worker: wall_seconds 1.0 -> 1.3")
+
+
+def test_compare_with_baseline_flags_lower_throughput():
+    baseline = {"360p-10s/gateway": {"frames_per_second": 100}}
+    results = {"360p-10s/gateway": {"frames_per_second": 80}}
+
+    assert compare_with_baseline(results, baseline, tolerance=0.15) == [
+        "360p-10s/gateway: frames_per_second 100 -> 80 (-20.0%)"
+    ]
@@ -1,5 +1,9 @@
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
+import asyncio
 
+import pytest
+
+from app.gateways.video_processing_gateway import SourceStreamError
 from app.use_cases.process_video_use_case import ProcessVideoUseCase
 
 
@@ -18,7 +22,9 @@ def test_process_video_use_case_success_updates_status_processed():
 
     use_case.execute(video_id=1, video_path="uploads/video.mp4", timestamp="20260218_101010")
 
-    processing_gateway.process_video.assert_called_once_with("uploads/video.mp4", "20260218_101010")
+    processing_gateway.process_video.assert_called_once_with(
+        "uploads/video.mp4", "20260218_101010", options=None, input_stream=None, on_progress=None
+    )
     video_dao.update_video_status.assert_called_once_with(
         video_id=1,
         status=1,
@@ -42,6 +48,25 @@ def test_process_video_use_case_error_updates_status_error():
     video_dao.update_video_status.assert_called_once_with(video_id=1, status=2)
 
 
+def test_process_video_use_case_propagates_source_stream_error_for_retry():
+    processing_gateway = Mock()
+    video_dao = Mock()
+    notification_gateway = Mock()
+    processing_gateway.process_video.side_effect = SourceStreamError("connection reset")
+
+    use_case = ProcessVideoUseCase(
+        processing_gateway=processing_gateway,
+        video_dao=video_dao,
+        notification_gateway=notification_gateway,
+    )
+
+    with pytest.raises(SourceStreamError):
+        use_case.execute(video_id=1, video_path="s3://bucket/video.mkv", timestamp="20260218_101010")
+
+    video_dao.update_video_status.assert_not_called()
+    notification_gateway.notify_processing_error.assert_not_called()
+
+
 def test_process_video_use_case_error_sends_notification_when_gateway_provided():
     processing_gateway = Mock()
     video_dao = Mock()
@@ -63,3 +88,168 @@ def test_process_video_use_case_error_sends_notification_when_gateway_provided()
         error_message="ffmpeg error",
         user_id=99,
     )
+
+
+def test_process_video_use_case_execute_async_marks_processed():
+    processing_gateway = Mock()
+    processing_gateway.process_video_async = AsyncMock(
+        return_value=("outputs/frames_20260218.zip", 3, ["frame_0001.png"])
+    )
+    video_dao = Mock()
+
+    use_case = ProcessVideoUseCase(processing_gateway=processing_gateway, video_dao=video_dao)
+
+    asyncio.run(use_case.execute_async(video_id=1, video_path="uploads/video.mp4", timestamp="20260218_101010"))
+
+    processing_gateway.process_video_async.assert_awaited_once_with(
+        "uploads/video.mp4", "20260218_101010", options=None, on_progress=None
+    )
+    video_dao.update_video_status.assert_called_once_with(
+        video_id=1,
+        status=1,
+        file_path="outputs/frames_20260218.zip",
+    )
+
+
+def test_process_video_use_case_execute_async_error_updates_status_and_notifies():
+    processing_gateway = Mock()
+    processing_gateway.process_video_async = AsyncMock(side_effect=Exception("ffmpeg error"))
+    video_dao = Mock()
+    video_dao.get_video_by_id.return_value = Mock(user_id=9)
+    notification_gateway = Mock()
+
+    use_case = ProcessVideoUseCase(
+        processing_gateway=processing_gateway,
+        video_dao=video_dao,
+        notification_gateway=notification_gateway,
+    )
+
+    asyncio.run(use_case.execute_async(video_id=1, video_path="uploads/video.mp4", timestamp="20260218_101010"))
+
+    video_dao.update_video_status.assert_called_once_with(video_id=1, status=2)
+    notification_gateway.notify_processing_error.assert_called_once_with(
+        video_id=1, error_message="ffmpeg error", user_id=9
+    )
+
+
+def test_process_video_use_case_reuses_cached_zip_and_skips_processing(tmp_path):
+    processing_gateway = Mock()
+    processing_gateway.extraction_signature.return_value = "fps=1/png"
+    video_dao = Mock()
+    cached_zip = tmp_path / "frames_old.zip"
+    cached_zip.write_bytes(b"zip")
+    result_cache = Mock()
+    result_cache.get_entry.return_value = Mock(file_path=str(cached_zip))
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video")
+
+    use_case = ProcessVideoUseCase(
+        processing_gateway=processing_gateway,
+        video_dao=video_dao,
+        result_cache=result_cache,
+    )
+
+    use_case.execute(video_id=1, video_path=str(video), timestamp="20260218_101010")
+
+    processing_gateway.process_video.assert_not_called()
+    video_dao.update_video_status.assert_called_once_with(video_id=1, status=1, file_path=str(cached_zip))
+    content_key = result_cache.get_entry.call_args.args[0]
+    result_cache.record_hit.assert_called_once_with(content_key)
+    assert content_key == use_case.resolve_content_key(str(video))
+
+
+def test_process_video_use_case_records_result_on_cache_miss(tmp_path):
+    processing_gateway = Mock()
+    processing_gateway.extraction_signature.return_value = "fps=1/png"
+    processing_gateway.process_video.return_value = ("outputs/frames_new.zip", 4, [])
+    result_cache = Mock()
+    result_cache.get_entry.return_value = None
+
+    use_case = ProcessVideoUseCase(
+        processing_gateway=processing_gateway,
+        video_dao=Mock(),
+        result_cache=result_cache,
+    )
+
+    use_case.execute(
+        video_id=1, video_path="uploads/video.mp4", timestamp="20260218_101010", content_key="abc"
+    )
+
+    processing_gateway.process_video.assert_called_once()
+    # A chave recebida já foi consultada pelo worker: o índice não é lido de novo
+    result_cache.get_entry.assert_not_called()
+    result_cache.save_entry.assert_called_once_with("abc", "outputs/frames_new.zip", 4)
+
+
+def test_process_video_use_case_drops_cache_entry_when_zip_is_gone():
+    s3_gateway = Mock()
+    s3_gateway.object_exists.return_value = False
+    result_cache = Mock()
+    result_cache.get_entry.return_value = Mock(file_path="s3://bucket/outputs/frames_old.zip")
+
+    use_case = ProcessVideoUseCase(
+        processing_gateway=Mock(),
+        video_dao=Mock(),
+        s3_gateway=s3_gateway,
+        result_cache=result_cache,
+    )
+
+    assert use_case.reuse_cached_result(1, "abc") is False
+    s3_gateway.object_exists.assert_called_once_with("outputs/frames_old.zip")
+    result_cache.remove_entry.assert_called_once_with("abc")
+
+
+def test_process_video_use_case_content_key_uses_s3_etag_and_extraction_params():
+    processing_gateway = Mock()
+    s3_gateway = Mock()
+    s3_gateway.get_object_fingerprint.return_value = "etag-1:2048"
+
+    use_case = ProcessVideoUseCase(processing_gateway=processing_gateway, video_dao=Mock(), s3_gateway=s3_gateway)
+
+    processing_gateway.extraction_signature.return_value = "fps=1/png"
+    key_fps_1 = use_case.resolve_content_key("s3://bucket/uploads/video.mp4", "uploads/video.mp4")
+    processing_gateway.extraction_signature.return_value = "fps=2/png"
+    key_fps_2 = use_case.resolve_content_key("s3://bucket/uploads/video.mp4", "uploads/video.mp4")
+
+    assert key_fps_1 and key_fps_2 and key_fps_1 != key_fps_2
+    s3_gateway.get_object_fingerprint.assert_called_with("uploads/video.mp4")
+
+
+def test_process_video_use_case_error_uses_user_id_from_message():
+    processing_gateway = Mock()
+    processing_gateway.process_video.side_effect = Exception("ffmpeg error")
+    video_dao = Mock()
+    notification_gateway = Mock()
+
+    use_case = ProcessVideoUseCase(
+        processing_gateway=processing_gateway,
+        video_dao=video_dao,
+        notification_gateway=notification_gateway,
+    )
+
+    use_case.execute(video_id=10, video_path="uploads/video.mp4", timestamp="20260218_101010", user_id=42)
+
+    video_dao.get_video_by_id.assert_not_called()
+    notification_gateway.notify_processing_error.assert_called_once_with(
+        video_id=10, error_message="ffmpeg error", user_id=42
+    )
+
+
+def test_process_video_use_case_reports_progress_with_video_id():
+    processing_gateway = Mock()
+    reports = []
+
+    def _process_video(video_path, timestamp, options=None, input_stream=None, on_progress=None):
+        on_progress("50%")
+        return "outputs/frames_20260218.zip", 2, ["frame_0001.png", "frame_0002.png"]
+
+    processing_gateway.process_video.side_effect = _process_video
+    use_case = ProcessVideoUseCase(
+        processing_gateway=processing_gateway,
+        video_dao=Mock(),
+        on_progress=lambda video_id, progress: reports.append((video_id, progress)),
+    )
+
+    use_case.execute(video_id=7, video_path="uploads/video.mp4", timestamp="20260218_101010")
+
+    assert reports == [(7, "50%")]
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.dao import worker_tables
+from app.dao.result_cache_dao import ResultCacheDAO
+from app.models.result_cache import ResultCacheEntry
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    worker_tables._ready_tables.clear()
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_result_cache_dao_creates_table_and_saves_entry(db_session):
+    dao = ResultCacheDAO(db_session, ttl_seconds=3600, max_entries=10)
+
+    dao.save_entry("key-1", "s3://bucket/outputs/frames_1.zip", 12)
+    entry = dao.get_entry("key-1")
+
+    assert entry.file_path == "s3://bucket/outputs/frames_1.zip"
+    assert entry.frame_count == 12
+    assert dao.get_entry("missing") is None
+
+
+def test_result_cache_dao_record_hit_increments_counter(db_session):
+    dao = ResultCacheDAO(db_session, ttl_seconds=3600, max_entries=10)
+    dao.save_entry("key-1", "outputs/frames_1.zip", 3)
+
+    dao.record_hit("key-1")
+    dao.record_hit("key-1")
+
+    db_session.expire_all()
+    assert dao.get_entry("key-1").hits == 2
+
+
+def test_result_cache_dao_expires_entries_after_ttl(db_session):
+    dao = ResultCacheDAO(db_session, ttl_seconds=60, max_entries=10)
+    dao.save_entry("key-1", "outputs/frames_1.zip", 3)
+
+    entry = db_session.get(ResultCacheEntry, "key-1")
+    entry.created_at -= timedelta(seconds=120)
+    db_session.commit()
+
+    assert dao.get_entry("key-1") is None
+    assert db_session.get(ResultCacheEntry, "key-1") is None
+
+
+def test_result_cache_dao_evicts_least_recently_used_over_limit(db_session):
+    dao = ResultCacheDAO(db_session, ttl_seconds=3600, max_entries=2)
+    dao.save_entry("key-1", "outputs/frames_1.zip", 1)
+    dao.save_entry("key-2", "outputs/frames_2.zip", 1)
+
+    oldest = db_session.get(ResultCacheEntry, "key-2")
+    oldest.last_hit_at -= timedelta(seconds=30)
+    db_session.commit()
+
+    dao.save_entry("key-3", "outputs/frames_3.zip", 1)
+
+    assert dao.get_entry("key-2") is None
+    assert dao.get_entry("key-1") is not None
+    assert dao.get_entry("key-3") is not None
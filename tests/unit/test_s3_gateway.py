@@ -1,7 +1,11 @@
+from io import BytesIO
 from pathlib import Path
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
+import struct
 import tempfile
 
+import pytest
+
 from app.gateways.s3_gateway import S3Gateway
 
 
@@ -45,9 +49,259 @@ def test_s3_gateway_upload_video_in_production(monkeypatch):
         monkeypatch.setenv("AWS_REGION", "us-east-1")
 
         mock_client = Mock()
-        with patch("app.gateways.s3_gateway.boto3.client", return_value=mock_client):
-            gateway = S3Gateway(base_dir=Path(tmpdir))
-            result = gateway.upload_video("/tmp/video.zip", "outputs/video.zip")
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=mock_client))
+        gateway = S3Gateway(base_dir=Path(tmpdir))
+        result = gateway.upload_video("/tmp/video.zip", "outputs/video.zip")
+
+        assert result is True
+        mock_client.upload_file.assert_called_once_with(
+            "/tmp/video.zip", gateway.bucket_name, "outputs/video.zip", Config=gateway.transfer_config
+        )
+
+
+def test_s3_gateway_transfer_config_from_env(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "production")
+        monkeypatch.setenv("S3_MULTIPART_THRESHOLD_MB", "32")
+        monkeypatch.setenv("S3_MULTIPART_CHUNKSIZE_MB", "8")
+        monkeypatch.setenv("S3_MAX_CONCURRENCY", "20")
+
+        client_factory = Mock()
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", client_factory)
+        gateway = S3Gateway(base_dir=Path(tmpdir))
+
+        client_factory.assert_not_called()
+        assert gateway.s3_client is client_factory.return_value
+        assert gateway.transfer_config.multipart_threshold == 32 * 1024 * 1024
+        assert gateway.transfer_config.multipart_chunksize == 8 * 1024 * 1024
+        assert gateway.transfer_config.max_concurrency == 20
+        assert client_factory.call_args.kwargs["config"].max_pool_connections == 40
+
+
+def test_s3_gateway_download_video_in_production_uses_transfer_config(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "production")
+        local_file = Path(tmpdir) / "video.mp4"
+
+        mock_client = Mock()
+        mock_client.download_file.side_effect = lambda *args, **kwargs: local_file.write_bytes(b"video")
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=mock_client))
+        gateway = S3Gateway(base_dir=Path(tmpdir))
+        result = gateway.download_video("uploads/video.mp4", str(local_file))
 
         assert result is True
-        mock_client.upload_file.assert_called_once_with("/tmp/video.zip", gateway.bucket_name, "outputs/video.zip")
+        mock_client.download_file.assert_called_once_with(
+            gateway.bucket_name, "uploads/video.mp4", str(local_file), Config=gateway.transfer_config
+        )
+
+
+class _LocalS3StandIn:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[Key]
+        if Range:
+            start, end = (int(value) for value in Range.split("=")[1].split("-"))
+            data = data[start:end + 1]
+        return {"Body": BytesIO(data), "ContentLength": len(data)}
+
+
+def _atom(atom_type: bytes, payload_size: int) -> bytes:
+    return struct.pack(">I", payload_size + 8) + atom_type + b"\0" * payload_size
+
+
+def _gateway_with_objects(monkeypatch, tmpdir, objects):
+    monkeypatch.setenv("APP_ENV", "production")
+    monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=_LocalS3StandIn(objects)))
+    return S3Gateway(base_dir=Path(tmpdir))
+
+
+def test_s3_gateway_is_streamable_detects_container_layout(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = _gateway_with_objects(
+            monkeypatch,
+            tmpdir,
+            {
+                "faststart.mp4": _atom(b"ftyp", 16) + _atom(b"moov", 64) + _atom(b"mdat", 128),
+                "trailing-moov.mp4": _atom(b"ftyp", 16) + _atom(b"mdat", 128) + _atom(b"moov", 64),
+                "large-free-atom.mp4": _atom(b"ftyp", 16) + _atom(b"free", 70000) + _atom(b"moov", 8),
+                "video.mkv": b"\x1a\x45\xdf\xa3" + b"\0" * 64,
+                "unknown.avi": b"RIFF" + b"\0" * 64,
+            },
+        )
+
+        assert gateway.is_streamable("faststart.mp4") is True
+        assert gateway.is_streamable("trailing-moov.mp4") is False
+        assert gateway.is_streamable("large-free-atom.mp4") is True
+        assert gateway.is_streamable("video.mkv") is True
+        assert gateway.is_streamable("unknown.avi") is False
+        assert gateway.is_streamable("missing.mp4") is False
+
+
+def test_s3_gateway_open_video_stream_returns_object_body(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = _gateway_with_objects(monkeypatch, tmpdir, {"uploads/video.mkv": b"video-bytes"})
+
+        assert gateway.open_video_stream("uploads/video.mkv").read() == b"video-bytes"
+
+
+class _FlakyBody:
+    def __init__(self, data: bytes, fail_after: int):
+        self._data = BytesIO(data)
+        self._fail_after = fail_after
+
+    def read(self, size=None):
+        if self._data.tell() >= self._fail_after:
+            raise ConnectionError("connection reset")
+        return self._data.read(min(size or self._fail_after, self._fail_after - self._data.tell()))
+
+    def close(self):
+        pass
+
+
+def test_s3_gateway_open_video_stream_resumes_from_last_offset(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "production")
+        data = bytes(range(256)) * 4
+        client = Mock()
+        client.get_object.side_effect = [
+            {"Body": _FlakyBody(data, 300), "ETag": '"etag-1"', "ContentLength": len(data)},
+            {"Body": BytesIO(data[300:]), "ETag": '"etag-1"'},
+        ]
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=client))
+        stream = S3Gateway(base_dir=Path(tmpdir)).open_video_stream("uploads/video.mkv")
+
+        received = b"".join(iter(lambda: stream.read(128), b""))
+
+        assert received == data
+        assert client.get_object.call_args.kwargs == {
+            "Bucket": "video-processor-bucket",
+            "Key": "uploads/video.mkv",
+            "Range": "bytes=300-",
+            "IfMatch": '"etag-1"',
+        }
+
+
+def test_s3_gateway_open_video_stream_gives_up_after_max_retries(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "production")
+        monkeypatch.setenv("S3_STREAMING_MAX_RETRIES", "1")
+        client = Mock()
+        client.get_object.side_effect = lambda **kwargs: {"Body": _FlakyBody(b"abc", 0), "ETag": '"e"'}
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=client))
+        stream = S3Gateway(base_dir=Path(tmpdir)).open_video_stream("uploads/video.mkv")
+
+        with pytest.raises(ConnectionError):
+            stream.read(16)
+        assert client.get_object.call_count == 2
+
+
+def test_s3_gateway_is_not_streamable_in_development(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "development")
+
+        assert S3Gateway(base_dir=Path(tmpdir)).is_streamable("uploads/video.mkv") is False
+
+
+class _MultipartClientStandIn:
+    def __init__(self, fail_on_part=None):
+        self.parts = {}
+        self.completed = None
+        self.aborted = False
+        self.fail_on_part = fail_on_part
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_on_part:
+            raise RuntimeError("parte recusada")
+        self.parts[PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+
+def test_s3_multipart_writer_uploads_parts_in_order(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "production")
+        monkeypatch.setenv("S3_MULTIPART_CHUNKSIZE_MB", "5")
+        client = _MultipartClientStandIn()
+
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=client))
+        gateway = S3Gateway(base_dir=Path(tmpdir))
+
+        payload = bytes(range(256)) * (12 * 1024 * 4)
+        with gateway.open_multipart_writer("outputs/frames.zip") as writer:
+            writer.write(payload[:7 * 1024 * 1024])
+            writer.write(payload[7 * 1024 * 1024:])
+            assert writer.tell() == len(payload)
+            assert writer.seekable() is False
+
+        assert [part["PartNumber"] for part in client.completed] == [1, 2, 3]
+        assert client.completed[0]["ETag"] == "etag-1"
+        assert b"".join(client.parts[n] for n in sorted(client.parts)) == payload
+        assert client.aborted is False
+
+
+def test_s3_multipart_writer_aborts_when_part_upload_fails(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "production")
+        client = _MultipartClientStandIn(fail_on_part=1)
+
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=client))
+        gateway = S3Gateway(base_dir=Path(tmpdir))
+
+        writer = gateway.open_multipart_writer("outputs/frames.zip")
+        writer.write(b"zip")
+        try:
+            writer.close()
+            assert False, "close deveria falhar"
+        except RuntimeError:
+            pass
+
+        assert client.completed is None
+        assert client.aborted is True
+        assert writer.closed
+
+
+def test_s3_gateway_abort_uploads_aborts_only_open_writers(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "production")
+        client = _MultipartClientStandIn()
+
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=client))
+        gateway = S3Gateway(base_dir=Path(tmpdir))
+
+        finished = gateway.open_multipart_writer("outputs/done.zip")
+        finished.write(b"zip")
+        finished.close()
+        running = gateway.open_multipart_writer("outputs/frames.zip")
+        running.write(b"zip")
+
+        assert gateway.abort_uploads() == 1
+        assert running.closed
+        assert client.aborted is True
+        assert gateway.abort_uploads() == 0
+
+
+def test_s3_gateway_object_fingerprint_uses_etag_and_size(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("APP_ENV", "production")
+
+        mock_client = Mock()
+        mock_client.head_object.return_value = {"ETag": '"abc-3"', "ContentLength": 4096}
+        monkeypatch.setattr("app.gateways.s3_gateway.boto3.client", Mock(return_value=mock_client))
+        gateway = S3Gateway(base_dir=Path(tmpdir))
+
+        assert gateway.get_object_fingerprint("uploads/video.mp4") == "abc-3:4096"
+        assert gateway.object_exists("outputs/frames.zip") is True
+
+        mock_client.head_object.side_effect = RuntimeError("404")
+        assert gateway.get_object_fingerprint("uploads/missing.mp4") is None
+        assert gateway.object_exists("outputs/missing.zip") is False
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.infrastructure.cache.source_video_cache import SourceVideoCache
+
+
+def _downloader(payload: bytes, calls: list):
+    def _download(local_path: str) -> bool:
+        calls.append(local_path)
+        Path(local_path).write_bytes(payload)
+        return True
+
+    return _download
+
+
+def test_source_video_cache_hits_after_first_download(tmp_path):
+    cache = SourceVideoCache(tmp_path / "cache", max_bytes=1024)
+    calls = []
+
+    first = cache.acquire("uploads/video.mp4", "etag-1:10", _downloader(b"0123456789", calls))
+    first.release()
+    second = cache.acquire("uploads/video.mp4", "etag-1:10", _downloader(b"0123456789", calls))
+    second.release()
+
+    assert len(calls) == 1
+    assert first.path == second.path
+    assert second.path.read_bytes() == b"0123456789"
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.bytes_saved == 10
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_source_video_cache_new_etag_is_a_different_entry(tmp_path):
+    cache = SourceVideoCache(tmp_path / "cache", max_bytes=1024)
+    calls = []
+
+    cache.acquire("uploads/video.mp4", "etag-1:3", _downloader(b"old", calls)).release()
+    lease = cache.acquire("uploads/video.mp4", "etag-2:3", _downloader(b"new", calls))
+
+    assert len(calls) == 2
+    assert lease.path.read_bytes() == b"new"
+    lease.release()
+
+
+def test_source_video_cache_evicts_least_recently_used_within_budget(tmp_path):
+    cache = SourceVideoCache(tmp_path / "cache", max_bytes=20)
+    calls = []
+
+    oldest = cache.acquire("uploads/a.mp4", "a", _downloader(b"a" * 10, calls))
+    oldest.release()
+    os.utime(oldest.path, (time.time() - 60, time.time() - 60))
+    cache.acquire("uploads/b.mp4", "b", _downloader(b"b" * 10, calls)).release()
+    newest = cache.acquire("uploads/c.mp4", "c", _downloader(b"c" * 10, calls))
+    newest.release()
+
+    assert not oldest.path.exists()
+    assert newest.path.exists()
+    assert sum(p.stat().st_size for p in cache._entries()) <= 20
+
+
+def test_source_video_cache_keeps_entries_in_use(tmp_path):
+    cache = SourceVideoCache(tmp_path / "cache", max_bytes=5)
+    calls = []
+
+    in_use = cache.acquire("uploads/a.mp4", "a", _downloader(b"a" * 10, calls))
+    cache.acquire("uploads/b.mp4", "b", _downloader(b"b" * 10, calls)).release()
+
+    assert in_use.path.exists()
+    in_use.release()
+    assert not in_use.path.exists()
+
+
+def test_source_video_cache_downloads_once_for_concurrent_slots(tmp_path):
+    cache = SourceVideoCache(tmp_path / "cache", max_bytes=1024)
+    calls = []
+
+    def _slow_download(local_path: str) -> bool:
+        calls.append(local_path)
+        time.sleep(0.1)
+        Path(local_path).write_bytes(b"video")
+        return True
+
+    leases = []
+    threads = [
+        threading.Thread(target=lambda: leases.append(cache.acquire("uploads/v.mp4", "e", _slow_download)))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert cache.stats.hits == 2
+    for lease in leases:
+        lease.release()
+
+
+def test_source_video_cache_failed_download_leaves_no_entry(tmp_path):
+    cache = SourceVideoCache(tmp_path / "cache", max_bytes=1024)
+
+    with pytest.raises(RuntimeError):
+        cache.acquire("uploads/v.mp4", "e", lambda local_path: False)
+
+    assert cache._entries() == []
+    assert cache.stats.misses == 0
@@ -1,7 +1,16 @@
 import pytest
 import json
+import threading
+import time
+from concurrent.futures import wait
 from unittest.mock import Mock, patch, MagicMock
-from app.infrastructure.queue.sqs_consumer import SQSConsumer
+from app.infrastructure.queue.sqs_consumer import SQSConsumer, parse_queues
+
+
+def _wait_for_all_polls(consumer, max_messages):
+    # Garante que todas as filas já responderam antes da seleção ponderada
+    consumer._start_polls(0, max_messages)
+    wait(list(consumer._polls.values()))
 
 
 class TestSQSConsumer:
@@ -43,6 +52,70 @@ class TestSQSConsumer:
         
         assert message is None
     
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_receive_messages_returns_whole_batch(self, mock_boto3):
+        """Test batch receive returns every message and caps the batch size"""
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        mock_client.receive_message.return_value = {
+            'Messages': [{'MessageId': str(i), 'ReceiptHandle': f'rh-{i}'} for i in range(3)]
+        }
+
+        consumer = SQSConsumer()
+        messages = consumer.receive_messages(max_messages=25)
+
+        assert [m['MessageId'] for m in messages] == ['0', '1', '2']
+        assert mock_client.receive_message.call_args.kwargs['MaxNumberOfMessages'] == 10
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_buffer_delete_flushes_batch_when_full(self, mock_boto3, monkeypatch):
+        """Test buffered deletes are sent through delete_message_batch"""
+        monkeypatch.setenv('SQS_DELETE_BATCH_SIZE', '2')
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        mock_client.delete_message_batch.return_value = {'Successful': [{'Id': '0'}, {'Id': '1'}]}
+
+        consumer = SQSConsumer()
+        assert consumer.buffer_delete('rh-1') == []
+        mock_client.delete_message_batch.assert_not_called()
+
+        assert consumer.buffer_delete('rh-2') == []
+
+        entries = mock_client.delete_message_batch.call_args.kwargs['Entries']
+        assert [e['ReceiptHandle'] for e in entries] == ['rh-1', 'rh-2']
+        mock_client.delete_message.assert_not_called()
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_buffer_delete_flushes_after_interval(self, mock_boto3, monkeypatch):
+        """Test buffered deletes are flushed by the time threshold"""
+        monkeypatch.setenv('SQS_DELETE_FLUSH_INTERVAL', '0.01')
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        mock_client.delete_message_batch.return_value = {}
+
+        consumer = SQSConsumer()
+        consumer.buffer_delete('rh-1')
+        time.sleep(0.1)
+
+        mock_client.delete_message_batch.assert_called_once()
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_flush_deletes_reports_failed_entries(self, mock_boto3):
+        """Test per-entry failures from delete_message_batch are reported"""
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        mock_client.delete_message_batch.return_value = {
+            'Successful': [{'Id': '0'}],
+            'Failed': [{'Id': '1', 'Code': 'ReceiptHandleIsInvalid', 'Message': 'invalid', 'SenderFault': True}],
+        }
+
+        consumer = SQSConsumer()
+        consumer.buffer_delete('rh-ok')
+        consumer.buffer_delete('rh-bad')
+        failures = consumer.flush_deletes()
+
+        assert failures == [{'ReceiptHandle': 'rh-bad', 'Code': 'ReceiptHandleIsInvalid', 'Message': 'invalid'}]
+
     @patch('app.infrastructure.queue.sqs_consumer.boto3')
     def test_delete_message_success(self, mock_boto3):
         """Test successful message deletion"""
@@ -86,3 +159,229 @@ class TestSQSConsumer:
         parsed = consumer.parse_message(message)
         
         assert parsed is None
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_release_message_sets_visibility_to_zero(self, mock_boto3):
+        """Test releasing a message for immediate retry"""
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+
+        consumer = SQSConsumer()
+        result = consumer.release_message('receipt-handle')
+
+        assert result is True
+        kwargs = mock_client.change_message_visibility.call_args.kwargs
+        assert kwargs['ReceiptHandle'] == 'receipt-handle'
+        assert kwargs['VisibilityTimeout'] == 0
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_heartbeat_extends_visibility_while_job_runs(self, mock_boto3, monkeypatch):
+        """Test heartbeat extends in-flight messages and stops when the job ends"""
+        monkeypatch.setenv('SQS_VISIBILITY_TIMEOUT', '120')
+        monkeypatch.setenv('SQS_HEARTBEAT_INTERVAL', '0.01')
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+
+        consumer = SQSConsumer()
+        with consumer.heartbeat('receipt-handle'):
+            time.sleep(0.1)
+
+        calls_after_job = mock_client.change_message_visibility.call_count
+        time.sleep(0.05)
+        consumer.stop_heartbeat()
+
+        assert calls_after_job >= 1
+        assert mock_client.change_message_visibility.call_count == calls_after_job
+        kwargs = mock_client.change_message_visibility.call_args.kwargs
+        assert kwargs['ReceiptHandle'] == 'receipt-handle'
+        assert kwargs['VisibilityTimeout'] == 120
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_client_is_created_on_first_use(self, mock_boto3):
+        """Test the SQS client is only built when the queue is first accessed"""
+        consumer = SQSConsumer()
+
+        mock_boto3.client.assert_not_called()
+
+        assert consumer.client is mock_boto3.client.return_value
+        assert consumer.client is mock_boto3.client.return_value
+        mock_boto3.client.assert_called_once()
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_defer_message_sets_visibility_to_delay(self, mock_boto3):
+        """Test deferring a message only makes it visible again after the delay"""
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+
+        consumer = SQSConsumer()
+
+        assert consumer.defer_message('receipt-handle', 45) is True
+        kwargs = mock_client.change_message_visibility.call_args.kwargs
+        assert kwargs['ReceiptHandle'] == 'receipt-handle'
+        assert kwargs['VisibilityTimeout'] == 45
+
+    def test_parse_queues_reads_names_urls_and_weights(self):
+        """Test SQS_QUEUES parsing keeps the URL port and defaults the weight to 1"""
+        queues = parse_queues("premium=http://localhost:4566/000/premium:3, bulk=http://localhost:4566/000/bulk")
+
+        assert [(q.name, q.url, q.weight) for q in queues] == [
+            ('premium', 'http://localhost:4566/000/premium', 3),
+            ('bulk', 'http://localhost:4566/000/bulk', 1),
+        ]
+        assert parse_queues(None, 'https://sqs/default')[0].url == 'https://sqs/default'
+        with pytest.raises(ValueError):
+            parse_queues("premium")
+
+    @pytest.mark.parametrize('free_slots', [1, 4])
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_weighted_receive_splits_saturated_queues_by_weight(self, mock_boto3, monkeypatch, free_slots):
+        """Test two always-full queues are served 3:1 without receiving a message twice"""
+        monkeypatch.setenv('SQS_QUEUES', 'premium=https://sqs/premium:3,bulk=https://sqs/bulk:1')
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        received = []
+        counters = {'premium': 0, 'bulk': 0}
+        lock = threading.Lock()
+
+        def _receive(QueueUrl, MaxNumberOfMessages, **kwargs):
+            name = QueueUrl.rsplit('/', 1)[1]
+            with lock:
+                messages = []
+                for _ in range(MaxNumberOfMessages):
+                    message_id = f'{name}-{counters[name]}'
+                    counters[name] += 1
+                    messages.append({'MessageId': message_id, 'ReceiptHandle': f'{message_id}#rh'})
+                received.extend(m['MessageId'] for m in messages)
+            return {'Messages': messages}
+
+        mock_client.receive_message.side_effect = _receive
+
+        consumer = SQSConsumer()
+        dispatched = []
+        while len(dispatched) < 20:
+            dispatched += consumer.receive_messages(wait_time=0, max_messages=free_slots)
+        consumer.stop_polling()
+
+        names = [m['MessageId'].split('-')[0] for m in dispatched]
+        assert (names.count('premium'), names.count('bulk')) == (15, 5)
+        assert sorted(received) == sorted(m['MessageId'] for m in dispatched)
+        mock_client.change_message_visibility.assert_not_called()
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_idle_queue_is_probed_without_holding_slots(self, mock_boto3, monkeypatch):
+        """Test an empty queue gets a short poll while the busy queue keeps its long poll"""
+        monkeypatch.setenv('SQS_QUEUES', 'premium=https://sqs/premium:3,bulk=https://sqs/bulk:1')
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        mock_client.receive_message.side_effect = lambda QueueUrl, MaxNumberOfMessages, **kwargs: (
+            {} if QueueUrl.endswith('premium') else {'Messages': [
+                {'MessageId': f'bulk-{i}', 'ReceiptHandle': f'bulk-rh-{i}'} for i in range(MaxNumberOfMessages)
+            ]}
+        )
+
+        consumer = SQSConsumer()
+        _wait_for_all_polls(consumer, max_messages=2)
+        consumer.receive_messages(wait_time=0, max_messages=2)
+        consumer._next_poll_at['premium'] = 0.0
+        mock_client.receive_message.reset_mock()
+        consumer._start_polls(20, 4)
+        wait(list(consumer._polls.values()))
+        consumer.stop_polling()
+
+        waits = {c.kwargs['QueueUrl']: c.kwargs['WaitTimeSeconds'] for c in mock_client.receive_message.call_args_list}
+        assert waits == {'https://sqs/premium': 0, 'https://sqs/bulk': 20}
+        requested = sum(c.kwargs['MaxNumberOfMessages'] for c in mock_client.receive_message.call_args_list)
+        assert requested == 4
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_empty_queue_does_not_delay_other_queues(self, mock_boto3, monkeypatch):
+        """Test long polls run concurrently so an idle queue adds no latency"""
+        monkeypatch.setenv('SQS_QUEUES', 'premium=https://sqs/premium:3,bulk=https://sqs/bulk:1')
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        premium_waiting = threading.Event()
+
+        def _receive(QueueUrl, **kwargs):
+            if QueueUrl.endswith('premium'):
+                premium_waiting.wait(2)
+                return {}
+            return {'Messages': [{'MessageId': 'bulk-0', 'ReceiptHandle': 'bulk-rh-0'}]}
+
+        mock_client.receive_message.side_effect = _receive
+
+        consumer = SQSConsumer()
+        started_at = time.monotonic()
+        messages = consumer.receive_messages(wait_time=20, max_messages=2)
+        elapsed = time.monotonic() - started_at
+        premium_waiting.set()
+        consumer.stop_polling()
+
+        assert [m['MessageId'] for m in messages] == ['bulk-0']
+        assert elapsed < 1
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_deletes_go_to_the_queue_that_delivered_the_message(self, mock_boto3, monkeypatch):
+        """Test batched deletes are grouped by source queue"""
+        monkeypatch.setenv('SQS_QUEUES', 'premium=https://sqs/premium:1,bulk=https://sqs/bulk:1')
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        mock_client.receive_message.side_effect = lambda QueueUrl, **kwargs: {
+            'Messages': [{'MessageId': QueueUrl, 'ReceiptHandle': f'{QueueUrl}#rh'}]
+        }
+        mock_client.delete_message_batch.return_value = {'Successful': [], 'Failed': []}
+
+        consumer = SQSConsumer()
+        _wait_for_all_polls(consumer, max_messages=2)
+        messages = consumer.receive_messages(wait_time=0, max_messages=2)
+        for message in messages:
+            consumer.buffer_delete(message['ReceiptHandle'])
+        consumer.flush_deletes()
+        consumer.stop_polling()
+
+        sent = {
+            c.kwargs['QueueUrl']: [e['ReceiptHandle'] for e in c.kwargs['Entries']]
+            for c in mock_client.delete_message_batch.call_args_list
+        }
+        assert sent == {
+            'https://sqs/premium': ['https://sqs/premium#rh'],
+            'https://sqs/bulk': ['https://sqs/bulk#rh'],
+        }
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_weighted_polls_request_only_free_slots(self, mock_boto3, monkeypatch):
+        """Test idle queues share the free slots by weight, each asking for at least one message"""
+        monkeypatch.setenv('SQS_QUEUES', 'premium=https://sqs/premium:3,bulk=https://sqs/bulk:1')
+        consumer = SQSConsumer()
+
+        assert consumer._poll_shares(4) == {'premium': 3, 'bulk': 1}
+        assert consumer._poll_shares(10) == {'premium': 8, 'bulk': 2}
+        assert consumer._poll_shares(1) == {'premium': 1, 'bulk': 1}
+
+    @patch('app.infrastructure.queue.sqs_consumer.boto3')
+    def test_prefetched_messages_are_not_extended_and_expire(self, mock_boto3, monkeypatch):
+        """Test messages received beyond the free slots go back to the queue instead of being hidden"""
+        monkeypatch.setenv('SQS_QUEUES', 'premium=https://sqs/premium:1,bulk=https://sqs/bulk:1')
+        monkeypatch.setenv('SQS_PREFETCH_TTL_SECONDS', '0.1')
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+        mock_client.receive_message.side_effect = lambda QueueUrl, **kwargs: {
+            'Messages': [{'MessageId': QueueUrl, 'ReceiptHandle': f'{QueueUrl}#rh'}]
+        }
+
+        consumer = SQSConsumer()
+        _wait_for_all_polls(consumer, max_messages=1)
+        messages = consumer.receive_messages(wait_time=0, max_messages=1)
+
+        assert len(messages) == 1
+        assert consumer._in_flight_handles == set()
+        assert all(c.kwargs['MaxNumberOfMessages'] == 1 for c in mock_client.receive_message.call_args_list)
+
+        deadline = time.monotonic() + 2
+        while not mock_client.change_message_visibility.called and time.monotonic() < deadline:
+            time.sleep(0.02)
+        leftover = next(url for url in ('https://sqs/premium', 'https://sqs/bulk') if url != messages[0]['MessageId'])
+        mock_client.change_message_visibility.assert_called_once_with(
+            QueueUrl=leftover, ReceiptHandle=f'{leftover}#rh', VisibilityTimeout=0
+        )
+        assert not consumer._has_prefetched()
+        consumer.stop_polling()
@@ -1,9 +1,14 @@
 from unittest.mock import Mock
 
 import pytest
+from sqlalchemy import create_engine, event
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
 
 from app.dao.video_dao import VideoDAO
+from app.entities.video import VideoStatusUpdate
+from app.infrastructure.db.database import Base
+from app.models.video import Video as VideoModel
 
 
 class DummyVideo:
@@ -13,24 +18,47 @@ class DummyVideo:
         self.file_path = file_path
 
 
-def test_video_dao_update_video_status_success():
-    db = Mock()
-    query = db.query.return_value
-    query.filter.return_value.first.return_value = DummyVideo(video_id=1)
+@pytest.fixture
+def sqlite_session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(VideoModel(id=1, user_id=5, title="video", file_path="old", status=0))
+    session.commit()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    try:
+        yield session, statements
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_video_dao_update_video_status_success(sqlite_session):
+    db, statements = sqlite_session
 
     dao = VideoDAO(db)
     updated = dao.update_video_status(video_id=1, status=1, file_path="outputs/new.zip")
 
     assert updated.status == 1
     assert updated.file_path == "outputs/new.zip"
-    db.commit.assert_called_once()
-    db.refresh.assert_called_once_with(updated)
+    assert updated.user_id == 5
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE video")
+    assert db.get(VideoModel, 1).status == 1
 
 
-def test_video_dao_update_video_status_not_found():
-    db = Mock()
-    query = db.query.return_value
-    query.filter.return_value.first.return_value = None
+def test_video_dao_update_video_status_keeps_file_path_when_not_given(sqlite_session):
+    db, _ = sqlite_session
+
+    updated = VideoDAO(db).update_video_status(video_id=1, status=2)
+
+    assert updated.status == 2
+    assert updated.file_path == "old"
+
+
+def test_video_dao_update_video_status_not_found(sqlite_session):
+    db, _ = sqlite_session
 
     dao = VideoDAO(db)
 
@@ -42,9 +70,7 @@ def test_video_dao_update_video_status_not_found():
 
 def test_video_dao_update_video_status_integrity_error_rollback():
     db = Mock()
-    query = db.query.return_value
-    query.filter.return_value.first.return_value = DummyVideo(video_id=1)
-    db.commit.side_effect = IntegrityError("stmt", "params", "orig")
+    db.execute.side_effect = IntegrityError("stmt", "params", "orig")
 
     dao = VideoDAO(db)
 
@@ -76,3 +102,22 @@ def test_video_dao_get_video_by_id_wraps_exception():
         dao.get_video_by_id(10)
 
     assert "Erro ao buscar vídeo" in str(exc_info.value)
+
+
+def test_video_dao_update_statuses_uses_a_single_bulk_update(sqlite_session):
+    db, statements = sqlite_session
+    db.add(VideoModel(id=2, user_id=5, title="video 2", file_path="old-2", status=0))
+    db.commit()
+    statements.clear()
+
+    updated = VideoDAO(db).update_statuses([
+        VideoStatusUpdate(video_id=1, status=1, file_path="outputs/frames_1.zip"),
+        VideoStatusUpdate(video_id=2, status=2),
+    ])
+
+    assert updated == 2
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE video")
+    db.expire_all()
+    assert (db.get(VideoModel, 1).status, db.get(VideoModel, 1).file_path) == (1, "outputs/frames_1.zip")
+    assert (db.get(VideoModel, 2).status, db.get(VideoModel, 2).file_path) == (2, "old-2")
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.dao import worker_tables
+from app.dao.video_lease_dao import LEASE_ACQUIRED, LEASE_BUSY, LEASE_COMPLETED, VideoLeaseDAO
+from app.models.video_lease import VideoLease
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    worker_tables._ready_tables.clear()
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _expire(db_session, video_id):
+    lease = db_session.get(VideoLease, video_id, populate_existing=True)
+    lease.expires_at -= timedelta(hours=2)
+    db_session.commit()
+
+
+def test_video_lease_dao_allows_a_single_owner(db_session):
+    dao = VideoLeaseDAO(db_session, ttl_seconds=300, retention_seconds=3600)
+
+    assert dao.acquire(1, "worker-a").state == LEASE_ACQUIRED
+    claim = dao.acquire(1, "worker-b")
+
+    assert claim.state == LEASE_BUSY
+    assert 290 <= claim.retry_after_seconds <= 300
+    assert dao.acquire(2, "worker-b").acquired
+
+
+def test_video_lease_dao_takes_over_expired_lease(db_session):
+    dao = VideoLeaseDAO(db_session, ttl_seconds=300, retention_seconds=3600)
+    dao.acquire(1, "crashed-worker")
+    _expire(db_session, 1)
+
+    assert dao.acquire(1, "worker-b").acquired
+    assert db_session.get(VideoLease, 1, populate_existing=True).owner == "worker-b"
+
+
+def test_video_lease_dao_completed_lease_marks_duplicates(db_session):
+    dao = VideoLeaseDAO(db_session, ttl_seconds=300, retention_seconds=3600)
+    dao.acquire(1, "worker-a")
+    dao.complete(1, "worker-a")
+
+    claim = dao.acquire(1, "worker-b")
+
+    assert claim.state == LEASE_COMPLETED
+    assert claim.retry_after_seconds > 300
+
+
+def test_video_lease_dao_release_and_renew_only_touch_own_leases(db_session):
+    dao = VideoLeaseDAO(db_session, ttl_seconds=300, retention_seconds=3600)
+    dao.acquire(1, "worker-a")
+    dao.acquire(2, "worker-b")
+    _expire(db_session, 1)
+    _expire(db_session, 2)
+
+    assert dao.renew("worker-a") == 1
+    dao.release(1, "worker-b")
+
+    assert dao.purge_expired() == 1
+    assert db_session.get(VideoLease, 1, populate_existing=True) is not None
+    assert db_session.get(VideoLease, 2) is None
+
+    dao.release(1, "worker-a")
+    assert dao.acquire(1, "worker-b").acquired
@@ -1,9 +1,20 @@
+from io import BytesIO
 from pathlib import Path
 from types import SimpleNamespace
 from unittest.mock import Mock, patch
+import asyncio
+import json
+import os
+import struct
 import tempfile
+import threading
+import time
+import zipfile
 
-from app.gateways.video_processing_gateway import VideoProcessingGateway
+from app.entities.video import ExtractionOptions
+from app.gateways import video_processing_gateway
+from app.gateways.video_processing_gateway import SourceStreamError, VideoProcessingGateway, _FFmpegMonitor
+from app.infrastructure.metrics import FFMPEG_KILLS
 
 
 def _fake_ffmpeg_success(cmd, capture_output=True, text=True):
@@ -16,6 +27,48 @@ def _fake_ffmpeg_success(cmd, capture_output=True, text=True):
     return SimpleNamespace(returncode=0, stderr="", stdout="")
 
 
+def _png_frame(payload: bytes) -> bytes:
+    def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + chunk_type + data + b"crc!"
+
+    return b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", payload) + _chunk(b"IEND", b"")
+
+
+class _RecordingStdin:
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def write(self, chunk: bytes) -> None:
+        self.data += chunk
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class _FakeStreamingFFmpeg:
+    def __init__(self, stdout: bytes, returncode: int = 0, stderr: bytes = b""):
+        self.stdin = _RecordingStdin()
+        self.stdout = BytesIO(stdout)
+        self.stderr = BytesIO(stderr)
+        self.returncode = returncode
+
+    def wait(self):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+def _ffmpeg_popen(fake_run):
+    # Adapta um FFmpeg falso no estilo subprocess.run ao Popen acompanhado pelo watchdog
+    def _popen(cmd, **kwargs):
+        result = fake_run(cmd)
+        return _FakeStreamingFFmpeg(b"", returncode=result.returncode, stderr=result.stderr.encode())
+
+    return _popen
+
+
 def test_video_processing_gateway_initializes_directories():
     with tempfile.TemporaryDirectory() as tmpdir:
         gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
@@ -34,7 +87,7 @@ def test_video_processing_gateway_process_video_local_success():
         video_path.parent.mkdir(parents=True, exist_ok=True)
         video_path.write_bytes(b"video")
 
-        with patch("app.gateways.video_processing_gateway.subprocess.run", side_effect=_fake_ffmpeg_success):
+        with patch("app.gateways.video_processing_gateway.subprocess.Popen", side_effect=_ffmpeg_popen(_fake_ffmpeg_success)):
             zip_path, frame_count, images = gateway.process_video(str(video_path), "20260218_111500")
 
         assert Path(zip_path).exists()
@@ -57,7 +110,7 @@ def test_video_processing_gateway_process_video_production_uploads_to_s3(monkeyp
 
         monkeypatch.setenv("APP_ENV", "production")
 
-        with patch("app.gateways.video_processing_gateway.subprocess.run", side_effect=_fake_ffmpeg_success):
+        with patch("app.gateways.video_processing_gateway.subprocess.Popen", side_effect=_ffmpeg_popen(_fake_ffmpeg_success)):
             with patch("app.gateways.video_processing_gateway.S3Gateway", return_value=mock_s3_gateway):
                 zip_path, frame_count, _ = gateway.process_video(str(video_path), "20260218_112000")
 
@@ -66,6 +119,51 @@ def test_video_processing_gateway_process_video_production_uploads_to_s3(monkeyp
         mock_s3_gateway.upload_video.assert_called_once()
 
 
+def test_video_processing_gateway_reuses_injected_s3_gateway(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        base_dir = Path(tmpdir)
+        shared_s3_gateway = Mock()
+        shared_s3_gateway.bucket_name = "bucket-test"
+        shared_s3_gateway.upload_video.return_value = True
+        gateway = VideoProcessingGateway(base_dir=base_dir, s3_gateway=shared_s3_gateway)
+
+        monkeypatch.setenv("APP_ENV", "production")
+
+        with patch("app.gateways.video_processing_gateway.subprocess.Popen", side_effect=_ffmpeg_popen(_fake_ffmpeg_success)):
+            with patch("app.gateways.video_processing_gateway.S3Gateway") as s3_gateway_cls:
+                gateway.process_video("video.mp4", "20260218_112500")
+                gateway.process_video("video.mp4", "20260218_112600")
+
+        s3_gateway_cls.assert_not_called()
+        assert shared_s3_gateway.upload_video.call_count == 2
+
+
+def test_video_processing_gateway_streams_zip_upload_without_local_artifact(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        base_dir = Path(tmpdir)
+        monkeypatch.setenv("APP_ENV", "production")
+        monkeypatch.setenv("S3_STREAMING_UPLOAD", "true")
+
+        sink = BytesIO()
+        sink.close = lambda: None
+        shared_s3_gateway = Mock()
+        shared_s3_gateway.bucket_name = "bucket-test"
+        shared_s3_gateway.open_multipart_writer.return_value.__enter__ = Mock(return_value=sink)
+        shared_s3_gateway.open_multipart_writer.return_value.__exit__ = Mock(return_value=False)
+        gateway = VideoProcessingGateway(base_dir=base_dir, s3_gateway=shared_s3_gateway)
+
+        with patch("app.gateways.video_processing_gateway.subprocess.Popen", side_effect=_ffmpeg_popen(_fake_ffmpeg_success)):
+            result, frame_count, _ = gateway.process_video("video.mp4", "20260218_112700")
+
+        assert result == "s3://bucket-test/outputs/frames_20260218_112700.zip"
+        assert frame_count == 2
+        shared_s3_gateway.open_multipart_writer.assert_called_once_with("outputs/frames_20260218_112700.zip")
+        shared_s3_gateway.upload_video.assert_not_called()
+        assert list(gateway.outputs_dir.iterdir()) == []
+        with zipfile.ZipFile(BytesIO(sink.getvalue())) as zipf:
+            assert zipf.namelist() == ["frame_0001.png", "frame_0002.png"]
+
+
 def test_video_processing_gateway_raises_when_ffmpeg_fails():
     with tempfile.TemporaryDirectory() as tmpdir:
         base_dir = Path(tmpdir)
@@ -75,11 +173,556 @@ def test_video_processing_gateway_raises_when_ffmpeg_fails():
         video_path.parent.mkdir(parents=True, exist_ok=True)
         video_path.write_bytes(b"video")
 
-        fail_result = SimpleNamespace(returncode=1, stderr="error", stdout="")
+        fail_process = _FakeStreamingFFmpeg(b"", returncode=1, stderr=b"error")
 
-        with patch("app.gateways.video_processing_gateway.subprocess.run", return_value=fail_result):
+        with patch("app.gateways.video_processing_gateway.subprocess.Popen", return_value=fail_process):
             try:
                 gateway.process_video(str(video_path), "20260218_113000")
                 assert False, "Expected exception"
             except Exception as exc:
                 assert "FFmpeg error" in str(exc)
+
+
+def test_video_processing_gateway_streams_frames_into_zip_without_temp_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        base_dir = Path(tmpdir)
+        gateway = VideoProcessingGateway(base_dir=base_dir, stream_frames=True)
+        frames = [_png_frame(b"first"), _png_frame(b"second")]
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.Popen",
+            return_value=_FakeStreamingFFmpeg(b"".join(frames)),
+        ) as popen:
+            zip_path, frame_count, images = gateway.process_video("video.mp4", "20260218_114000")
+
+        assert "image2pipe" in popen.call_args.args[0]
+        assert frame_count == 2
+        assert images == ["frame_0001.png", "frame_0002.png"]
+        assert not (base_dir / "temp" / "20260218_114000").exists()
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert zipf.namelist() == images
+            assert zipf.read("frame_0002.png") == frames[1]
+
+
+def test_video_processing_gateway_streaming_raises_when_ffmpeg_fails():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        base_dir = Path(tmpdir)
+        gateway = VideoProcessingGateway(base_dir=base_dir, stream_frames=True)
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.Popen",
+            return_value=_FakeStreamingFFmpeg(b"", returncode=1, stderr=b"decode error"),
+        ):
+            try:
+                gateway.process_video("video.mp4", "20260218_114500")
+                assert False, "Expected exception"
+            except RuntimeError as exc:
+                assert "decode error" in str(exc)
+
+        assert not (base_dir / "outputs" / "frames_20260218_114500.zip").exists()
+
+
+def test_video_processing_gateway_plans_segments_aligned_to_frame_grid(monkeypatch):
+    monkeypatch.setenv("FFMPEG_SEGMENTS", "4")
+    monkeypatch.setenv("FFMPEG_SEGMENT_MIN_SECONDS", "60")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+
+        with patch.object(gateway, "_probe_duration", return_value=30.0):
+            assert gateway._plan_segments("short.mp4", fps=1) == [(0, None)]
+
+        with patch.object(gateway, "_probe_duration", return_value=119.5):
+            assert gateway._plan_segments("long.mp4", fps=1) == [(0, 30), (30, 30), (60, 30), (90, None)]
+
+
+def test_video_processing_gateway_segment_cmd_seeks_and_numbers_frames():
+    cmd = VideoProcessingGateway._build_segment_cmd(
+        "video.mp4", "out/frame_%04d.png", ExtractionOptions(fps=2), 60, 30
+    )
+
+    assert cmd[cmd.index("-ss") + 1] == "29.500000"
+    assert "-copyts" in cmd
+    assert cmd[cmd.index("-vf") + 1] == "fps=2:start_time=0,trim=start_frame=60"
+    assert cmd[cmd.index("-start_number") + 1] == "61"
+    assert cmd[cmd.index("-frames:v") + 1] == "30"
+
+
+def test_video_processing_gateway_segmented_extraction_merges_frames_in_order(monkeypatch):
+    monkeypatch.setenv("FFMPEG_SEGMENTS", "3")
+    monkeypatch.setenv("FFMPEG_SEGMENT_MIN_SECONDS", "0")
+
+    def _fake_segment(cmd, capture_output=True, text=True):
+        start_number = int(cmd[cmd.index("-start_number") + 1])
+        frame_count = int(cmd[cmd.index("-frames:v") + 1]) if "-frames:v" in cmd else 2
+        for number in range(start_number, start_number + frame_count):
+            frame = Path(cmd[-1].replace("%04d", f"{number:04d}"))
+            frame.write_bytes(f"frame-{number}".encode())
+        return SimpleNamespace(returncode=0, stderr="", stdout="")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir), stream_frames=True)
+
+        with patch.object(gateway, "_probe_duration", return_value=8.0):
+            with patch("app.gateways.video_processing_gateway.subprocess.Popen", side_effect=_ffmpeg_popen(_fake_segment)) as run:
+                zip_path, frame_count, images = gateway.process_video("video.mp4", "20260218_115000")
+
+        assert run.call_count == 3
+        assert frame_count == 8
+        assert images == [f"frame_{n:04d}.png" for n in range(1, 9)]
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert zipf.read("frame_0004.png") == b"frame-4"
+
+
+def test_video_processing_gateway_feeds_input_stream_through_stdin():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir), stream_frames=True)
+        fake_process = _FakeStreamingFFmpeg(_png_frame(b"only"))
+        source = BytesIO(b"x" * (3 * 1024 * 1024 + 5))
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.Popen", return_value=fake_process
+        ) as popen:
+            _, frame_count, _ = gateway.process_video(
+                "s3://bucket/uploads/video.mkv", "20260218_116000", input_stream=source
+            )
+
+        cmd = popen.call_args.args[0]
+        assert cmd[cmd.index("-i") + 1] == "pipe:0"
+        assert frame_count == 1
+        assert fake_process.stdin.data == source.getvalue()
+        assert fake_process.stdin.closed is True
+
+
+def test_video_processing_gateway_fails_when_input_stream_breaks():
+    class _BrokenStream:
+        def read(self, _size):
+            raise ConnectionError("connection reset")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir), stream_frames=True)
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.Popen",
+            return_value=_FakeStreamingFFmpeg(_png_frame(b"partial")),
+        ):
+            try:
+                gateway.process_video("s3://bucket/video.mkv", "20260218_116500", input_stream=_BrokenStream())
+                assert False, "Expected exception"
+            except SourceStreamError as exc:
+                assert "connection reset" in str(exc)
+
+
+class _FakeAsyncStream:
+    def __init__(self, data: bytes):
+        self._data = BytesIO(data)
+
+    async def readline(self):
+        return self._data.readline()
+
+
+class _FakeAsyncFFmpeg:
+    def __init__(self, cmd, returncode=0):
+        self.cmd = cmd
+        self.returncode = returncode
+        if returncode == 0:
+            _fake_ffmpeg_success(list(cmd))
+        self.stderr = _FakeAsyncStream(b"" if returncode == 0 else b"boom")
+
+    async def wait(self):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+def test_video_processing_gateway_process_video_async_runs_ffmpeg_subprocess():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+        commands = []
+
+        async def _create_subprocess_exec(*cmd, **kwargs):
+            commands.append(cmd)
+            return _FakeAsyncFFmpeg(cmd)
+
+        with patch(
+            "app.gateways.video_processing_gateway.asyncio.create_subprocess_exec",
+            side_effect=_create_subprocess_exec,
+        ):
+            zip_path, frame_count, images = asyncio.run(
+                gateway.process_video_async("video.mp4", "20260218_113000")
+            )
+
+        assert len(commands) == 1
+        assert commands[0][:3] == ("ffmpeg", "-i", "video.mp4")
+        assert frame_count == 2
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert zipf.namelist() == images
+        assert not (gateway.temp_dir / "20260218_113000").exists()
+
+
+def test_video_processing_gateway_process_video_async_raises_when_ffmpeg_fails():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+
+        async def _create_subprocess_exec(*cmd, **kwargs):
+            return _FakeAsyncFFmpeg(cmd, returncode=1)
+
+        with patch(
+            "app.gateways.video_processing_gateway.asyncio.create_subprocess_exec",
+            side_effect=_create_subprocess_exec,
+        ):
+            try:
+                asyncio.run(gateway.process_video_async("video.mp4", "20260218_113100"))
+                assert False, "process_video_async deveria falhar"
+            except RuntimeError as e:
+                assert "FFmpeg error: boom" in str(e)
+
+        assert list(gateway.outputs_dir.iterdir()) == []
+
+
+def _jpeg_frame(payload: bytes) -> bytes:
+    # Tabela com bytes FF D9 fora dos dados comprimidos não pode encerrar o frame
+    dqt = b"\xff\xdb" + struct.pack(">H", 6) + b"\x00\xff\xd9\x01"
+    sos = b"\xff\xda" + struct.pack(">H", 4) + b"\x01\x00"
+    return b"\xff\xd8" + dqt + sos + payload.replace(b"\xff", b"\xff\x00") + b"\xff\xd9"
+
+
+def _webp_frame(payload: bytes) -> bytes:
+    chunk = b"VP8 " + struct.pack("<I", len(payload)) + payload + b"\x00" * (len(payload) & 1)
+    return b"RIFF" + struct.pack("<I", 4 + len(chunk)) + b"WEBP" + chunk
+
+
+def test_video_processing_gateway_streams_jpeg_and_webp_frames():
+    cases = [
+        ("jpeg", [_jpeg_frame(b"first\xff"), _jpeg_frame(b"second")], "jpg", "mjpeg"),
+        ("webp", [_webp_frame(b"odd"), _webp_frame(b"even")], "webp", "libwebp"),
+    ]
+
+    for image_format, frames, extension, encoder in cases:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            gateway = VideoProcessingGateway(base_dir=Path(tmpdir), stream_frames=True)
+            options = ExtractionOptions.from_dict({"format": image_format, "quality": 70, "max_width": 1280})
+
+            with patch(
+                "app.gateways.video_processing_gateway.subprocess.Popen",
+                return_value=_FakeStreamingFFmpeg(b"".join(frames)),
+            ) as popen:
+                zip_path, frame_count, images = gateway.process_video(
+                    "video.mp4", "20260218_116000", options=options
+                )
+
+            cmd = popen.call_args.args[0]
+            assert cmd[cmd.index("-c:v") + 1] == encoder
+            assert cmd[cmd.index("-vf") + 1] == (
+                "fps=1,scale=w='min(iw,1280)':h='ih':force_original_aspect_ratio=decrease"
+            )
+            assert frame_count == 2
+            assert images == [f"frame_0001.{extension}", f"frame_0002.{extension}"]
+            with zipfile.ZipFile(zip_path) as zipf:
+                assert [zipf.read(name) for name in images] == frames
+
+
+def test_video_processing_gateway_disk_extraction_uses_requested_format():
+    def _fake_jpeg_ffmpeg(cmd, capture_output=True, text=True):
+        Path(cmd[-1].replace("%04d", "0001")).write_bytes(b"jpg")
+        return SimpleNamespace(returncode=0, stderr="", stdout="")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+        options = ExtractionOptions.from_dict({"format": "jpeg", "quality": 100, "fps": 2, "max_height": 720})
+
+        with patch("app.gateways.video_processing_gateway.subprocess.Popen", side_effect=_ffmpeg_popen(_fake_jpeg_ffmpeg)) as run:
+            _, frame_count, images = gateway.process_video("video.mp4", "20260218_116500", options=options)
+
+        cmd = run.call_args.args[0]
+        assert cmd[-1].endswith("frame_%04d.jpg")
+        assert cmd[cmd.index("-q:v") + 1] == "2"
+        assert cmd[cmd.index("-vf") + 1].startswith("fps=2,scale=w='iw':h='min(ih,720)'")
+        assert frame_count == 1
+        assert images == ["frame_0001.jpg"]
+
+
+_SHOWINFO_STDERR = (
+    "[Parsed_showinfo_1 @ 0x55d0] n:   0 pts:      0 pts_time:0       duration:512\n"
+    "[Parsed_showinfo_1 @ 0x55d0] n:   1 pts:  61440 pts_time:4.8     duration:512\n"
+)
+
+
+def test_video_processing_gateway_keyframe_mode_records_frame_timestamps(monkeypatch):
+    monkeypatch.setenv("FFMPEG_SEGMENTS", "4")
+    monkeypatch.setenv("FFMPEG_SEGMENT_MIN_SECONDS", "0")
+
+    def _fake_keyframes(cmd, capture_output=True, text=True):
+        for number in (1, 2):
+            Path(cmd[-1].replace("%04d", f"{number:04d}")).write_bytes(b"img")
+        return SimpleNamespace(returncode=0, stderr=_SHOWINFO_STDERR, stdout="")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+        options = ExtractionOptions.from_dict({"mode": "keyframes"})
+
+        with patch.object(gateway, "_probe_duration") as probe:
+            with patch("app.gateways.video_processing_gateway.subprocess.Popen", side_effect=_ffmpeg_popen(_fake_keyframes)) as run:
+                zip_path, frame_count, images = gateway.process_video("video.mp4", "20260218_117000", options=options)
+
+        probe.assert_not_called()
+        cmd = run.call_args.args[0]
+        assert cmd.index("-skip_frame") < cmd.index("-i")
+        assert cmd[cmd.index("-fps_mode") + 1] == "passthrough"
+        assert cmd[cmd.index("-vf") + 1] == "showinfo"
+        assert frame_count == 2
+        with zipfile.ZipFile(zip_path) as zipf:
+            manifest = json.loads(zipf.read("timestamps.json"))
+        assert manifest == {
+            "mode": "keyframes",
+            "frames": [
+                {"name": "frame_0001.png", "pts_time": 0.0},
+                {"name": "frame_0002.png", "pts_time": 4.8},
+            ],
+        }
+
+
+def test_video_processing_gateway_streams_scene_frames_with_limit():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir), stream_frames=True)
+        options = ExtractionOptions.from_dict({"mode": "scene", "scene_threshold": 0.4, "max_frames": 2})
+        frames = [_png_frame(b"first"), _png_frame(b"second")]
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.Popen",
+            return_value=_FakeStreamingFFmpeg(b"".join(frames), stderr=_SHOWINFO_STDERR.encode()),
+        ) as popen:
+            zip_path, frame_count, images = gateway.process_video("video.mp4", "20260218_117500", options=options)
+
+        cmd = popen.call_args.args[0]
+        assert cmd[cmd.index("-vf") + 1] == (
+            "select='eq(n,0)+gt(scene,0.4)+0*if(gte(t,ld(0)),print(st(0,t+1)-1))',showinfo"
+        )
+        assert cmd[cmd.index("-frames:v") + 1] == "2"
+        assert images == ["frame_0001.png", "frame_0002.png"]
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert zipf.namelist() == images + ["timestamps.json"]
+            manifest = json.loads(zipf.read("timestamps.json"))
+        assert [frame["pts_time"] for frame in manifest["frames"]] == [0.0, 4.8]
+
+
+def test_video_processing_gateway_probe_video_parses_ffprobe_json():
+    ffprobe_output = json.dumps(
+        {
+            "streams": [{"codec_name": "hevc", "width": 3840, "height": 2160}],
+            "format": {"duration": "3600.5", "size": "734003200"},
+        }
+    )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.run",
+            return_value=SimpleNamespace(returncode=0, stdout=ffprobe_output, stderr=""),
+        ) as run:
+            probe = gateway.probe_video("https://bucket.s3/video.mp4?X-Amz-Signature=abc")
+
+        assert run.call_args.args[0][-1] == "https://bucket.s3/video.mp4?X-Amz-Signature=abc"
+        assert probe.duration_seconds == 3600.5
+        assert (probe.width, probe.height, probe.codec, probe.size_bytes) == (3840, 2160, "hevc", 734003200)
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.run",
+            return_value=SimpleNamespace(returncode=1, stdout="", stderr="Invalid data"),
+        ):
+            assert gateway.probe_video("broken.mp4") is None
+
+
+_PROGRESS_STDERR = (
+    "Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'video.mp4':\n"
+    "frame=1\nout_time_us=1000000\nspeed=  12x\nprogress=continue\n"
+    "frame=5\nout_time_us=5000000\nspeed=  13x\nprogress=end\n"
+)
+
+
+def test_ffmpeg_monitor_parses_progress_and_keeps_only_stderr_tail():
+    monitor = _FFmpegMonitor(stall_timeout=0, time_budget=None, tail_lines=2)
+
+    for line in (_SHOWINFO_STDERR + _PROGRESS_STDERR + "line a\nline b\nline c\n").splitlines():
+        monitor.feed(line)
+
+    assert (monitor.frames, monitor.out_seconds, monitor.ended) == (5, 5.0, True)
+    assert monitor.pts_times == [0.0, 4.8]
+    assert monitor.stderr_tail == "line b\nline c"
+
+
+def test_ffmpeg_monitor_expires_on_time_budget():
+    monitor = _FFmpegMonitor(stall_timeout=300, time_budget=0, tail_lines=10)
+    kills_before = FFMPEG_KILLS.value(reason="timeout")
+
+    assert monitor.expired() is True
+    assert monitor.expired() is False
+    assert FFMPEG_KILLS.value(reason="timeout") == kills_before + 1
+    assert "excedeu o limite" in str(monitor.failure())
+
+
+def test_video_processing_gateway_time_budget_scales_with_duration(monkeypatch):
+    monkeypatch.setenv("FFMPEG_TIMEOUT_FACTOR", "3")
+    monkeypatch.setenv("FFMPEG_TIMEOUT_BASE_SECONDS", "60")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+
+        assert gateway._time_budget(100.0) == 360.0
+        assert gateway._time_budget(None) is None
+
+
+class _HangingFFmpeg:
+    def __init__(self, stderr: bytes):
+        read_fd, self._write_fd = os.pipe()
+        os.write(self._write_fd, stderr)
+        self.stderr = os.fdopen(read_fd, "rb")
+        self.stdout = BytesIO(b"")
+        self.returncode = None
+        self._killed = threading.Event()
+
+    def kill(self):
+        if not self._killed.is_set():
+            self.returncode = -9
+            os.close(self._write_fd)
+            self._killed.set()
+
+    def wait(self):
+        self._killed.wait(5)
+        return self.returncode
+
+
+def test_video_processing_gateway_kills_stalled_ffmpeg(monkeypatch):
+    monkeypatch.setenv("FFMPEG_STALL_TIMEOUT_SECONDS", "0.05")
+    monkeypatch.setattr(video_processing_gateway, "WATCHDOG_INTERVAL_SECONDS", 0.01)
+    kills_before = FFMPEG_KILLS.value(reason="stall")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+        process = _HangingFFmpeg(b"Input #0, matroska,webm, from 'pipe:0':\n")
+
+        with patch("app.gateways.video_processing_gateway.subprocess.Popen", return_value=process):
+            try:
+                gateway.process_video("video.mkv", "20260218_118000")
+                assert False, "Expected exception"
+            except RuntimeError as exc:
+                assert str(exc).startswith("FFmpeg interrompido (sem progresso")
+                assert "Input #0, matroska" in str(exc)
+        process.stderr.close()
+
+    assert FFMPEG_KILLS.value(reason="stall") == kills_before + 1
+
+
+class _StaticSceneFFmpeg:
+    # Select sem cortes: o -progress repete frame e out_time enquanto o instante decodificado avança
+    def __init__(self, frame_path: str, line_delay: float):
+        Path(frame_path.replace("%04d", "0001")).write_bytes(b"img")
+        self.stdout = BytesIO(b"")
+        self.returncode = None
+        self._line_delay = line_delay
+        self._done = threading.Event()
+        self.stderr = self._stderr()
+
+    def _stderr(self):
+        for second in range(6):
+            time.sleep(self._line_delay)
+            yield f"[Eval @ 0x55d0] {second}.000000\n".encode()
+            yield from (b"frame=1\n", b"out_time_us=0\n", b"progress=continue\n")
+        yield from (b"frame=1\n", b"out_time_us=0\n", b"progress=end\n")
+        self.returncode = 0
+        self._done.set()
+
+    def kill(self):
+        self.returncode = -9
+
+    def wait(self):
+        self._done.wait(5)
+        return self.returncode
+
+
+def test_video_processing_gateway_keeps_scene_ffmpeg_alive_while_select_emits_nothing(monkeypatch):
+    monkeypatch.setenv("FFMPEG_STALL_TIMEOUT_SECONDS", "0.1")
+    monkeypatch.setenv("FFMPEG_PROGRESS_INTERVAL", "0")
+    monkeypatch.setattr(video_processing_gateway, "WATCHDOG_INTERVAL_SECONDS", 0.01)
+    kills_before = FFMPEG_KILLS.value(reason="stall")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+        reported = []
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.Popen",
+            side_effect=lambda cmd, **kwargs: _StaticSceneFFmpeg(cmd[-1], line_delay=0.04),
+        ):
+            _, frame_count, _ = gateway.process_video(
+                "video.mp4",
+                "20260218_118200",
+                options=ExtractionOptions.from_dict({"mode": "scene"}),
+                duration_seconds=10.0,
+                on_progress=reported.append,
+            )
+
+    assert frame_count == 1
+    assert FFMPEG_KILLS.value(reason="stall") == kills_before
+    assert [item.percent for item in reported[:-1]] == [0.0, 10.0, 20.0, 30.0, 40.0, 50.0]
+
+
+def test_video_processing_gateway_terminates_running_ffmpeg_and_kills_after_grace():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+        # FFmpeg que ignora o SIGTERM
+        process = _HangingFFmpeg(b"")
+        process.terminate = Mock()
+        errors = []
+
+        def _job():
+            try:
+                gateway.process_video("video.mp4", "20260218_118300")
+            except RuntimeError as exc:
+                errors.append(exc)
+
+        with patch("app.gateways.video_processing_gateway.subprocess.Popen", return_value=process):
+            job = threading.Thread(target=_job)
+            job.start()
+            deadline = time.monotonic() + 5
+            while not gateway._live_processes._processes and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            assert gateway.terminate_ffmpeg(grace_seconds=0.05) == 1
+            job.join(5)
+        process.stderr.close()
+
+    process.terminate.assert_called_once()
+    assert process.returncode == -9
+    assert len(errors) == 1
+    assert gateway.terminate_ffmpeg(grace_seconds=0.05) == 0
+
+
+def test_video_processing_gateway_reports_extraction_progress(monkeypatch):
+    monkeypatch.setenv("FFMPEG_PROGRESS_INTERVAL", "0")
+
+    def _fake_progress(cmd, capture_output=True, text=True):
+        _fake_ffmpeg_success(cmd)
+        return SimpleNamespace(returncode=0, stderr=_PROGRESS_STDERR, stdout="")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gateway = VideoProcessingGateway(base_dir=Path(tmpdir))
+        reported = []
+
+        with patch(
+            "app.gateways.video_processing_gateway.subprocess.Popen", side_effect=_ffmpeg_popen(_fake_progress)
+        ) as popen:
+            gateway.process_video(
+                "video.mp4",
+                "20260218_118500",
+                options=ExtractionOptions.from_dict({"fps": 1}),
+                duration_seconds=10.0,
+                on_progress=reported.append,
+            )
+
+        cmd = popen.call_args.args[0]
+        assert cmd[cmd.index("-progress") + 1] == "pipe:2"
+        assert cmd[-1].endswith("frame_%04d.png")
+        assert [(item.frames, item.percent) for item in reported] == [(1, 10.0), (5, 100.0)]
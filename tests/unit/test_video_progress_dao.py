@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.dao import worker_tables
+from app.dao.video_progress_dao import VideoProgressDAO
+from app.entities.video import ExtractionProgress
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    worker_tables._ready_tables.clear()
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_video_progress_dao_upserts_latest_progress(db_session):
+    dao = VideoProgressDAO(db_session)
+
+    dao.save_progress(1, ExtractionProgress(frames=10, processed_seconds=10.0, duration_seconds=40.0))
+    dao.save_progress(1, ExtractionProgress(frames=30, processed_seconds=30.0, duration_seconds=40.0))
+
+    progress = dao.get_progress(1)
+    assert (progress.frames, progress.processed_seconds, progress.percent) == (30, 30.0, 75.0)
+
+
+def test_video_progress_dao_keeps_percent_empty_without_duration(db_session):
+    dao = VideoProgressDAO(db_session)
+
+    dao.save_progress(2, ExtractionProgress(frames=5, processed_seconds=5.0))
+
+    assert dao.get_progress(2).percent is None
+    assert dao.get_progress(3) is None
@@ -0,0 +1,73 @@
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.dao.video_status_writer import DeferredVideoDAO, VideoStatusWriter
+from app.entities.video import VideoStatusUpdate
+from app.infrastructure.db.database import Base
+from app.models.video import Video as VideoModel
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as session:
+        session.add_all([
+            VideoModel(id=video_id, user_id=5, title="video", file_path="old", status=0) for video_id in (1, 2)
+        ])
+        session.commit()
+    try:
+        yield factory
+    finally:
+        engine.dispose()
+
+
+def test_deferred_video_dao_records_updates_instead_of_writing():
+    video_dao = Mock()
+    updates = []
+
+    dao = DeferredVideoDAO(video_dao, updates)
+    dao.update_video_status(video_id="3", status=1, file_path="outputs/frames_3.zip")
+    dao.get_video_by_id(3)
+
+    assert updates == [VideoStatusUpdate(3, 1, "outputs/frames_3.zip")]
+    video_dao.update_video_status.assert_not_called()
+    video_dao.get_video_by_id.assert_called_once_with(3)
+
+
+def test_status_writer_coalesces_jobs_and_acknowledges_after_commit(session_factory):
+    writer = VideoStatusWriter(session_factory, flush_interval=60, max_batch=100)
+    acknowledged = []
+
+    writer.submit([VideoStatusUpdate(1, 1, "outputs/frames_1.zip")], acknowledged.append)
+    writer.submit([VideoStatusUpdate(2, 2)], acknowledged.append)
+    # Uma atualização posterior do mesmo vídeo substitui a anterior e mantém o file_path
+    writer.submit([VideoStatusUpdate(1, 1)], acknowledged.append)
+
+    assert acknowledged == []
+    assert writer.flush() is True
+    writer.stop()
+
+    assert acknowledged == [True, True, True]
+    with session_factory() as session:
+        assert (session.get(VideoModel, 1).status, session.get(VideoModel, 1).file_path) == (
+            1, "outputs/frames_1.zip"
+        )
+        assert session.get(VideoModel, 2).status == 2
+
+
+def test_status_writer_reports_failure_after_retries(monkeypatch):
+    monkeypatch.setattr("app.dao.video_status_writer.time.sleep", lambda _seconds: None)
+    session_factory = Mock(side_effect=RuntimeError("banco indisponível"))
+    writer = VideoStatusWriter(session_factory, flush_interval=60, max_attempts=2)
+    acknowledged = []
+
+    writer.submit([VideoStatusUpdate(1, 1)], acknowledged.append)
+    writer.stop()
+
+    assert acknowledged == [False]
+    assert session_factory.call_count == 2
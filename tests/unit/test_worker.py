@@ -1,10 +1,15 @@
+import asyncio
 import os
+import threading
 from pathlib import Path
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
 
 import worker
+from app.entities.video import ExtractionOptions, FailureNotification, VideoProbe, VideoStatusUpdate
+from app.dao.video_lease_dao import LEASE_ACQUIRED, LEASE_BUSY, LEASE_COMPLETED, LeaseClaim
+from app.infrastructure.admission import JobCost
 
 
 def test_extract_s3_key_from_uri():
@@ -44,6 +49,10 @@ def test_process_message_success(mock_use_case_cls, mock_video_dao_cls, mock_ses
         video_id=1,
         video_path="uploads/video.mp4",
         timestamp="20260218_120000",
+        input_stream=None,
+        content_key=None,
+        options=ExtractionOptions(),
+        user_id=10,
     )
     mock_session.close.assert_called_once()
 
@@ -84,8 +93,671 @@ def test_process_message_downloads_s3_file_before_processing(mock_use_case_cls,
     worker_instance.s3_gateway.download_video.assert_called_once()
 
 
+@patch("worker.SessionLocal")
+@patch("worker.VideoDAO")
+@patch("worker.ProcessVideoUseCase")
+def test_process_message_streams_s3_input_without_download(
+    mock_use_case_cls, mock_video_dao_cls, mock_session_local, monkeypatch
+):
+    monkeypatch.setenv("S3_STREAMING_INPUT", "true")
+    mock_use_case = Mock()
+    mock_use_case_cls.return_value = mock_use_case
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.s3_gateway = Mock()
+    worker_instance.s3_gateway.is_streamable.return_value = True
+    video_stream = Mock()
+    worker_instance.s3_gateway.open_video_stream.return_value = video_stream
+
+    result = worker_instance.process_message(
+        {
+            "video_id": 3,
+            "video_path": "s3://video-bucket/uploads/video.mkv",
+            "timestamp": "20260218_122000",
+        }
+    )
+
+    assert result is True
+    worker_instance.s3_gateway.open_video_stream.assert_called_once_with("uploads/video.mkv")
+    worker_instance.s3_gateway.download_video.assert_not_called()
+    args = mock_use_case.execute.call_args.kwargs
+    assert args["input_stream"] is video_stream
+    assert args["video_path"] == "s3://video-bucket/uploads/video.mkv"
+    video_stream.close.assert_called_once()
+
+
+@patch("worker.SessionLocal")
+@patch("worker.VideoDAO")
+@patch("worker.ProcessVideoUseCase")
+def test_process_message_falls_back_to_download_for_seek_only_containers(
+    mock_use_case_cls, mock_video_dao_cls, mock_session_local, monkeypatch
+):
+    monkeypatch.setenv("S3_STREAMING_INPUT", "true")
+    mock_use_case_cls.return_value = Mock()
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.s3_gateway = Mock()
+    worker_instance.s3_gateway.is_streamable.return_value = False
+    worker_instance.s3_gateway.download_video.return_value = True
+
+    result = worker_instance.process_message(
+        {
+            "video_id": 4,
+            "video_path": "s3://video-bucket/uploads/video.mp4",
+            "timestamp": "20260218_122500",
+        }
+    )
+
+    assert result is True
+    worker_instance.s3_gateway.open_video_stream.assert_not_called()
+    worker_instance.s3_gateway.download_video.assert_called_once()
+
+
 def test_process_message_invalid_payload_returns_false():
     worker_instance = worker.VideoWorker()
     result = worker_instance.process_message({"video_id": 1})
 
     assert result is False
+
+
+def _sqs_message(message_id: str) -> dict:
+    return {"MessageId": message_id, "ReceiptHandle": f"rh-{message_id}", "Body": "{}"}
+
+
+def _message_body(video_id) -> dict:
+    return {"video_id": video_id, "video_path": "uploads/video.mp4", "timestamp": "20260218_120000"}
+
+
+def test_resolve_concurrency_from_env(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "4")
+    assert worker._resolve_concurrency() == 4
+
+    monkeypatch.setenv("WORKER_CONCURRENCY", "invalid")
+    assert worker._resolve_concurrency() == 1
+
+    monkeypatch.setenv("WORKER_CONCURRENCY", "auto")
+    assert worker._resolve_concurrency() >= 1
+
+
+def test_run_pool_processes_messages_concurrently_and_deletes_on_success(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "2")
+    monkeypatch.setenv("WORKER_POOL_MODE", "thread")
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.sqs_consumer.receive_messages.side_effect = [
+        [_sqs_message("1"), _sqs_message("2")],
+        KeyboardInterrupt(),
+    ]
+    worker_instance.sqs_consumer.parse_message.side_effect = lambda m: _message_body(m["MessageId"])
+    worker_instance.process_message = Mock(side_effect=lambda body: body["video_id"] == "1")
+
+    worker_instance.run()
+
+    worker_instance.sqs_consumer.receive_messages.assert_any_call(wait_time=20, max_messages=2)
+    worker_instance.sqs_consumer.buffer_delete.assert_called_once_with("rh-1")
+    worker_instance.sqs_consumer.flush_deletes.assert_called_once()
+    worker_instance.sqs_consumer.release_message.assert_called_once_with("rh-2")
+    worker_instance.sqs_consumer.track_in_flight.assert_any_call("rh-2")
+    worker_instance.sqs_consumer.untrack_in_flight.assert_any_call("rh-2")
+    assert worker_instance.process_message.call_count == 2
+    assert worker_instance._in_flight == {}
+
+
+def test_run_pool_only_polls_when_slots_are_free(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "2")
+    monkeypatch.setenv("WORKER_POOL_MODE", "thread")
+
+    release_jobs = threading.Event()
+    polled_with_slots_free = []
+
+    def _receive(wait_time=20, max_messages=10):
+        if worker_instance.sqs_consumer.receive_messages.call_count == 1:
+            return [_sqs_message("1"), _sqs_message("2")]
+        polled_with_slots_free.append(release_jobs.is_set())
+        raise KeyboardInterrupt()
+
+    def _process(_body):
+        release_jobs.wait(timeout=5)
+        return True
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.sqs_consumer.receive_messages.side_effect = _receive
+    worker_instance.sqs_consumer.parse_message.return_value = _message_body(1)
+    worker_instance.process_message = Mock(side_effect=_process)
+
+    threading.Timer(0.2, release_jobs.set).start()
+    worker_instance.run()
+
+    assert polled_with_slots_free == [True]
+    assert worker_instance.sqs_consumer.buffer_delete.call_count == 2
+
+
+def test_run_serial_keeps_heartbeat_and_releases_failed_message(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "1")
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = MagicMock()
+    worker_instance.sqs_consumer.receive_message.side_effect = [_sqs_message("1"), KeyboardInterrupt()]
+    worker_instance.sqs_consumer.parse_message.return_value = _message_body(1)
+    worker_instance.process_message = Mock(return_value=False)
+
+    worker_instance.run()
+
+    worker_instance.sqs_consumer.heartbeat.assert_called_once_with("rh-1")
+    worker_instance.sqs_consumer.release_message.assert_called_once_with("rh-1")
+    worker_instance.sqs_consumer.buffer_delete.assert_not_called()
+
+
+def test_run_deletes_message_missing_required_fields(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "1")
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.sqs_consumer.receive_message.side_effect = [_sqs_message("1"), KeyboardInterrupt()]
+    worker_instance.sqs_consumer.parse_message.return_value = {"video_id": 1}
+    worker_instance.process_message = Mock()
+
+    worker_instance.run()
+
+    worker_instance.process_message.assert_not_called()
+    worker_instance.sqs_consumer.buffer_delete.assert_called_once_with("rh-1")
+    worker_instance.sqs_consumer.release_message.assert_not_called()
+
+
+def test_resolve_runtime_from_env(monkeypatch):
+    monkeypatch.setenv("WORKER_RUNTIME", "async")
+    assert worker._resolve_runtime() == worker.RUNTIME_ASYNC
+
+    monkeypatch.setenv("WORKER_RUNTIME", "invalid")
+    assert worker._resolve_runtime() == worker.RUNTIME_SYNC
+
+
+@patch("worker.SessionLocal")
+@patch("worker.VideoDAO")
+@patch("worker.ProcessVideoUseCase")
+def test_process_message_async_runs_use_case_and_cleans_download(
+    mock_use_case_cls, mock_video_dao_cls, mock_session_local, tmp_path
+):
+    mock_session = Mock()
+    mock_session_local.return_value = mock_session
+    mock_use_case = Mock()
+    mock_use_case.execute_async = AsyncMock()
+    mock_use_case_cls.return_value = mock_use_case
+
+    worker_instance = worker.VideoWorker()
+    downloaded = tmp_path / "video.mp4"
+    downloaded.write_bytes(b"video")
+    worker_instance._ensure_local_video_path = Mock(return_value=str(downloaded))
+
+    result = asyncio.run(worker_instance.process_message_async(_message_body(1)))
+
+    assert result is True
+    mock_use_case.execute_async.assert_awaited_once_with(
+        video_id=1,
+        video_path=str(downloaded),
+        timestamp="20260218_120000",
+        content_key=None,
+        options=ExtractionOptions(),
+        user_id=None,
+    )
+    mock_session.close.assert_called_once()
+    assert not downloaded.exists()
+
+
+def test_poll_once_async_keeps_jobs_in_flight_and_frees_slots(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "3")
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.sqs_consumer.receive_messages.return_value = [
+        _sqs_message("1"),
+        _sqs_message("2"),
+        _sqs_message("3"),
+    ]
+    worker_instance.sqs_consumer.parse_message.side_effect = lambda m: (
+        {"video_id": 3} if m["MessageId"] == "3" else _message_body(m["MessageId"])
+    )
+
+    running = []
+
+    async def _process(body):
+        running.append(body["video_id"])
+        await asyncio.sleep(0.2)
+        # Os dois jobs válidos ficam em andamento ao mesmo tempo
+        return len(running) == 2 and body["video_id"] == "1"
+
+    worker_instance.process_message_async = _process
+
+    async def _poll():
+        worker_instance._async_slots = asyncio.Semaphore(worker_instance.concurrency)
+        jobs = set()
+        await worker_instance._poll_once_async(jobs)
+        assert len(jobs) == 2
+        await asyncio.gather(*jobs)
+        return worker_instance._async_slots._value
+
+    free_slots = asyncio.run(_poll())
+
+    assert free_slots == 3
+    worker_instance.sqs_consumer.receive_messages.assert_called_once_with(wait_time=20, max_messages=3)
+    assert sorted(running) == ["1", "2"]
+    worker_instance.sqs_consumer.buffer_delete.assert_any_call("rh-3")
+    worker_instance.sqs_consumer.buffer_delete.assert_any_call("rh-1")
+    worker_instance.sqs_consumer.release_message.assert_called_once_with("rh-2")
+    worker_instance.sqs_consumer.untrack_in_flight.assert_any_call("rh-1")
+
+
+@patch("worker.SessionLocal")
+@patch("worker.ProcessVideoUseCase")
+def test_process_message_reuses_cached_result_before_download(mock_use_case_cls, mock_session_local, monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "true")
+    mock_use_case = Mock()
+    mock_use_case.resolve_content_key.return_value = "abc"
+    mock_use_case.reuse_cached_result.return_value = True
+    mock_use_case_cls.return_value = mock_use_case
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.s3_gateway = Mock()
+
+    with patch("worker.ResultCacheDAO"):
+        result = worker_instance.process_message(
+            {"video_id": 1, "video_path": "s3://bucket/uploads/video.mp4", "timestamp": "20260218_120000"}
+        )
+
+    assert result is True
+    mock_use_case.resolve_content_key.assert_called_once_with(
+        "s3://bucket/uploads/video.mp4", "uploads/video.mp4", ExtractionOptions()
+    )
+    mock_use_case.reuse_cached_result.assert_called_once_with(1, "abc")
+    worker_instance.s3_gateway.download_video.assert_not_called()
+    mock_use_case.execute.assert_not_called()
+
+
+@patch("worker.SessionLocal")
+@patch("worker.VideoDAO")
+@patch("worker.ProcessVideoUseCase")
+def test_process_message_keeps_cached_source_for_redelivery(
+    mock_use_case_cls, mock_video_dao_cls, mock_session_local, monkeypatch, tmp_path
+):
+    monkeypatch.setenv("SOURCE_CACHE_MAX_MB", "10")
+    mock_use_case_cls.return_value = Mock()
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.source_cache.cache_dir = tmp_path
+    worker_instance.s3_gateway = Mock()
+    worker_instance.s3_gateway.get_object_fingerprint.return_value = "etag-1:5"
+    worker_instance.s3_gateway.download_video.side_effect = (
+        lambda key, local_path: Path(local_path).write_bytes(b"video") or True
+    )
+
+    message_body = {"video_id": 1, "video_path": "s3://bucket/uploads/video.mp4", "timestamp": "20260218_120000"}
+    assert worker_instance.process_message(message_body) is True
+    assert worker_instance.process_message(message_body) is True
+
+    worker_instance.s3_gateway.download_video.assert_called_once()
+    processed_paths = {c.kwargs["video_path"] for c in mock_use_case_cls.return_value.execute.call_args_list}
+    assert len(processed_paths) == 1
+    assert Path(processed_paths.pop()).exists()
+    assert worker_instance.source_cache.stats.hits == 1
+
+
+def test_on_job_done_merges_metrics_from_pool_process():
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    message = _sqs_message("1")
+    worker_instance._in_flight["1"] = message
+
+    frames_before = worker.REGISTRY._metrics["video_worker_frames_extracted_total"].value()
+    future = Mock()
+    future.result.return_value = worker.JobResult(True, metrics={"video_worker_frames_extracted_total": {(): 7}})
+
+    worker_instance._on_job_done(future, message)
+
+    assert worker.REGISTRY._metrics["video_worker_frames_extracted_total"].value() == frames_before + 7
+    worker_instance.sqs_consumer.buffer_delete.assert_called_once_with("rh-1")
+    assert worker_instance._in_flight == {}
+
+
+def test_on_job_done_publishes_pool_failures_through_parent_gateway():
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.notification_gateway = Mock()
+    message = _sqs_message("1")
+    worker_instance._in_flight["1"] = message
+
+    future = Mock()
+    future.result.return_value = worker.JobResult(
+        False, notifications=[FailureNotification(1, "ffmpeg falhou", 9)]
+    )
+
+    worker_instance._on_job_done(future, message)
+
+    worker_instance.notification_gateway.notify_processing_error.assert_called_once_with(
+        video_id=1, error_message="ffmpeg falhou", user_id=9
+    )
+
+
+def test_run_job_defers_notifications_in_pool_process():
+    worker_instance = worker.VideoWorker()
+    worker_instance.notification_gateway = Mock()
+
+    def fail(message_body, status_updates=None, notifications=None):
+        use_case = worker_instance._build_use_case(Mock(), status_updates, notifications)
+        use_case.notification_gateway.notify_processing_error(1, "erro", 9)
+        return False
+
+    with patch.object(worker_instance, "process_message", side_effect=fail):
+        result = worker_instance._run_job({"video_id": 1}, defer_notifications=True)
+
+    assert result.notifications == [FailureNotification(1, "erro", 9)]
+    worker_instance.notification_gateway.notify_processing_error.assert_not_called()
+
+
+def test_process_pool_starts_children_from_forkserver_with_cached_secret(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "2")
+    worker_instance = worker.VideoWorker()
+
+    with patch("worker.ProcessPoolExecutor") as mock_pool_cls, patch.object(
+        worker.database, "secret_cache_snapshot", return_value={"db": (1.0, {"host": "h"})}
+    ):
+        worker_instance._create_executor()
+
+    kwargs = mock_pool_cls.call_args.kwargs
+    assert kwargs["mp_context"].get_start_method() == "forkserver"
+    assert kwargs["initargs"] == ({"db": (1.0, {"host": "h"})},)
+
+
+@patch("worker.SQSConsumer")
+def test_measure_startup_reports_timings_without_polling(mock_consumer_cls):
+    timings = worker.measure_startup()
+
+    assert set(timings) == {"imports_seconds", "init_seconds", "sqs_client_seconds", "total_seconds"}
+    assert timings["total_seconds"] >= timings["imports_seconds"]
+    mock_consumer_cls.return_value.receive_messages.assert_not_called()
+    mock_consumer_cls.return_value.receive_message.assert_not_called()
+
+
+def test_discard_invalid_message_rejects_bad_extraction_options():
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    body = dict(_message_body(1), extraction={"format": "gif"})
+
+    assert worker_instance._discard_invalid_message(_sqs_message("1"), body) is True
+    worker_instance.sqs_consumer.buffer_delete.assert_called_once_with("rh-1")
+
+    valid = dict(_message_body(2), extraction={"format": "jpeg", "max_width": 1280})
+    assert worker_instance._discard_invalid_message(_sqs_message("2"), valid) is False
+
+
+def test_dispatch_defers_message_that_exceeds_admission_budget(monkeypatch):
+    monkeypatch.setenv("ADMISSION_CPU_BUDGET", "8")
+    monkeypatch.setenv("ADMISSION_DEFER_SECONDS", "45")
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.sqs_consumer.parse_message.side_effect = lambda message: _message_body(1)
+    worker_instance.processing_gateway = Mock()
+    worker_instance.processing_gateway.probe_video.return_value = VideoProbe(
+        duration_seconds=3600, width=3840, height=2160, codec="h264"
+    )
+    executor = Mock()
+
+    worker_instance.admission.try_admit("running", JobCost(cpu=5))
+    worker_instance._dispatch_batch(executor, [_sqs_message("1")])
+
+    executor.submit.assert_not_called()
+    worker_instance.processing_gateway.probe_video.assert_called_once_with("uploads/video.mp4")
+    worker_instance.sqs_consumer.defer_message.assert_called_once_with("rh-1", 45)
+    worker_instance.sqs_consumer.untrack_in_flight.assert_called_once_with("rh-1")
+    assert "1" not in worker_instance._in_flight
+
+    # Mensagem já entregue muitas vezes é admitida mesmo acima do orçamento
+    redelivered = dict(_sqs_message("2"), Attributes={"ApproximateReceiveCount": "11"})
+    worker_instance._dispatch_batch(executor, [redelivered])
+
+    executor.submit.assert_called_once()
+    assert worker_instance.admission.usage().cpu > 8
+
+
+def test_dispatch_admits_unknown_cost_even_when_node_is_over_budget(monkeypatch):
+    monkeypatch.setenv("ADMISSION_CPU_BUDGET", "10")
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.sqs_consumer.parse_message.side_effect = lambda message: _message_body(message["MessageId"])
+    worker_instance.processing_gateway = Mock()
+    tracked_while_probing = []
+
+    def _probe(_source):
+        tracked_while_probing.append(worker_instance.sqs_consumer.track_in_flight.call_count)
+        return None
+
+    worker_instance.processing_gateway.probe_video.side_effect = _probe
+    executor = Mock()
+
+    worker_instance.admission.try_admit("running", JobCost(cpu=15), force=True)
+    worker_instance._dispatch_batch(executor, [_sqs_message("1"), _sqs_message("2")])
+
+    assert executor.submit.call_count == 2
+    worker_instance.sqs_consumer.defer_message.assert_not_called()
+    # O heartbeat já cobre o lote inteiro enquanto os ffprobe rodam
+    assert tracked_while_probing == [2, 2]
+
+
+@patch("worker.SessionLocal")
+@patch("worker.VideoLeaseDAO")
+def test_dispatch_returns_message_and_lease_when_admission_fails(mock_lease_dao_cls, mock_session_local, monkeypatch):
+    monkeypatch.setenv("ADMISSION_CPU_BUDGET", "10")
+    monkeypatch.setenv("VIDEO_LEASE_ENABLED", "true")
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.sqs_consumer.parse_message.side_effect = lambda message: _message_body(message["MessageId"])
+    mock_lease_dao_cls.return_value.acquire.return_value = LeaseClaim(LEASE_ACQUIRED)
+    worker_instance._probe_message_cost = Mock(return_value=JobCost(cpu=1))
+    worker_instance.admission.try_admit = Mock(side_effect=[RuntimeError("boom"), True])
+    executor = Mock()
+
+    worker_instance._dispatch_batch(executor, [_sqs_message("1"), _sqs_message("2")])
+
+    # A falha de uma mensagem não derruba o restante do lote
+    executor.submit.assert_called_once()
+    worker_instance.sqs_consumer.release_message.assert_called_once_with("rh-1")
+    worker_instance.sqs_consumer.untrack_in_flight.assert_any_call("rh-1")
+    mock_lease_dao_cls.return_value.release.assert_called_once_with(1, worker_instance.lease_owner)
+    assert list(worker_instance._in_flight) == ["2"]
+
+
+@patch("worker.SessionLocal")
+@patch("worker.VideoLeaseDAO")
+def test_claim_message_drops_or_defers_duplicate_deliveries(mock_lease_dao_cls, mock_session_local, monkeypatch):
+    monkeypatch.setenv("VIDEO_LEASE_ENABLED", "true")
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    lease_dao = mock_lease_dao_cls.return_value
+
+    lease_dao.acquire.return_value = LeaseClaim(LEASE_COMPLETED, 3000)
+    assert worker_instance._claim_message(_sqs_message("1"), _message_body(1)) is False
+    worker_instance.sqs_consumer.buffer_delete.assert_called_once_with("rh-1")
+
+    lease_dao.acquire.return_value = LeaseClaim(LEASE_BUSY, 120)
+    assert worker_instance._claim_message(_sqs_message("2"), _message_body(1)) is False
+    worker_instance.sqs_consumer.defer_message.assert_called_once_with("rh-2", 120)
+
+    lease_dao.acquire.return_value = LeaseClaim(LEASE_ACQUIRED)
+    assert worker_instance._claim_message(_sqs_message("3"), _message_body(1)) is True
+    lease_dao.acquire.assert_called_with(1, worker_instance.lease_owner)
+
+    # O lease é concluído antes de a mensagem ser removida
+    worker_instance._finish_message(_sqs_message("3"), True)
+    lease_dao.complete.assert_called_once_with(1, worker_instance.lease_owner)
+    worker_instance.sqs_consumer.buffer_delete.assert_called_with("rh-3")
+
+
+def test_finish_message_deletes_only_after_status_is_flushed(monkeypatch):
+    monkeypatch.setenv("STATUS_WRITER_ENABLED", "true")
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.status_writer = Mock()
+    updates = [VideoStatusUpdate(1, 1, "outputs/frames_1.zip")]
+
+    worker_instance._finish_message(_sqs_message("1"), True, updates)
+
+    worker_instance.sqs_consumer.buffer_delete.assert_not_called()
+    submitted, on_flushed = worker_instance.status_writer.submit.call_args.args
+    assert submitted == updates
+
+    on_flushed(True)
+    worker_instance.sqs_consumer.buffer_delete.assert_called_once_with("rh-1")
+
+    # Se o status não foi gravado, a mensagem volta para a fila
+    worker_instance._finish_message(_sqs_message("2"), True, updates)
+    worker_instance.status_writer.submit.call_args.args[1](False)
+    worker_instance.sqs_consumer.release_message.assert_called_once_with("rh-2")
+
+
+@patch("worker.SessionLocal")
+@patch("worker.ProcessVideoUseCase")
+def test_run_job_collects_status_updates_for_the_writer(mock_use_case_cls, mock_session_local, monkeypatch):
+    monkeypatch.setenv("STATUS_WRITER_ENABLED", "true")
+    worker_instance = worker.VideoWorker()
+
+    def _execute(video_id, **kwargs):
+        mock_use_case_cls.call_args.kwargs["video_dao"].update_video_status(video_id=video_id, status=1)
+
+    mock_use_case_cls.return_value.execute.side_effect = _execute
+
+    result = worker_instance._run_job(_message_body(1))
+
+    assert result.success is True
+    assert result.status_updates == [VideoStatusUpdate(1, 1)]
+    assert result.metrics is None
+
+
+@patch("worker.VideoProgressDAO")
+@patch("worker.SessionLocal")
+def test_report_progress_is_optional_and_never_raises(mock_session_local, mock_progress_dao_cls, monkeypatch):
+    progress = worker.ExtractionProgress(frames=3, processed_seconds=3.0, duration_seconds=6.0)
+
+    assert worker.VideoWorker()._build_use_case(Mock()).on_progress is None
+
+    monkeypatch.setenv("VIDEO_PROGRESS_ENABLED", "true")
+    use_case = worker.VideoWorker()._build_use_case(Mock())
+    use_case.on_progress("12", progress)
+
+    mock_progress_dao_cls.return_value.save_progress.assert_called_once_with(12, progress)
+
+    mock_progress_dao_cls.return_value.save_progress.side_effect = RuntimeError("db down")
+    use_case.on_progress("12", progress)
+
+
+def _join_drain_thread():
+    for thread in threading.enumerate():
+        if thread.name == "worker-drain":
+            thread.join(timeout=5)
+
+
+def test_run_pool_releases_messages_received_after_sigterm(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "2")
+    monkeypatch.setenv("WORKER_POOL_MODE", "thread")
+    monkeypatch.setattr(worker.os, "_exit", Mock())
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+
+    def _receive(wait_time=20, max_messages=10):
+        worker_instance.request_drain()
+        return [_sqs_message("1"), _sqs_message("2")]
+
+    worker_instance.sqs_consumer.receive_messages.side_effect = _receive
+    worker_instance.process_message = Mock()
+
+    worker_instance.run()
+    _join_drain_thread()
+
+    assert worker_instance.sqs_consumer.receive_messages.call_count == 1
+    worker_instance.process_message.assert_not_called()
+    assert [c.args for c in worker_instance.sqs_consumer.release_message.call_args_list] == [("rh-1",), ("rh-2",)]
+    worker_instance.sqs_consumer.stop_polling.assert_called()
+    worker_instance.sqs_consumer.flush_deletes.assert_called()
+    worker.os._exit.assert_not_called()
+
+
+def test_drain_lets_running_job_finish_within_grace_period(monkeypatch):
+    monkeypatch.setenv("WORKER_DRAIN_GRACE_SECONDS", "5")
+    monkeypatch.setattr(worker.os, "_exit", Mock())
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    message = _sqs_message("1")
+    worker_instance._add_in_flight(message)
+
+    worker_instance.request_drain()
+    threading.Timer(0.1, lambda: worker_instance._take_in_flight(message)).start()
+    _join_drain_thread()
+
+    worker_instance.sqs_consumer.stop_polling.assert_called_once()
+    worker_instance.sqs_consumer.release_message.assert_not_called()
+    worker.os._exit.assert_not_called()
+
+
+def test_drain_releases_unfinished_jobs_and_removes_their_files(monkeypatch, tmp_path):
+    monkeypatch.setenv("WORKER_DRAIN_GRACE_SECONDS", "0.05")
+    monkeypatch.setattr(worker.os, "_exit", Mock())
+
+    worker_instance = worker.VideoWorker()
+    worker_instance.sqs_consumer = Mock()
+    worker_instance.sqs_consumer.parse_message.return_value = _message_body(1)
+    worker_instance.uploads_dir = tmp_path / "uploads"
+    worker_instance.processing_gateway = Mock(temp_dir=tmp_path / "temp")
+    job_temp = tmp_path / "temp" / "20260218_120000"
+    job_temp.mkdir(parents=True)
+    (job_temp / "frame_0001.png").write_bytes(b"img")
+    worker_instance.uploads_dir.mkdir()
+    (worker_instance.uploads_dir / "20260218_120000_video.mp4").write_bytes(b"video")
+    (worker_instance.uploads_dir / "20260218_130000_other.mp4").write_bytes(b"video")
+    message = _sqs_message("1")
+    worker_instance._add_in_flight(message)
+
+    worker_instance.request_drain()
+    _join_drain_thread()
+
+    worker_instance.sqs_consumer.untrack_in_flight.assert_called_once_with("rh-1")
+    worker_instance.sqs_consumer.release_message.assert_called_once_with("rh-1")
+    worker_instance.sqs_consumer.flush_deletes.assert_called_once()
+    worker.os._exit.assert_called_once_with(0)
+    worker_instance.processing_gateway.terminate_ffmpeg.assert_called_once()
+    assert not job_temp.exists()
+    assert [p.name for p in worker_instance.uploads_dir.iterdir()] == ["20260218_130000_other.mp4"]
+    # O job que terminar depois do prazo não mexe mais na mensagem
+    assert worker_instance._take_in_flight(message) is False
+
+
+def test_abandon_signals_pool_children_and_kills_the_ones_that_hang(monkeypatch):
+    worker_instance = worker.VideoWorker()
+    exited = Mock(pid=101)
+    exited.is_alive.return_value = False
+    hung = Mock(pid=102)
+    hung.is_alive.return_value = True
+
+    with patch.object(worker.multiprocessing, "active_children", return_value=[exited, hung]), patch.object(
+        worker.os, "kill"
+    ) as kill:
+        worker_instance._stop_pool_processes()
+
+    assert [c.args for c in kill.call_args_list] == [(101, worker.POOL_ABANDON_SIGNAL), (102, worker.POOL_ABANDON_SIGNAL)]
+    exited.kill.assert_not_called()
+    hung.kill.assert_called_once()
+
+
+def test_pool_child_stops_its_ffmpeg_and_uploads_when_abandoned(monkeypatch):
+    pool_worker = worker.VideoWorker()
+    pool_worker.processing_gateway = Mock()
+    pool_worker.s3_gateway = Mock()
+    monkeypatch.setattr(worker, "_pool_worker", pool_worker)
+    monkeypatch.setattr(worker.os, "_exit", Mock())
+
+    worker._abandon_pool_job(worker.POOL_ABANDON_SIGNAL, None)
+
+    pool_worker.processing_gateway.terminate_ffmpeg.assert_called_once()
+    pool_worker.s3_gateway.abort_uploads.assert_called_once()
+    worker.os._exit.assert_called_once_with(0)
@@ -1,30 +1,177 @@
+import time
+
+# Marca o início dos imports para o modo --measure-startup
+_IMPORTS_STARTED_AT = time.perf_counter()
+
+import asyncio
+import glob
 import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+from app.infrastructure.admission import AdmissionController, JobCost, estimate_job_cost
+from app.infrastructure.cache.source_video_cache import SourceLease, SourceVideoCache
+from app.infrastructure.db import database
 from app.infrastructure.db.database import SessionLocal
-from app.infrastructure.queue.sqs_consumer import SQSConsumer
+from app.infrastructure.metrics import (
+    DUPLICATE_MESSAGES,
+    JOBS_DEFERRED,
+    JOBS_FINISHED,
+    REGISTRY,
+    start_metrics_server,
+    track_stage,
+)
+from app.infrastructure.queue.sqs_consumer import MAX_BATCH_SIZE, SQSConsumer
+from app.dao.result_cache_dao import ResultCacheDAO
 from app.dao.video_dao import VideoDAO
-from app.gateways.video_processing_gateway import VideoProcessingGateway
+from app.dao.video_lease_dao import LEASE_COMPLETED, VideoLeaseDAO
+from app.dao.video_progress_dao import VideoProgressDAO
+from app.dao.video_status_writer import DeferredVideoDAO, VideoStatusWriter
+from app.entities.video import ExtractionProgress, FailureNotification, ProcessingMessage, VideoStatusUpdate
+from app.gateways.video_processing_gateway import FFMPEG_TERMINATE_GRACE_SECONDS, VideoProcessingGateway
 from app.gateways.s3_gateway import S3Gateway
-from app.gateways.notification_gateway import NotificationGateway
+from app.gateways.notification_gateway import DeferredNotificationGateway, NotificationGateway
 from app.use_cases.process_video_use_case import ProcessVideoUseCase
 
+_IMPORTS_FINISHED_AT = time.perf_counter()
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+POOL_MODE_PROCESS = "process"
+POOL_MODE_THREAD = "thread"
+RUNTIME_SYNC = "sync"
+RUNTIME_ASYNC = "async"
+# Visibilidade máxima aceita pelo SQS
+MAX_VISIBILITY_SECONDS = 43200
+DRAIN_CHECK_INTERVAL_SECONDS = 1.0
+# Sinal com que o processo principal manda os processos do pool abandonarem o job no fim do dreno;
+# o SIGTERM segue ignorado por eles durante o prazo
+POOL_ABANDON_SIGNAL = signal.SIGUSR1
+# Prazo para um processo do pool encerrar o FFmpeg e abortar uploads antes do SIGKILL
+POOL_ABANDON_TIMEOUT_SECONDS = FFMPEG_TERMINATE_GRACE_SECONDS + 10.0
+
+
+def _resolve_concurrency() -> int:
+    raw_value = os.getenv("WORKER_CONCURRENCY", "1").strip().lower()
+    if raw_value == "auto":
+        return os.cpu_count() or 1
+
+    try:
+        return max(1, int(raw_value))
+    except ValueError:
+        logger.warning(f"WORKER_CONCURRENCY inválido ({raw_value}), usando 1")
+        return 1
+
+
+def _resolve_pool_mode() -> str:
+    pool_mode = os.getenv("WORKER_POOL_MODE", POOL_MODE_PROCESS).strip().lower()
+    if pool_mode not in (POOL_MODE_PROCESS, POOL_MODE_THREAD):
+        logger.warning(f"WORKER_POOL_MODE inválido ({pool_mode}), usando {POOL_MODE_PROCESS}")
+        return POOL_MODE_PROCESS
+    return pool_mode
+
+
+def _resolve_runtime() -> str:
+    runtime = os.getenv("WORKER_RUNTIME", RUNTIME_SYNC).strip().lower()
+    if runtime not in (RUNTIME_SYNC, RUNTIME_ASYNC):
+        logger.warning(f"WORKER_RUNTIME inválido ({runtime}), usando {RUNTIME_SYNC}")
+        return RUNTIME_SYNC
+    return runtime
+
+
+@dataclass(frozen=True)
+class JobResult:
+    success: bool
+    status_updates: Optional[List[VideoStatusUpdate]] = None
+    # Preenchidos apenas pelos processos do pool, que devolvem métricas e falhas do job ao pai
+    metrics: Optional[dict] = None
+    notifications: Optional[List[FailureNotification]] = None
+
+
+_pool_worker: Optional["VideoWorker"] = None
+
+
+def _ignore_sigterm(_signum, _frame) -> None:
+    pass
+
+
+def _abandon_pool_job(_signum, _frame) -> None:
+    # A mensagem e os arquivos do job ficam com o processo principal; aqui só o que é deste processo
+    _pool_worker._stop_job_processes()
+    os._exit(0)
+
+
+def _init_pool_process(secret_cache: dict) -> None:
+    global _pool_worker
+    # Durante o dreno quem decide o fim dos jobs é o processo principal; o handler (em vez de
+    # SIG_IGN) não é herdado pelo FFmpeg no exec
+    signal.signal(signal.SIGTERM, _ignore_sigterm)
+    signal.signal(POOL_ABANDON_SIGNAL, _abandon_pool_job)
+    database.seed_secret_cache(secret_cache)
+    _pool_worker = VideoWorker()
+
+
+def _process_message_in_pool(message_body: dict) -> JobResult:
+    # Métricas, atualizações de status e falhas do processo filho voltam junto com o resultado para o pai
+    result = _pool_worker._run_job(message_body, defer_notifications=True)
+    return JobResult(result.success, result.status_updates, REGISTRY.drain(), result.notifications)
+
 
 class VideoWorker:
     def __init__(self):
         self.sqs_consumer = SQSConsumer()
+        self.concurrency = _resolve_concurrency()
+        self.pool_mode = _resolve_pool_mode()
+        self.runtime = _resolve_runtime()
+        self.async_pollers = max(1, int(os.getenv("WORKER_ASYNC_POLLERS", "2")))
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, Dict[str, Any]] = {}
+        self._slots_changed = threading.Condition()
+        self.drain_grace_seconds = float(os.getenv("WORKER_DRAIN_GRACE_SECONDS", "25"))
+        self._draining = threading.Event()
+        self._drain_deadline = 0.0
         self.base_dir = Path(__file__).resolve().parents[0]
         self.uploads_dir = self.base_dir / "uploads"
         self.uploads_dir.mkdir(parents=True, exist_ok=True)
-        self.processing_gateway = VideoProcessingGateway(base_dir=self.base_dir)
         self.s3_gateway = S3Gateway(base_dir=self.base_dir)
+        self.processing_gateway = VideoProcessingGateway(base_dir=self.base_dir, s3_gateway=self.s3_gateway)
+        self.stream_s3_input = os.getenv("S3_STREAMING_INPUT", "false").lower() == "true"
+        self.result_cache_enabled = os.getenv("RESULT_CACHE_ENABLED", "false").lower() == "true"
+        self.source_cache: Optional[SourceVideoCache] = None
+        source_cache_mb = int(os.getenv("SOURCE_CACHE_MAX_MB", "0"))
+        if source_cache_mb > 0:
+            self.source_cache = SourceVideoCache(self.uploads_dir / "cache", source_cache_mb * 1024 * 1024)
         self.notification_gateway = NotificationGateway()
+        self.metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        self.admission = AdmissionController.from_env()
+        self.admission_defer_seconds = int(os.getenv("ADMISSION_DEFER_SECONDS", "30"))
+        self.admission_max_deferrals = int(os.getenv("ADMISSION_MAX_DEFERRALS", "10"))
+        self._probe_executor: Optional[ThreadPoolExecutor] = None
+        self.lease_enabled = os.getenv("VIDEO_LEASE_ENABLED", "false").lower() == "true"
+        self.lease_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # MessageId -> video_id dos leases adquiridos por este worker
+        self._leases: Dict[str, int] = {}
+        self._leases_lock = threading.Lock()
+        if self.lease_enabled:
+            self.sqs_consumer.add_heartbeat_listener(self._renew_leases)
+        self.progress_enabled = os.getenv("VIDEO_PROGRESS_ENABLED", "false").lower() == "true"
+        self.status_writer: Optional[VideoStatusWriter] = None
+        if os.getenv("STATUS_WRITER_ENABLED", "false").lower() == "true":
+            self.status_writer = VideoStatusWriter(SessionLocal)
 
     @staticmethod
     def _extract_s3_key(video_path: str, explicit_s3_key: Optional[str] = None) -> Optional[str]:
@@ -55,10 +202,117 @@ class VideoWorker:
             raise RuntimeError(f"Falha ao baixar vídeo do S3 para processamento: {resolved_s3_key}")
 
         return str(local_path)
+
+    def _acquire_local_video(
+        self, video_path: str, timestamp: str, s3_key: Optional[str] = None
+    ) -> Tuple[str, Optional[SourceLease]]:
+        resolved_s3_key = self._extract_s3_key(video_path, s3_key)
+
+        with track_stage("download"):
+            if self.source_cache is not None and resolved_s3_key:
+                version = self.s3_gateway.get_object_fingerprint(resolved_s3_key)
+                if version:
+                    lease = self.source_cache.acquire(
+                        resolved_s3_key,
+                        version,
+                        lambda local_path: self.s3_gateway.download_video(resolved_s3_key, local_path),
+                    )
+                    return str(lease.path), lease
+
+            return self._ensure_local_video_path(video_path=video_path, timestamp=timestamp, s3_key=s3_key), None
+
+    def _release_local_video(
+        self, processing_video_path: Optional[str], source_lease: Optional[SourceLease], message_body: dict
+    ) -> None:
+        # Vídeos do cache são mantidos para reentregas; downloads avulsos são apagados
+        if source_lease is not None:
+            source_lease.release()
+        elif processing_video_path and processing_video_path != message_body.get("video_path"):
+            Path(processing_video_path).unlink(missing_ok=True)
+
+    def _open_video_stream(self, video_path: str, s3_key: Optional[str] = None):
+        resolved_s3_key = self._extract_s3_key(video_path, s3_key)
+
+        if not self.stream_s3_input or not resolved_s3_key:
+            return None
+
+        if not self.s3_gateway.is_streamable(resolved_s3_key):
+            logger.info(f"Container de {resolved_s3_key} exige busca; usando download completo")
+            return None
+
+        return self.s3_gateway.open_video_stream(resolved_s3_key)
         
-    def process_message(self, message_body: dict) -> bool:
+    @staticmethod
+    def _has_required_fields(message_body: dict) -> bool:
+        return all([
+            message_body.get("video_id"),
+            message_body.get("video_path"),
+            message_body.get("timestamp"),
+        ])
+
+    def _build_use_case(
+        self,
+        db,
+        status_updates: Optional[List[VideoStatusUpdate]] = None,
+        notifications: Optional[List[FailureNotification]] = None,
+    ) -> ProcessVideoUseCase:
+        video_dao = VideoDAO(db)
+        if status_updates is not None:
+            video_dao = DeferredVideoDAO(video_dao, status_updates)
+        notification_gateway = self.notification_gateway
+        if notifications is not None:
+            notification_gateway = DeferredNotificationGateway(notifications)
+        return ProcessVideoUseCase(
+            processing_gateway=self.processing_gateway,
+            video_dao=video_dao,
+            s3_gateway=self.s3_gateway,
+            notification_gateway=notification_gateway,
+            result_cache=ResultCacheDAO(db) if self.result_cache_enabled else None,
+            on_progress=self._report_progress if self.progress_enabled else None,
+        )
+
+    @staticmethod
+    def _report_progress(video_id: int, progress: ExtractionProgress) -> None:
+        # Chamado pelas threads que leem o FFmpeg: sessão própria, fora da sessão do job
+        try:
+            with SessionLocal() as db:
+                VideoProgressDAO(db).save_progress(int(video_id), progress)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o progresso do vídeo {video_id}: {str(e)}")
+
+    def _run_job(self, message_body: dict, defer_notifications: bool = False) -> JobResult:
+        # Com o status writer, o status do vídeo é gravado em lote depois do job
+        status_updates: Optional[List[VideoStatusUpdate]] = None if self.status_writer is None else []
+        if not defer_notifications:
+            if status_updates is None:
+                return JobResult(self.process_message(message_body))
+            return JobResult(self.process_message(message_body, status_updates=status_updates), status_updates)
+
+        notifications: List[FailureNotification] = []
+        success = self.process_message(message_body, status_updates=status_updates, notifications=notifications)
+        return JobResult(success, status_updates, notifications=notifications)
+
+    def process_message(
+        self,
+        message_body: dict,
+        status_updates: Optional[List[VideoStatusUpdate]] = None,
+        notifications: Optional[List[FailureNotification]] = None,
+    ) -> bool:
+        with track_stage("job"):
+            success = self._process_message(message_body, status_updates, notifications)
+        JOBS_FINISHED.inc(result="success" if success else "failure")
+        return success
+
+    def _process_message(
+        self,
+        message_body: dict,
+        status_updates: Optional[List[VideoStatusUpdate]] = None,
+        notifications: Optional[List[FailureNotification]] = None,
+    ) -> bool:
         success = False
         processing_video_path: Optional[str] = None
+        source_lease: Optional[SourceLease] = None
+        input_stream = None
         db = None
 
         try:
@@ -67,30 +321,38 @@ class VideoWorker:
             timestamp = message_body.get("timestamp")
             s3_key = message_body.get("s3_key")
             
-            if not all([video_id, video_path, timestamp]):
+            if not self._has_required_fields(message_body):
                 logger.error(f"Mensagem inválida: faltam campos obrigatórios. Mensagem: {message_body}")
                 return False
 
-            processing_video_path = self._ensure_local_video_path(
-                video_path=video_path,
-                timestamp=timestamp,
-                s3_key=s3_key,
-            )
-            
+            processing_message = ProcessingMessage.from_dict(message_body)
+            options = processing_message.options
             db = SessionLocal()
+            use_case = self._build_use_case(db, status_updates, notifications)
 
-            video_dao = VideoDAO(db)
-            use_case = ProcessVideoUseCase(
-                processing_gateway=self.processing_gateway,
-                video_dao=video_dao,
-                s3_gateway=self.s3_gateway,
-                notification_gateway=self.notification_gateway,
-            )
+            # Com ETag no S3 o cache é consultado antes de baixar o vídeo
+            content_key = None
+            resolved_s3_key = self._extract_s3_key(video_path, s3_key)
+            if self.result_cache_enabled and resolved_s3_key:
+                content_key = use_case.resolve_content_key(video_path, resolved_s3_key, options)
+                if use_case.reuse_cached_result(video_id, content_key):
+                    return True
+
+            input_stream = self._open_video_stream(video_path, s3_key)
+
+            if input_stream is None:
+                processing_video_path, source_lease = self._acquire_local_video(video_path, timestamp, s3_key)
+            else:
+                processing_video_path = video_path
 
             use_case.execute(
                 video_id=video_id,
                 video_path=processing_video_path,
-                timestamp=timestamp
+                timestamp=timestamp,
+                input_stream=input_stream,
+                content_key=content_key,
+                options=options,
+                user_id=processing_message.user_id,
             )
             logger.info(f"Vídeo {video_id} processado com sucesso")
             success = True
@@ -102,48 +364,707 @@ class VideoWorker:
             if db is not None:
                 db.close()
 
-            if processing_video_path and processing_video_path != message_body.get("video_path"):
-                local_file = Path(processing_video_path)
-                if local_file.exists():
-                    local_file.unlink()
+            if input_stream is not None:
+                input_stream.close()
+
+            self._release_local_video(processing_video_path, source_lease, message_body)
 
         return success
 
+    async def process_message_async(
+        self, message_body: dict, status_updates: Optional[List[VideoStatusUpdate]] = None
+    ) -> bool:
+        with track_stage("job"):
+            success = await self._process_message_async(message_body, status_updates)
+        JOBS_FINISHED.inc(result="success" if success else "failure")
+        return success
+
+    async def _process_message_async(
+        self, message_body: dict, status_updates: Optional[List[VideoStatusUpdate]] = None
+    ) -> bool:
+        success = False
+        processing_video_path: Optional[str] = None
+        source_lease: Optional[SourceLease] = None
+        db = None
+
+        try:
+            video_id = message_body.get("video_id")
+            video_path = message_body.get("video_path")
+            timestamp = message_body.get("timestamp")
+            s3_key = message_body.get("s3_key")
+
+            if not self._has_required_fields(message_body):
+                logger.error(f"Mensagem inválida: faltam campos obrigatórios. Mensagem: {message_body}")
+                return False
+
+            processing_message = ProcessingMessage.from_dict(message_body)
+            options = processing_message.options
+            db = SessionLocal()
+            use_case = await asyncio.to_thread(self._build_use_case, db, status_updates)
+
+            content_key = None
+            resolved_s3_key = self._extract_s3_key(video_path, s3_key)
+            if self.result_cache_enabled and resolved_s3_key:
+                content_key = await asyncio.to_thread(
+                    use_case.resolve_content_key, video_path, resolved_s3_key, options
+                )
+                if await asyncio.to_thread(use_case.reuse_cached_result, video_id, content_key):
+                    return True
+
+            processing_video_path, source_lease = await asyncio.to_thread(
+                self._acquire_local_video, video_path, timestamp, s3_key
+            )
+
+            await use_case.execute_async(
+                video_id=video_id,
+                video_path=processing_video_path,
+                timestamp=timestamp,
+                content_key=content_key,
+                options=options,
+                user_id=processing_message.user_id,
+            )
+            logger.info(f"Vídeo {video_id} processado com sucesso")
+            success = True
+
+        except Exception as e:
+            logger.error(f"Erro ao processar mensagem: {str(e)}", exc_info=True)
+
+        finally:
+            if db is not None:
+                await asyncio.to_thread(db.close)
+
+            await asyncio.to_thread(self._release_local_video, processing_video_path, source_lease, message_body)
+
+        return success
+
+    def _finish_message(
+        self, message: Dict[str, Any], success: bool, status_updates: Optional[List[VideoStatusUpdate]] = None
+    ) -> None:
+        if self.status_writer is not None and status_updates:
+            # A mensagem só é removida depois que o status do vídeo foi gravado; se a gravação
+            # falhar, ela volta para a fila e o job é refeito
+            self.status_writer.submit(
+                status_updates, lambda flushed: self._settle_message(message, success and flushed)
+            )
+            return
+        self._settle_message(message, success)
+
+    def _settle_message(self, message: Dict[str, Any], success: bool) -> None:
+        # O lease é concluído antes da remoção da mensagem: uma duplicata nunca encontra o vídeo sem dono
+        self._finish_lease(message, success)
+        if success:
+            self.sqs_consumer.buffer_delete(message['ReceiptHandle'])
+        else:
+            logger.warning(f"Erro ao processar mensagem {message['MessageId']}")
+            self.sqs_consumer.release_message(message['ReceiptHandle'])
+
+    def _discard_invalid_message(self, message: Dict[str, Any], message_body: Optional[dict]) -> bool:
+        if message_body and self._has_required_fields(message_body):
+            try:
+                ProcessingMessage.from_dict(message_body)
+                return False
+            except ValueError as e:
+                logger.error(f"Mensagem inválida: {str(e)}. Mensagem: {message_body}")
+        elif message_body:
+            logger.error(f"Mensagem inválida: faltam campos obrigatórios. Mensagem: {message_body}")
+        self.sqs_consumer.buffer_delete(message['ReceiptHandle'])
+        return True
+
+    def _claim_message(self, message: Dict[str, Any], message_body: dict) -> bool:
+        if not self.lease_enabled:
+            return True
+
+        video_id = message_body.get("video_id")
+        try:
+            video_id = int(video_id)
+            with SessionLocal() as db:
+                claim = VideoLeaseDAO(db).acquire(video_id, self.lease_owner)
+        except Exception as e:
+            logger.warning(f"Não foi possível adquirir o lease do vídeo {video_id}; processando sem lease: {str(e)}")
+            return True
+
+        if claim.acquired:
+            with self._leases_lock:
+                self._leases[message['MessageId']] = video_id
+            return True
+
+        # Sem slot, a mensagem sai do heartbeat antes de ser removida ou adiada
+        self.sqs_consumer.untrack_in_flight(message['ReceiptHandle'])
+        if claim.state == LEASE_COMPLETED:
+            logger.info(f"Mensagem {message['MessageId']} duplicada: vídeo {video_id} já processado, descartando")
+            DUPLICATE_MESSAGES.inc(action="dropped")
+            self.sqs_consumer.buffer_delete(message['ReceiptHandle'])
+            return False
+
+        # Outro worker está com o vídeo: a mensagem volta quando o lease dele expirar
+        delay = min(claim.retry_after_seconds, MAX_VISIBILITY_SECONDS)
+        logger.info(
+            f"Mensagem {message['MessageId']} duplicada: vídeo {video_id} em processamento "
+            f"em outro worker, nova tentativa em {delay}s"
+        )
+        DUPLICATE_MESSAGES.inc(action="deferred")
+        self.sqs_consumer.defer_message(message['ReceiptHandle'], delay)
+        return False
+
+    def _finish_lease(self, message: Dict[str, Any], success: bool) -> None:
+        with self._leases_lock:
+            video_id = self._leases.pop(message['MessageId'], None)
+        if video_id is None:
+            return
+
+        try:
+            with SessionLocal() as db:
+                lease_dao = VideoLeaseDAO(db)
+                if success:
+                    lease_dao.complete(video_id, self.lease_owner)
+                else:
+                    lease_dao.release(video_id, self.lease_owner)
+        except Exception as e:
+            logger.warning(f"Não foi possível encerrar o lease do vídeo {video_id}: {str(e)}")
+
+    def _renew_leases(self) -> None:
+        with self._leases_lock:
+            if not self._leases:
+                return
+
+        with SessionLocal() as db:
+            lease_dao = VideoLeaseDAO(db)
+            lease_dao.renew(self.lease_owner)
+            lease_dao.purge_expired()
+
+    def _probe_message_cost(self, message_body: dict) -> Optional[JobCost]:
+        processing_message = ProcessingMessage.from_dict(message_body)
+        s3_key = self._extract_s3_key(processing_message.video_path, processing_message.s3_key)
+        source = self.s3_gateway.presigned_url(s3_key) if s3_key else processing_message.video_path
+        probe = self.processing_gateway.probe_video(source) if source else None
+        if probe is None:
+            return None
+        return estimate_job_cost(probe, processing_message.options)
+
+    def _probe_costs(self, accepted: List[Tuple[Dict[str, Any], dict]]) -> Dict[str, Optional[JobCost]]:
+        # Os ffprobe do lote rodam em paralelo: o lote espera pelo mais lento, e não pela soma
+        if not self.admission.enabled or not accepted:
+            return {}
+        if self._probe_executor is None:
+            self._probe_executor = ThreadPoolExecutor(max_workers=MAX_BATCH_SIZE, thread_name_prefix="ffprobe")
+
+        futures = {
+            message['MessageId']: self._probe_executor.submit(self._probe_message_cost, message_body)
+            for message, message_body in accepted
+        }
+        costs: Dict[str, Optional[JobCost]] = {}
+        for message_id, future in futures.items():
+            try:
+                costs[message_id] = future.result()
+            except Exception as e:
+                logger.warning(f"Falha ao estimar o custo da mensagem {message_id}: {str(e)}")
+                costs[message_id] = None
+        return costs
+
+    def _admit_message(self, message: Dict[str, Any], cost: Optional[JobCost]) -> bool:
+        if not self.admission.enabled:
+            return True
+
+        if cost is None:
+            logger.warning(f"Custo da mensagem {message['MessageId']} desconhecido; admitindo sem estimativa")
+            self.admission.try_admit(message['MessageId'], None, force=True)
+            return True
+
+        # Após muitas entregas a mensagem é admitida de qualquer forma, antes de chegar à DLQ
+        receive_count = int(message.get('Attributes', {}).get('ApproximateReceiveCount', 1))
+        force = receive_count > self.admission_max_deferrals
+        if self.admission.try_admit(message['MessageId'], cost, force=force):
+            logger.info(
+                f"Mensagem {message['MessageId']} admitida: CPU {cost.cpu:.2f}, "
+                f"disco {cost.disk_bytes / 1024 / 1024:.0f} MB"
+            )
+            return True
+
+        usage = self.admission.usage()
+        logger.info(
+            f"Mensagem {message['MessageId']} adiada por {self.admission_defer_seconds}s: custo "
+            f"CPU {cost.cpu:.2f}/disco {cost.disk_bytes / 1024 / 1024:.0f} MB não cabe no orçamento "
+            f"(em uso CPU {usage.cpu:.2f}/disco {usage.disk_bytes / 1024 / 1024:.0f} MB)"
+        )
+        JOBS_DEFERRED.inc()
+        self.sqs_consumer.untrack_in_flight(message['ReceiptHandle'])
+        self.sqs_consumer.defer_message(message['ReceiptHandle'], self.admission_defer_seconds)
+        return False
+
+    def _accept_message(self, message: Dict[str, Any]) -> Optional[dict]:
+        logger.info(f"Mensagem recebida: {message['MessageId']}")
+        message_body = self.sqs_consumer.parse_message(message)
+
+        if self._discard_invalid_message(message, message_body):
+            return None
+        if not self._claim_message(message, message_body):
+            return None
+        return message_body
+
+    def _admit_batch(self, messages: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], dict]]:
+        # O heartbeat cobre o lote inteiro enquanto as mensagens passam por validação, lease e ffprobe
+        for message in messages:
+            self.sqs_consumer.track_in_flight(message['ReceiptHandle'])
+
+        accepted: List[Tuple[Dict[str, Any], dict]] = []
+        for message in messages:
+            try:
+                message_body = self._accept_message(message)
+            except Exception as e:
+                logger.error(f"Erro ao preparar a mensagem {message['MessageId']}: {str(e)}", exc_info=True)
+                self._return_message(message)
+                continue
+            if message_body is None:
+                self.sqs_consumer.untrack_in_flight(message['ReceiptHandle'])
+            else:
+                accepted.append((message, message_body))
+
+        costs = self._probe_costs(accepted)
+        admitted: List[Tuple[Dict[str, Any], dict]] = []
+        for message, message_body in accepted:
+            try:
+                if self._admit_message(message, costs.get(message['MessageId'])):
+                    admitted.append((message, message_body))
+                else:
+                    self._finish_lease(message, False)
+            except Exception as e:
+                logger.error(f"Erro na admissão da mensagem {message['MessageId']}: {str(e)}", exc_info=True)
+                self.admission.release(message['MessageId'])
+                self._return_message(message)
+        return admitted
+
+    def _return_message(self, message: Dict[str, Any]) -> None:
+        # Mensagem recebida que não chegou a um slot: volta para a fila na hora, sem o lease
+        self.sqs_consumer.untrack_in_flight(message['ReceiptHandle'])
+        self._finish_lease(message, False)
+        self.sqs_consumer.release_message(message['ReceiptHandle'])
+
+    def _return_admitted(self, admitted: List[Tuple[Dict[str, Any], dict]]) -> None:
+        for message, _ in admitted:
+            self.admission.release(message['MessageId'])
+            self._return_message(message)
+
+    def _create_executor(self):
+        if self.pool_mode == POOL_MODE_THREAD:
+            return ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="video-job")
+
+        try:
+            database.warm_up()
+        except Exception as e:
+            logger.warning(f"Não foi possível resolver a configuração do banco antes de criar o pool: {str(e)}")
+        # O pai já tem threads (heartbeat, remoções em lote, métricas): um fork herdaria locks
+        # possivelmente ocupados. Os filhos partem de um processo forkserver sem threads
+        return ProcessPoolExecutor(
+            max_workers=self.concurrency,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_init_pool_process,
+            initargs=(database.secret_cache_snapshot(),),
+        )
+
+    def _submit_job(self, executor, message_body: dict) -> Future:
+        if self.pool_mode == POOL_MODE_THREAD:
+            return executor.submit(self._run_job, message_body)
+        return executor.submit(_process_message_in_pool, message_body)
+
+    def _on_job_done(self, future: Future, message: Dict[str, Any]) -> None:
+        try:
+            result = future.result()
+            if result.metrics:
+                REGISTRY.merge(result.metrics)
+            self._send_notifications(result.notifications)
+        except Exception as e:
+            logger.error(f"Erro no slot de processamento da mensagem {message['MessageId']}: {str(e)}")
+            result = JobResult(False)
+
+        try:
+            self.sqs_consumer.untrack_in_flight(message['ReceiptHandle'])
+            if self._take_in_flight(message):
+                self._finish_message(message, result.success, result.status_updates)
+        finally:
+            self.admission.release(message['MessageId'])
+
+    def _send_notifications(self, notifications: Optional[List[FailureNotification]]) -> None:
+        for notification in notifications or []:
+            try:
+                self.notification_gateway.notify_processing_error(
+                    video_id=notification.video_id,
+                    error_message=notification.error_message,
+                    user_id=notification.user_id,
+                )
+            except Exception:
+                logger.warning("Falha ao enviar notificação de erro", exc_info=True)
+
+    def _add_in_flight(self, message: Dict[str, Any]) -> None:
+        with self._slots_changed:
+            self._in_flight[message['MessageId']] = message
+
+    def _take_in_flight(self, message: Dict[str, Any]) -> bool:
+        # Falso quando o dreno já devolveu a mensagem à fila: o resultado tardio é descartado
+        with self._slots_changed:
+            taken = self._in_flight.pop(message['MessageId'], None) is not None
+            self._slots_changed.notify_all()
+        return taken
+
+    def _wait_for_free_slot(self) -> int:
+        with self._slots_changed:
+            while len(self._in_flight) >= self.concurrency and not self._draining.is_set():
+                self._slots_changed.wait()
+            if self._draining.is_set():
+                return 0
+            return self.concurrency - len(self._in_flight)
+
+    def _dispatch_batch(self, executor, messages: List[Dict[str, Any]]):
+        if self._draining.is_set():
+            self._release_undispatched(messages)
+            return executor
+
+        admitted = self._admit_batch(messages)
+        for position, (message, message_body) in enumerate(admitted):
+            if self._draining.is_set():
+                self._return_admitted(admitted[position:])
+                break
+            executor = self._dispatch_message(executor, message, message_body)
+        return executor
+
+    def _dispatch_message(self, executor, message: Dict[str, Any], message_body: dict):
+        self._add_in_flight(message)
+
+        try:
+            future = self._submit_job(executor, message_body)
+        except Exception as e:
+            self._take_in_flight(message)
+            self._return_admitted([(message, message_body)])
+            if isinstance(e, BrokenProcessPool):
+                logger.error("Pool de processos quebrado, recriando slots de processamento")
+                executor.shutdown(wait=False)
+                return self._create_executor()
+            logger.error(f"Erro ao iniciar o job da mensagem {message['MessageId']}: {str(e)}", exc_info=True)
+            return executor
+
+        future.add_done_callback(lambda f, m=message: self._on_job_done(f, m))
+        return executor
+
+    def _run_pool(self):
+        logger.info(f"Modo concorrente ativo: {self.concurrency} slots ({self.pool_mode})")
+        executor = self._create_executor()
+
+        try:
+            while not self._draining.is_set():
+                try:
+                    free_slots = self._wait_for_free_slot()
+                    if not free_slots:
+                        continue
+
+                    messages = self.sqs_consumer.receive_messages(wait_time=20, max_messages=free_slots)
+
+                    if not messages:
+                        logger.debug("Nenhuma mensagem disponível na fila")
+                        continue
+
+                    executor = self._dispatch_batch(executor, messages)
+                except KeyboardInterrupt:
+                    logger.info("Worker interrompido pelo usuário")
+                    break
+                except Exception as e:
+                    logger.error(f"Erro no worker loop: {str(e)}", exc_info=True)
+                    time.sleep(5)
+        finally:
+            self.sqs_consumer.stop_polling()
+            executor.shutdown(wait=True)
+            self._flush_pending_work()
+
+    async def _reserve_async_slots(self) -> int:
+        # Bloqueia até haver ao menos um slot e reserva os demais livres (até o lote do SQS);
+        # durante o dreno não reserva nada
+        while True:
+            try:
+                await asyncio.wait_for(self._async_slots.acquire(), timeout=DRAIN_CHECK_INTERVAL_SECONDS)
+                break
+            except asyncio.TimeoutError:
+                if self._draining.is_set():
+                    return 0
+        if self._draining.is_set():
+            self._async_slots.release()
+            return 0
+        reserved = 1
+        while reserved < MAX_BATCH_SIZE and not self._async_slots.locked():
+            await self._async_slots.acquire()
+            reserved += 1
+        return reserved
+
+    def _release_async_slots(self, count: int) -> None:
+        for _ in range(count):
+            self._async_slots.release()
+
+    async def _run_job_async(self, message: Dict[str, Any], message_body: dict) -> None:
+        success = False
+        status_updates: Optional[List[VideoStatusUpdate]] = None
+        try:
+            if self.status_writer is None:
+                success = await self.process_message_async(message_body)
+            else:
+                status_updates = []
+                success = await self.process_message_async(message_body, status_updates=status_updates)
+        finally:
+            self.sqs_consumer.untrack_in_flight(message['ReceiptHandle'])
+            try:
+                if self._take_in_flight(message):
+                    await asyncio.to_thread(self._finish_message, message, success, status_updates)
+            finally:
+                self.admission.release(message['MessageId'])
+                self._release_async_slots(1)
+
+    async def _poll_once_async(self, jobs: set) -> None:
+        reserved = await self._reserve_async_slots()
+        if not reserved:
+            return
+        dispatched = 0
+
+        try:
+            messages = await asyncio.to_thread(
+                self.sqs_consumer.receive_messages, wait_time=20, max_messages=reserved
+            )
+
+            if not messages:
+                logger.debug("Nenhuma mensagem disponível na fila")
+                return
+            if self._draining.is_set():
+                await asyncio.to_thread(self._release_undispatched, messages)
+                return
+
+            # Validação, lease e ffprobe são bloqueantes: o lote passa por eles em uma thread
+            admitted = await asyncio.to_thread(self._admit_batch, messages)
+            for position, (message, message_body) in enumerate(admitted):
+                if self._draining.is_set():
+                    await asyncio.to_thread(self._return_admitted, admitted[position:])
+                    break
+
+                self._add_in_flight(message)
+                job = asyncio.create_task(self._run_job_async(message, message_body))
+                jobs.add(job)
+                job.add_done_callback(jobs.discard)
+                dispatched += 1
+        finally:
+            self._release_async_slots(reserved - dispatched)
+
+    async def _poll_async(self, jobs: set) -> None:
+        while not self._draining.is_set():
+            try:
+                await self._poll_once_async(jobs)
+            except Exception as e:
+                logger.error(f"Erro no worker loop: {str(e)}", exc_info=True)
+                await asyncio.sleep(5)
+
+    async def _run_async(self) -> None:
+        logger.info(
+            f"Runtime assíncrono ativo: {self.concurrency} jobs, {self.async_pollers} consultas simultâneas ao SQS"
+        )
+        # Long polling, S3, SNS e banco rodam em threads; o pool padrão precisa comportar todos
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=self.concurrency * 2 + self.async_pollers, thread_name_prefix="async-io"
+            )
+        )
+        self._async_slots = asyncio.Semaphore(self.concurrency)
+        jobs: set = set()
+
+        pollers = [asyncio.create_task(self._poll_async(jobs)) for _ in range(self.async_pollers)]
+        try:
+            await asyncio.gather(*pollers)
+        finally:
+            for poller in pollers:
+                poller.cancel()
+            if jobs:
+                await asyncio.gather(*jobs, return_exceptions=True)
+
     def run(self):
-        logger.info("Iniciando Video Processor Worker")
+        logger.info(
+            f"Iniciando Video Processor Worker "
+            f"({time.perf_counter() - _IMPORTS_STARTED_AT:.2f}s desde o início dos imports)"
+        )
+
+        if self.metrics_port:
+            start_metrics_server(self.metrics_port)
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.request_drain)
+
+        if self.runtime == RUNTIME_ASYNC:
+            try:
+                asyncio.run(self._run_async())
+            except KeyboardInterrupt:
+                logger.info("Worker interrompido pelo usuário")
+            finally:
+                self.sqs_consumer.stop_polling()
+                self._flush_pending_work()
+            return
+
+        if self.concurrency > 1:
+            self._run_pool()
+            return
         
-        while True:
+        while not self._draining.is_set():
             try:
                 message = self.sqs_consumer.receive_message(wait_time=20)
                 
                 if not message:
                     logger.debug("Nenhuma mensagem disponível na fila")
                     continue
+
+                if self._draining.is_set():
+                    self._release_undispatched([message])
+                    break
                 
                 logger.info(f"Mensagem recebida: {message['MessageId']}")
                 
                 message_body = self.sqs_consumer.parse_message(message)
                 
-                if not message_body:
-                    self.sqs_consumer.delete_message(message['ReceiptHandle'])
+                if self._discard_invalid_message(message, message_body):
+                    continue
+
+                if not self._claim_message(message, message_body):
                     continue
                 
-                success = self.process_message(message_body)
-                
-                if success:
-                    self.sqs_consumer.delete_message(message['ReceiptHandle'])
-                else:
-                    logger.warning(f"Erro ao processar mensagem {message['MessageId']}")
+                self._add_in_flight(message)
+                with self.sqs_consumer.heartbeat(message['ReceiptHandle']):
+                    result = self._run_job(message_body)
+                if self._take_in_flight(message):
+                    self._finish_message(message, result.success, result.status_updates)
                     
             except KeyboardInterrupt:
                 logger.info("Worker interrompido pelo usuário")
                 break
             except Exception as e:
                 logger.error(f"Erro no worker loop: {str(e)}", exc_info=True)
-                import time
                 time.sleep(5)
 
+        self.sqs_consumer.stop_polling()
+        self._flush_pending_work()
 
-if __name__ == "__main__":
+    def request_drain(self, _signum=None, _frame=None) -> None:
+        # Handler do SIGTERM: só marca o dreno; o restante roda em uma thread fora do handler
+        if self._draining.is_set():
+            return
+        self._draining.set()
+        self._drain_deadline = time.monotonic() + self.drain_grace_seconds
+        threading.Thread(target=self._drain, name="worker-drain", daemon=True).start()
+
+    def _drain(self) -> None:
+        with self._slots_changed:
+            running = len(self._in_flight)
+        logger.info(
+            f"Encerramento solicitado: consulta à fila interrompida, "
+            f"aguardando {running} jobs por até {self.drain_grace_seconds:.0f}s"
+        )
+        # Mensagens recebidas que ainda não chegaram a um slot voltam para a fila na hora
+        self.sqs_consumer.stop_polling()
+
+        with self._slots_changed:
+            self._slots_changed.notify_all()
+            while self._in_flight:
+                remaining = self._drain_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._slots_changed.wait(remaining)
+            abandoned = list(self._in_flight.values())
+            self._in_flight.clear()
+
+        if not abandoned:
+            logger.info("Jobs em andamento concluídos; encerrando o worker")
+            return
+        self._abandon_jobs(abandoned)
+
+    def _abandon_jobs(self, messages: List[Dict[str, Any]]) -> None:
+        logger.warning(
+            f"Prazo de {self.drain_grace_seconds:.0f}s esgotado: {len(messages)} jobs interrompidos "
+            f"e devolvidos à fila"
+        )
+        # O FFmpeg ainda estaria escrevendo nos diretórios removidos abaixo: sai antes, em cada
+        # processo do pool e, nos modos thread, serial e async, neste processo
+        self._stop_pool_processes()
+        self._stop_job_processes()
+
+        for message in messages:
+            self.sqs_consumer.untrack_in_flight(message['ReceiptHandle'])
+            self._finish_lease(message, False)
+            self.sqs_consumer.release_message(message['ReceiptHandle'])
+            self._remove_job_files(message)
+
+        self._flush_pending_work()
+        # Threads de jobs não podem ser interrompidas e impediriam a saída do interpretador
+        os._exit(0)
+
+    def _stop_pool_processes(self) -> None:
+        children = multiprocessing.active_children()
+        for child in children:
+            try:
+                os.kill(child.pid, POOL_ABANDON_SIGNAL)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + POOL_ABANDON_TIMEOUT_SECONDS
+        for child in children:
+            child.join(max(0.0, deadline - time.monotonic()))
+            if child.is_alive():
+                logger.warning(f"Processo do pool {child.pid} não encerrou no prazo; enviando SIGKILL")
+                child.kill()
+
+    def _stop_job_processes(self) -> None:
+        stopped = self.processing_gateway.terminate_ffmpeg()
+        aborted = self.s3_gateway.abort_uploads()
+        if stopped or aborted:
+            logger.warning(f"Jobs abandonados: {stopped} processos FFmpeg encerrados, {aborted} uploads abortados")
+
+    def _release_undispatched(self, messages: List[Dict[str, Any]]) -> None:
+        for message in messages:
+            self.sqs_consumer.release_message(message['ReceiptHandle'])
+
+    def _remove_job_files(self, message: Dict[str, Any]) -> None:
+        message_body = self.sqs_consumer.parse_message(message) or {}
+        timestamp = Path(str(message_body.get("timestamp") or "")).name
+        if not timestamp:
+            return
+
+        shutil.rmtree(self.processing_gateway.temp_dir / timestamp, ignore_errors=True)
+        # Vídeo baixado para o job; os do cache de origem são mantidos
+        for local_video in self.uploads_dir.glob(f"{glob.escape(timestamp)}_*"):
+            local_video.unlink(missing_ok=True)
+
+    def _flush_pending_work(self) -> None:
+        self.sqs_consumer.stop_heartbeat()
+        # Status pendentes são gravados antes das remoções que dependem deles
+        if self.status_writer is not None:
+            self.status_writer.stop()
+        self.sqs_consumer.flush_deletes()
+        self.notification_gateway.close()
+
+
+def measure_startup() -> Dict[str, float]:
+    # Mede as etapas até o worker estar pronto para consultar a fila, sem consumir mensagens
+    started_at = time.perf_counter()
     worker = VideoWorker()
-    worker.run()
+    init_finished_at = time.perf_counter()
+    worker.sqs_consumer.client
+    ready_at = time.perf_counter()
+
+    timings = {
+        "imports_seconds": _IMPORTS_FINISHED_AT - _IMPORTS_STARTED_AT,
+        "init_seconds": init_finished_at - started_at,
+        "sqs_client_seconds": ready_at - init_finished_at,
+        "total_seconds": ready_at - _IMPORTS_STARTED_AT,
+    }
+    logger.info(
+        f"Inicialização: imports {timings['imports_seconds']:.3f}s, "
+        f"VideoWorker {timings['init_seconds']:.3f}s, "
+        f"cliente SQS {timings['sqs_client_seconds']:.3f}s, "
+        f"total {timings['total_seconds']:.3f}s"
+    )
+    return timings
+
+
+if __name__ == "__main__":
+    if "--measure-startup" in sys.argv[1:]:
+        measure_startup()
+    else:
+        worker = VideoWorker()
+        worker.run()